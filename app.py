@@ -1,4 +1,4 @@
-from dash import Dash, html, dcc, Input, Output, State, callback, dash
+from dash import Dash, html, dcc, Input, Output, State, callback, dash, ALL, ClientsideFunction, ctx
 import dash_bootstrap_components as dbc
 import geojson
 import dash_leaflet as dl
@@ -9,117 +9,85 @@ from src.generate_visualizations_streets import generate_visualizations as gener
 from src.generate_visualizations_vehicles import generate_visualizations as generate_visualizations_byvehicles
 from src.generate_visualizations_impacted import generate_visualizations as generate_visualizations_impacted
 from src.const import *
+from src.data_loader import parse_inputs, load_inputs, available_indicators, load_indicator, read_closed_roads
+from src.metrics import instrument, timed, register_metrics
+from src.profiling import profiled, register_profiling
+from src.compression import register_compression, register_network_assets, add_network_asset, release_network_asset
+from src.follow import follow_inputs, poll_follower, append_edgedata, append_vehicles, followed_intervals
+from src.vehicle_impact import build_vehicle_impact, ranked_vehicles, find_vehicle, vehicle_rows, vehicle_values
+from src.route_index import load_route_index, trips_on_edges
+from src.network_graph import build_network_graph, impact_region, network_bounds
+from src.zones import build_zone_layer, zone_features
+from src.street_index import build_street_index, search_streets, street_option
+from src.replicates import significant_streets
+from src.aggregations import cached, cached_street_tables, use_disk_cache, register_version, new_version, \
+    forget_version
+from src.disk_cache import open_disk_cache, dataset_key
+from src.export_api import register_export_api
+from src.registry import DEFAULT_DATASET, read_dataset_arguments, new_registry, dataset_entry, entry_state, \
+    start_memory_check
+from src.warmup import record_usage, start_usage_flusher, warm_up_indicators, warm_up
+from src.generate_visualizations_vehicles import generate_figure2 as generate_visualizations_ranking
+from src.generate_visualizations_vehicles import generate_figure3 as generate_visualizations_street_vehicles
+from src.generate_visualizations_vehicles import generate_figure4 as generate_visualizations_trip_statistics
+from src.trip_sketches import new_trip_statistics, add_trips, summary_quantiles
+import copy
 import datetime
 import os
+import sys
+import threading
+import time
 import webbrowser
+from functools import wraps
 from threading import Timer
-import optparse
+from dash.exceptions import PreventUpdate
+from flask import jsonify
+from urllib.parse import parse_qs, urlencode
 
 
 # --- Initializing the app ---
 dbc_css = "https://cdn.jsdelivr.net/gh/AnnMarieW/dash-bootstrap-templates/dbc.min.css"
-app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP, dbc_css], title='TrafficTwin')
+# The loading page and the dashboard are served by the same app, so not every callback id is in the current layout
+app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP, dbc_css], title='TrafficTwin',
+           suppress_callback_exceptions=True)
 server = app.server
-
-
-# --- Data loading functions ---
-
-def convert_xml_to_csv(output_file_name, xmlfile):
-    """Convert an XML file to CSV using SUMO tools."""
-    if os.path.exists(xmlfile):
-        os.system(
-            f"python \"{os.path.join(os.environ['SUMO_HOME'], 'tools', 'xml', 'xml2csv.py')}\" {xmlfile} -o {output_file_name}")
-
-def load_data(xmlfile, dataframe):
-    """Convert XML to CSV and load data into a DataFrame."""
-    file_name = 'edgedata.out.csv'
-    convert_xml_to_csv(file_name, xmlfile)
-    newdata = pd.read_csv(file_name, sep=";")
-    frames = [dataframe, newdata]
-    return pd.concat(frames)
-
-
-def load_vehicles_data(xml_tripinfo_file):
-    """Load vehicle data from an XML file and convert it to a CSV."""
-    file_name = 'tripinfo.out.csv'
-    convert_xml_to_csv(file_name, xml_tripinfo_file)
-    return pd.read_csv(file_name, sep=";")
-
-
-def sort_data(dataframe):
-    """Sort the data by 'interval_begin' and 'edge_id'."""
-    return dataframe.sort_values(by=['interval_begin', 'edge_id'], ignore_index=True)
-
-
-# --- Input function ---
-def read_inputs():
-    """Read command-line inputs and load datasets for analysis."""
-    parser = optparse.OptionParser()
-    parser.add_option("--edgedata_without", action="append", dest="edgedata_without", default=[],
-                      help="File without deviations", metavar="FILE_name_without")
-    parser.add_option("--edgedata_with", action="append", dest="edgedata_with", default=[], help="File with deviations",
-                      metavar="FILE_name_with")
-    parser.add_option("--tripinfo_without", dest="tripinfo_without", help="Tripinfo file without deviations",
-                      metavar="TRIPINFO_without")
-    parser.add_option("--tripinfo_with", dest="tripinfo_with", help="Tripinfo file with deviations",
-                      metavar="TRIPINFO_with")
-    parser.add_option("--road_network_json", dest="road_network_json", help="TrafficTwin geojson", metavar="GeoJson")
-
-    (options, args) = parser.parse_args()
-
-    # Load data
-    xml_edgedata_without = options.edgedata_without
-    xml_edgedata_with = options.edgedata_with
-    xml_tripinfo_without = options.tripinfo_without
-    xml_tripinfo_with = options.tripinfo_with
-    road_network_json_file = options.road_network_json
-
-    dataframe_without = pd.DataFrame()
-    dataframe_with = pd.DataFrame()
-
-    # Load XML data into dataframes
-    for xmldata_without in xml_edgedata_without:
-        dataframe_without = load_data(xmldata_without, dataframe_without)
-    dataframe_without = sort_data(dataframe_without)
-
-    for xmldata_with in xml_edgedata_with:
-        dataframe_with = load_data(xmldata_with, dataframe_with)
-    dataframe_with = sort_data(dataframe_with)
-
-    # Load vehicle data
-    vehicle_data_without = load_vehicles_data(xml_tripinfo_without)
-    vehicle_data_with = load_vehicles_data(xml_tripinfo_with)
-
-    closed_roads = ["231483314", "832488061", "616545123", "150276002", "8384928", "606127853", "4730627", "4726710#0",
-                    "627916937", "4726681#0"]  # This list has to come from the App (for now I left it like this)
-    dict_names = {}
-
-    return dataframe_without, dataframe_with, vehicle_data_without, vehicle_data_with, road_network_json_file, closed_roads, dict_names
+# Compressed layout and callback responses (registered first, so the other after_request hooks see them uncompressed)
+register_compression(server)
 
 
 # --- Defining global variables ---
-dataframe_without, dataframe_with, vehicle_data_without, vehicle_data_with, road_network_json_file, closed_roads, dict_names = read_inputs()
+# Every dataset (see src/registry.py) is a dict filled in by load_dataset() on its first use
+options = parse_inputs()
+# The street networks are fetched once by the browser from versioned, cacheable URLs instead of being in the layout
+register_network_assets(server)
+# Tables and views of the static datasets (not followed) kept on disk across restarts, up to --disk_cache megabytes
+disk_cache = None
+if options.disk_cache and not options.follow:
+    disk_cache = open_disk_cache(options.cache_dir, int(options.disk_cache * 2 ** 20))
+    use_disk_cache(disk_cache)
 url = 'https://tiles.stadiamaps.com/tiles/alidade_smooth_dark/{z}/{x}/{y}{r}.png'
 attribution = '&copy; <a href="https://stadiamaps.com/">Stadia Maps</a> '
+# Street layer of a map aggregated by zone, until it is zoomed in
+EMPTY_FEATURES = {'type': 'FeatureCollection', 'features': []}
 
 # --- Global time functions ---
-def get_time_intervals_seconds():
+def get_time_intervals_seconds(dataset):
     """Return unique time intervals from the data."""
-    return dataframe_without['interval_id'].unique()
+    return dataset['dataframe_without']['interval_id'].unique()
 
 
-def get_time_intervals_string():
+def get_time_intervals_string(dataset):
     """Convert time intervals from seconds to human-readable format."""
-    intervals = get_time_intervals_seconds()
+    intervals = dataset['time_intervals_seconds']
     return [
         f"{str(datetime.timedelta(seconds=int(re.split('_to_', interval)[0])))} to "
         f"{str(datetime.timedelta(seconds=int(re.split('_to_', interval)[1])))}"
         for interval in intervals]
 
 
-def get_time_intervals_marks():
+def get_time_intervals_marks(dataset):
     """Return time interval marks for a slider input."""
-    time_intervals_seconds = get_time_intervals_seconds()
+    time_intervals_seconds = dataset['time_intervals_seconds']
     time_intervals_marks = [
         str(datetime.timedelta(seconds=int(re.split("_to_", elem)[0])))
         for elem in time_intervals_seconds
@@ -129,11 +97,158 @@ def get_time_intervals_marks():
     return time_intervals_marks
 
 
-# --- Define global time variables ---
-time_intervals_seconds = get_time_intervals_seconds()
-time_intervals_string = get_time_intervals_string()
-time_intervals_marks = get_time_intervals_marks()
-len_time_intervals_string = len(time_intervals_string)
+# --- Loading of the datasets ---
+# The map callback writes the map to files (map_to_geojson, export_png) and reads it back
+map_files_lock = threading.Lock()
+
+
+def refresh_time_intervals(dataset, intervals=None):
+    """Derive the time variables of a dataset from its loaded intervals, or from the given ones (the intervals of the
+    followed tables are known without scanning their rows)."""
+    dataset['time_intervals_seconds'] = get_time_intervals_seconds(dataset) if intervals is None else intervals
+    dataset['time_intervals_string'] = get_time_intervals_string(dataset)
+    dataset['time_intervals_marks'] = get_time_intervals_marks(dataset)
+
+
+def dataset_options():
+    """Options of every dataset: the command line, followed by the arguments of the dataset in --datasets."""
+    if not options.datasets:
+        return {DEFAULT_DATASET: options}
+    return {name: parse_inputs(sys.argv[1:] + arguments)
+            for name, arguments in read_dataset_arguments(options.datasets).items()}
+
+
+def load_dataset(name, dataset_options, report_loading):
+    """Load a dataset and the time intervals derived from it, then start its warm-up and follow threads."""
+    network_file = dataset_options.road_network_json
+    # Version of the dataset, a new one when it changes, in the keys of the cached aggregations and views
+    dataset = {'name': name, 'options': dataset_options, 'network_file': network_file, 'version': new_version(),
+               'vehicle_impact': None, 'route_index_without': None, 'route_index_with': None,
+               # Streets around the closed roads (--impact_hops) the default rankings and the map are restricted to,
+               # None for all
+               'impact_edges': None,
+               # Street -> zone mapping of the low zoom map (--zones or --hex_size), None to always show the streets
+               'zone_layer': None,
+               'dict_names': {}, 'layout': None,
+               # Held while a followed dataset swaps in its new tables (see dataset_snapshot)
+               'lock': threading.Lock()}
+    follower = None
+    if dataset_options.follow:
+        (follower, dataset['dataframe_without'], dataset['dataframe_with'], dataset['vehicle_data_without'],
+         dataset['vehicle_data_with'], dataset['vehicle_impact']) = follow_inputs(dataset_options, report_loading)
+        dataset['closed_roads'] = read_closed_roads(dataset_options)
+    else:
+        (dataset['dataframe_without'], dataset['dataframe_with'], dataset['vehicle_data_without'],
+         dataset['vehicle_data_with'], _, dataset['closed_roads'], _) = load_inputs(dataset_options, report_loading)
+        if dataset_options.vehroutes_without:
+            report_loading(f"Indexing {os.path.basename(dataset_options.vehroutes_without)}")
+            dataset['route_index_without'] = load_route_index(dataset_options.vehroutes_without)
+        if dataset_options.vehroutes_with:
+            report_loading(f"Indexing {os.path.basename(dataset_options.vehroutes_with)}")
+            dataset['route_index_with'] = load_route_index(dataset_options.vehroutes_with)
+    if dataset_options.impact_hops is not None:
+        report_loading("Computing the impact region of the closed roads")
+        dataset['impact_edges'] = impact_region(build_network_graph(network_file), dataset['closed_roads'],
+                                                dataset_options.impact_hops)
+    if dataset_options.zones or dataset_options.hex_size:
+        report_loading("Assigning the streets to the zones")
+        dataset['zone_layer'] = build_zone_layer(network_file, dataset_options.zones, dataset_options.hex_size)
+    # Streets of the network (the edges grouped by name) indexed for the street picker
+    dataset['street_index'] = build_street_index(network_file)
+    # Corners of the network, the maps open on its centre
+    dataset['bounds'] = network_bounds(network_file)
+    if disk_cache is not None and not dataset_options.follow:
+        register_version(dataset['version'], dataset_key(dataset_options))
+    refresh_time_intervals(dataset)
+    if not dataset_options.trip_sketches and follower is None:
+        dataset['vehicle_impact'] = build_vehicle_impact(dataset['vehicle_data_without'],
+                                                         dataset['vehicle_data_with'])
+    elif dataset_options.trip_sketches and follower is not None:
+        # The trips read while waiting for the first interval
+        dataset['vehicle_data_without'] = add_trips(new_trip_statistics(), dataset['vehicle_data_without'])
+        dataset['vehicle_data_with'] = add_trips(new_trip_statistics(), dataset['vehicle_data_with'])
+    dataset['network_url'] = add_network_asset(network_file)
+    if dataset_options.warm_up:
+        start_usage_flusher(options.cache_dir)
+        threading.Thread(target=warm_up_views, args=(dataset,), name='warm_up_' + name, daemon=True).start()
+    if follower is not None:
+        threading.Thread(target=follow_app_data, args=(dataset, follower), name='follow_' + name,
+                         daemon=True).start()
+    return dataset
+
+
+def unload_dataset(dataset):
+    """Release an evicted dataset: its cached views, and its network when no other loaded dataset uses it."""
+    forget_version(dataset['version'])
+    release_network_asset(dataset['network_url'])
+
+
+def dataset_snapshot(dataset):
+    """Consistent copy of a dataset (the tables and their version), as a followed dataset swaps them under its lock."""
+    with dataset['lock']:
+        return dict(dataset)
+
+
+def follow_app_data(dataset, follower):
+    """Append the intervals and trips written by the simulation since the previous poll, until the server stops.
+
+    The new rows are appended to the growable tables of the follower (see src/follow.py), and the tables viewing them
+    are swapped in with their new version at once, so no view is computed from the old tables and cached under the
+    new version."""
+    dataset_options = dataset['options']
+    tables = follower['tables']
+    while True:
+        time.sleep(dataset_options.follow_interval)
+        new_without, new_with, new_trips_without, new_trips_with = poll_follower(follower)
+        if not (len(new_without) or len(new_with) or len(new_trips_without) or len(new_trips_with)):
+            continue
+        current = dataset_snapshot(dataset)
+        updated = {}
+        if len(new_without) or len(new_with):
+            updated['dataframe_without'], updated['dataframe_with'] = append_edgedata(tables, new_without, new_with)
+            refresh_time_intervals(updated, followed_intervals(tables))
+        if dataset_options.trip_sketches:
+            # The statistics shown are never modified, the new trips are added to copies
+            updated['vehicle_data_without'] = add_trips(copy.deepcopy(current['vehicle_data_without']),
+                                                        new_trips_without)
+            updated['vehicle_data_with'] = add_trips(copy.deepcopy(current['vehicle_data_with']), new_trips_with)
+        elif len(new_trips_without) or len(new_trips_with):
+            (updated['vehicle_data_without'], updated['vehicle_data_with'],
+             updated['vehicle_impact']) = append_vehicles(tables, new_trips_without, new_trips_with)
+        updated['version'] = new_version()
+        with dataset['lock']:
+            dataset.update(updated)
+
+
+def warm_up_views(dataset):
+    """Fill the view cache with the default view of the default and most used indicators of a dataset (--warm_up)."""
+    dataset = dataset_snapshot(dataset)
+    time_frames = selected_time_frames(dataset, [0, 0])
+    tasks = []
+    for traffic in warm_up_indicators(generate_options_list(dataset), dataset['options'].warm_up, options.cache_dir):
+        tasks.append((f"the map of {traffic}", lambda traffic=traffic: map_view(dataset, traffic, time_frames, [])))
+        tasks.append((f"the figures of {traffic}",
+                      lambda traffic=traffic: tab_view(dataset, traffic, time_frames, dict(selected=[]), {}, [])))
+    warm_up(tasks, dataset['options'].warm_up_workers)
+
+
+# The datasets of --datasets (or of the command line), loaded on their first use, evicted beyond --memory_budget
+registry = new_registry(dataset_options(), load_dataset, unload_dataset,
+                        options.memory_budget * 2 ** 20 if options.memory_budget else None)
+start_memory_check(registry)
+
+
+def requires_data(function):
+    """Decorator of the callbacks of a dashboard: their last argument, the name of its dataset (the 'dataset' store),
+    is replaced by the dataset, given first. The callback is skipped until the dataset is loaded (again, when it was
+    evicted)."""
+    @wraps(function)
+    def wrapper(*args):
+        dataset = dataset_entry(registry, args[-1])['dataset']
+        if dataset is None:
+            raise PreventUpdate
+        return function(dataset_snapshot(dataset), *args[:-1])
+    return wrapper
 
 
 # --- Utility functions ---
@@ -143,9 +258,9 @@ def Color_scale():
     return ["#0F9D58", "#fff757", "#fbbc09", "#E94335", "#822F2B"]
 
 
-def read_geojson():
-    """Read and return GeoJSON data from a file."""
-    with open(road_network_json_file, encoding='utf-8') as f:
+def read_geojson(dataset):
+    """Read and return the GeoJSON network of a dataset."""
+    with open(dataset['network_file'], encoding='utf-8') as f:
         return geojson.load(f)
 
 
@@ -164,11 +279,53 @@ def define_quantile(data_diff):
     return [data_diff.min(), p1, p2, p3, p4, data_diff.max()]
 
 
-def load_street_data(traffic):
-    """Load and align street data for traffic without and with deviations."""
-    df_without = detectors_out_to_table(dataframe_without, traffic).fillna(0)
-    df_with = detectors_out_to_table(dataframe_with, traffic).fillna(0)
-    return df_without.align(df_with, fill_value=0)
+def load_street_indicator(dataset, traffic_indicator):
+    """Make sure the indicator is loaded in both edgedata tables (it is read from the cache on first use)."""
+    load_indicator(dataset['dataframe_without'], traffic_indicator)
+    load_indicator(dataset['dataframe_with'], traffic_indicator)
+
+
+def replicate_count(dataset):
+    """Number of runs per scenario (1 without replicated runs)."""
+    return 1 + max(len(dataset['options'].replicate_without), len(dataset['options'].replicate_with))
+
+
+def analysis_edges(dataset, traffic_indicator, intervals, significant_only):
+    """Streets the default rankings and the map are restricted to (None for all of them): the impact region
+    (--impact_hops) and, when asked, the streets whose difference is significant over the replicated runs."""
+    edges = dataset['impact_edges']
+    if significant_only and replicate_count(dataset) > 1:
+        tests = significant_streets(dataset['dataframe_without'], dataset['dataframe_with'], intervals,
+                                    traffic_indicator, dataset['options'].confidence)
+        significant = tests.index[tests['significant']]
+        edges = significant if edges is None else edges.intersection(significant)
+    return edges
+
+
+def load_street_data(dataset, traffic, selected=(), edges=None):
+    """Load and align street data for traffic without and with deviations (shared with the export API, so the
+    tables must not be modified).
+
+    When edges is given (see analysis_edges), only these streets and the selected ones are kept."""
+    if edges is not None:
+        edges = edges.union(pd.Index(selected, dtype=object))
+    return cached_street_tables(dataset['version'], dataset['dataframe_without'], dataset['dataframe_with'], traffic,
+                                edges)
+
+
+def export_datasets(name=None):
+    """Tables of a dataset for the export API, None while it is loading."""
+    dataset = dataset_entry(registry, name)['dataset']
+    if dataset is None:
+        return None
+    dataset = dataset_snapshot(dataset)
+    return dataset['version'], dataset['dataframe_without'], dataset['dataframe_with']
+
+
+def map_center(dataset):
+    """Centre of the street network of a dataset."""
+    (south, west), (north, east) = dataset['bounds']
+    return (south + north) / 2, (west + east) / 2
 
 
 def open_browser():
@@ -198,272 +355,559 @@ def selected_timeframe_in_seconds(timeframe_split):
     return str(starting) + "_to_" + str(end)
 
 
+def selected_time_frames(dataset, timeframes):
+    """Indexes of the intervals selected by the time frame slider (all of them when both handles are together)."""
+    if timeframes[0] != timeframes[1]:
+        return list(range(timeframes[0], timeframes[1]))
+    return list(range(0, len(dataset['time_intervals_string'])))
+
+
 # -- Generate options for the dropdown --
-def generate_options_list():
-    options_list = []
-    if 'edge_traveltime' in dataframe_without.columns:
-        options_list.append('Travel time (seconds)')
-    if 'edge_density' in dataframe_without.columns:
-        options_list.append('Density (vehicles/kilometres)')
-    if 'edge_occupancy' in dataframe_without.columns:
-        options_list.append('Occupancy (%)')
-    if 'edge_timeLoss' in dataframe_without.columns:
-        options_list.append('Time loss (seconds)')
-    if 'edge_waitingTime' in dataframe_without.columns:
-        options_list.append('Waiting time (seconds)')
-    if 'edge_speed' in dataframe_without.columns:
-        options_list.append('Speed (meters/seconds)')
-    if 'edge_speedRelative' in dataframe_without.columns:
-        options_list.append('Speed relative (average speed / speed limit)')
-    if 'edge_sampledSeconds' in dataframe_without.columns:
-        options_list.append('Sampled seconds (vehicles/seconds)')
-    return options_list
-
-
-dropdown_options = [{'label': title, 'value': title} for title in generate_options_list()]
-dropdown_options_vehicles = [{'label': title, 'value': title} for title in
-                             ['Duration (seconds)', 'Route length (meters)', 'Time loss (seconds)',
-                              'Waiting time (seconds)']]
-dropdown_options_timeframes = [{'label': title, 'value': title} for title in time_intervals_string]
-
-offcanvas = html.Div([
-    html.Div(id="filters",
-             children=[html.H6("Filters")],
-             style={'marginTop': '50px'},
-             ),
-    html.Div(id="street-ind",
-             children="Street indicators",
-             style={'marginTop': '15px'},
-             ),
-    dcc.Dropdown(
-        id='traffic-dropdown',
-        options=dropdown_options,
-        value=generate_options_list()[0],
-        placeholder='Select a traffic indicator...',
-        searchable=True,
-        style={'color': 'black'}
-    ),
-    html.Div(id="time-frames",
-             children="Time frames",
-             style={'marginTop': '25px'},
-             ),
-    html.Div([
-        dcc.RangeSlider(min=0, max=len(time_intervals_marks) - 1, step=1, allowCross=False,
-                        marks={(i): {'label': str(time_intervals_marks[i]),
-                                     'style': {'transform': 'translateX(-20%) rotate(45deg)', "white-space": "nowrap",
-                                               'margin-top': '10px', "fontSize": "14px", 'color': '#deb522'}} for i in
-                               range(len(time_intervals_marks))},
-                        value=[0, len(time_intervals_marks) - 1], id='my-range-slider'
-                        ),
-        html.Div(id='output-container-range-slider')
-    ], className="dbc", style={'padding': '10px 20px 45px 0px'}
-    ),
-    html.Div(id='string_names',
-             style={'marginTop': '15px'}),
-    html.Div(id="select-street",
-             children="Select the streets to analyze",
-             style={'marginTop': '15px'},
-             ),
-    html.Div([
-        dl.Map([
-            dl.TileLayer(url=url, attribution=attribution),
-            # From hosted asset (best performance).
-            dl.GeoJSON(data=read_geojson(), id="geojson", hideout=dict(selected=[]), style=style_color,
-                       hoverStyle=arrow_function(dict(weight=5, color='#00FFF7', dashArray='')),
-                       onEachFeature=on_each_feature, )
-        ], center=(50.82911264776447, 4.369035991425782), zoomControl=False, zoom=14,
-            style={'height': '50vh', 'width': '100%'}),  # window height
-    ], style={'border': '3px'}),
-    dcc.Store(id='dict_names'),
-], style={'backgroundColor': "black", 'color': '#deb522', 'width': '28%', "position": "fixed"}  # FIXING
-)
+def generate_options_list(dataset):
+    indicators = available_indicators(dataset['dataframe_without'])
+    return [label for column, label in TRAFFIC_OPTIONS.items() if column in indicators]
 
-app.layout = html.Div([
-    dcc.Store(id='myDivInfo'),
-    dcc.Store(id='titleSizeStore', data=None),
-    dcc.Interval(id='interval-component', interval=500, n_intervals=0),
-    dbc.Container([
-        dbc.Row([
-            dbc.Col(html.Div(id="Tulipe",
-                             children=[html.H5("TrafficTwin")],
-                             style={'marginTop': '5px', 'backgroundColor': "black", 'color': '#deb522', 'width': '28%',
-                                    "position": "fixed"},  # style={'marginTop': '5px', 'color': '#deb522'},
-                             ), width=5),
-            dbc.Col(html.Div([' ']), width=5),  # Hasta aqui
-            dbc.Col(html.Div([
-                html.Div(["", dbc.Button("About us", outline=True, color="link", size="sm", className="me-1", id="open",
-                                         n_clicks=0, style={'color': '#deb522'}),
-                          "  ",
-                          dbc.Button("Indicators", outline=True, color="link", size="sm", className="me-1",
-                                     id="indicators_open", n_clicks=0, style={'color': '#deb522'})],
-                         style={'text-align': 'right'}),
-                dbc.Modal([
-                    dbc.ModalHeader(dbc.ModalTitle("Machine Learning Group")),
-                    dbc.ModalBody([modal_body]),
-                ],
-                    id="modal",
-                    is_open=False,
-                ),
-                dbc.Modal([
-                    dbc.ModalHeader(dbc.ModalTitle("Indicator description")),
-                    dbc.ModalBody([traffic_body]),
-                ],
-                    id="indicators_modal",
-                    is_open=False
-                )]
-            ), width=2)
-        ]),
-        dbc.Row([
-            dbc.Col(offcanvas, width=5),
-            dbc.Col(
-                html.Div([
+
+dropdown_options_vehicles = [{'label': title, 'value': title} for title in VEHICLE_OPTIONS]
+
+
+def slider_marks(dataset):
+    """Marks of the time frame slider, one per interval boundary."""
+    time_intervals_marks = dataset['time_intervals_marks']
+    return {(i): {'label': str(time_intervals_marks[i]),
+                  'style': {'transform': 'translateX(-20%) rotate(45deg)', "white-space": "nowrap",
+                            'margin-top': '10px', "fontSize": "14px", 'color': '#deb522'}} for i in
+            range(len(time_intervals_marks))}
+
+
+def build_offcanvas(dataset):
+    """Build the filters panel (indicator, time frames and street selection map)."""
+    dropdown_options = [{'label': title, 'value': title} for title in generate_options_list(dataset)]
+    time_intervals_marks = dataset['time_intervals_marks']
+
+    return html.Div([
+        html.Div(id="filters",
+                 children=[html.H6("Filters")],
+                 style={'marginTop': '50px'},
+                 ),
+        html.Div(id="street-ind",
+                 children="Street indicators",
+                 style={'marginTop': '15px'},
+                 ),
+        dcc.Dropdown(
+            id='traffic-dropdown',
+            options=dropdown_options,
+            value=generate_options_list(dataset)[0],
+            placeholder='Select a traffic indicator...',
+            searchable=True,
+            style={'color': 'black'}
+        ),
+        html.Div(id="time-frames",
+                 children="Time frames",
+                 style={'marginTop': '25px'},
+                 ),
+        html.Div([
+            dcc.RangeSlider(min=0, max=len(time_intervals_marks) - 1, step=1, allowCross=False,
+                            marks=slider_marks(dataset), value=[0, len(time_intervals_marks) - 1], id='my-range-slider'
+                            ),
+            html.Div(id='output-container-range-slider')
+        ], className="dbc", style={'padding': '10px 20px 45px 0px'}
+        ),
+        # Only offered with replicated runs (--replicate_without/--replicate_with)
+        dcc.Checklist(
+            id='significant-only',
+            options=[{'label': f" Only the significant differences ({dataset['options'].confidence:.0%} confidence, "
+                               f"{replicate_count(dataset)} runs)", 'value': 'significant'}],
+            value=[], inputStyle={'marginRight': '5px'},
+            style={'marginTop': '-30px', 'marginBottom': '15px',
+                   'display': 'block' if replicate_count(dataset) > 1 else 'none'}
+        ),
+        html.Div(id='string_names',
+                 style={'marginTop': '15px'}),
+        html.Div(id="select-street",
+                 children="Select the streets to analyze",
+                 style={'marginTop': '15px'},
+                 ),
+        dcc.Dropdown(
+            id='street-search',
+            options=[],
+            placeholder='Search a street by name or id...',
+            searchable=True,
+            style={'color': 'black', 'marginTop': '5px', 'marginBottom': '10px'}
+        ),
+        html.Div([
+            dl.Map([
+                dl.TileLayer(url=url, attribution=attribution),
+                # From hosted asset (best performance).
+                dl.GeoJSON(url=dataset['network_url'], id="geojson", hideout=dict(selected=[]), style=style_color,
+                           hoverStyle=arrow_function(dict(weight=5, color='#00FFF7', dashArray='')),
+                           onEachFeature=on_each_feature, )
+            ], center=map_center(dataset), zoomControl=False, zoom=14,
+                style={'height': '50vh', 'width': '100%'}),  # window height
+        ], style={'border': '3px'}),
+        dcc.Store(id='dict_names'),
+    ], style={'backgroundColor': "black", 'color': '#deb522', 'width': '28%', "position": "fixed"}  # FIXING
+    )
+
+
+def build_dataset_picker(dataset):
+    """Dropdown switching to another dataset, only when there are several."""
+    if len(registry['entries']) < 2:
+        return html.Div([' '])
+    return dcc.Dropdown(id='dataset-picker', options=list(registry['entries']), value=dataset['name'],
+                        clearable=False, searchable=True, style={'color': 'black'})
+
+
+def build_layout(dataset):
+    """Build the dashboard layout of a dataset, once it is loaded."""
+    dataset_options = dataset['options']
+    vehicle_impact = dataset['vehicle_impact']
+    center = map_center(dataset)
+    return html.Div([
+        dcc.Store(id='dataset', data=dataset['name']),
+        dcc.Store(id='myDivInfo'),
+        dcc.Store(id='titleSizeStore', data=None),
+        dcc.Store(id='map-layer-shown', data='streets'),
+        dcc.Store(id='map-streets-request'),
+        dcc.Store(id='map-zone-zoom',
+                  data=dataset_options.zone_zoom if dataset['zone_layer'] is not None else None),
+        dcc.Interval(id='follow-interval', interval=dataset_options.follow_interval * 1000,
+                     disabled=not dataset_options.follow),
+        dbc.Container([
+            dbc.Row([
+                dbc.Col(html.Div(id="Tulipe",
+                                 children=[html.H5("TrafficTwin")],
+                                 style={'marginTop': '5px', 'backgroundColor': "black", 'color': '#deb522', 'width': '28%',
+                                        "position": "fixed"},  # style={'marginTop': '5px', 'color': '#deb522'},
+                                 ), width=5),
+                dbc.Col(build_dataset_picker(dataset), width=5),  # Hasta aqui
+                dbc.Col(html.Div([
+                    html.Div(["", dbc.Button("About us", outline=True, color="link", size="sm", className="me-1", id="open",
+                                             n_clicks=0, style={'color': '#deb522'}),
+                              "  ",
+                              dbc.Button("Indicators", outline=True, color="link", size="sm", className="me-1",
+                                         id="indicators_open", n_clicks=0, style={'color': '#deb522'})],
+                             style={'text-align': 'right'}),
+                    dbc.Modal([
+                        dbc.ModalHeader(dbc.ModalTitle("Machine Learning Group")),
+                        dbc.ModalBody([modal_body]),
+                    ],
+                        id="modal",
+                        is_open=False,
+                    ),
+                    dbc.Modal([
+                        dbc.ModalHeader(dbc.ModalTitle("Indicator description")),
+                        dbc.ModalBody([traffic_body]),
+                    ],
+                        id="indicators_modal",
+                        is_open=False
+                    )]
+                ), width=2)
+            ]),
+            dbc.Row([
+                dbc.Col(build_offcanvas(dataset), width=5),
+                dbc.Col(
                     html.Div([
-                        html.Div(id="summary",
-                                 children=[html.H5("Summary")],
-                                 style={'marginTop': '0px', 'color': '#deb522'},
-                                 ),
-                        html.Div(id="traffic_level",
-                                 children=["Traffic level   : Medium traffic"],
-                                 style={'marginTop': '5px', 'color': '#deb522'},
+                        html.Div([
+                            html.Div(id="summary",
+                                     children=[html.H5("Summary")],
+                                     style={'marginTop': '0px', 'color': '#deb522'},
+                                     ),
+                            html.Div(id="traffic_level",
+                                     children=["Traffic level   : Medium traffic"],
+                                     style={'marginTop': '5px', 'color': '#deb522'},
+                                     ),
+                            html.Div(id="time_intervals",
+                                     children=["Time intervals: 12"],
+                                     style={'marginTop': '5px', 'color': '#deb522'},
+                                     ),
+                            html.Div(id="street-deviations-results",
+                                     children=["Map of Street Deviations:"],
+                                     style={'marginTop': '5px', 'color': '#deb522'},
+                                     ),
+                            html.Div(
+                                [
+                                    html.Div(id='description_map_plot'),
+                                    dcc.Store(id='map_view_state',
+                                              data={'lat': center[0], 'lng': center[1], 'zoom': 15}),
+                                    dbc.Collapse(
+                                        html.Div([
+                                            dbc.Card(
+                                                dbc.CardBody(
+                                                    html.Div([
+                                                        # Aquí está el mapa
+                                                        html.Div(id='map_plot'),
+                                                    ]),
+                                                    style={"padding": "0.1rem 0.1rem"}
+                                                ),
+                                                color='#deb522'
+                                            ),
+                                            html.Div(
+                                                id="map_color_scale",
+                                                style={"backgroundColor": "transparent", "padding": "10px"}
+                                            )
+                                        ]),
+                                        id="collapse",
+                                        is_open=True,
+                                    )
+                                ]
+                            ),
+                            collapse_button,
+                        ]),
+                        html.Hr(
+                            style={'borderWidth': "0.2vh", "width": "100%", "borderColor": "#deb522", "opacity": "unset"}),
+                        html.Div(id="bystreets",
+                                 children=[html.H5("Results by streets")],
+                                 style={'marginTop': '5px', 'color': '#deb522'}
                                  ),
-                        html.Div(id="time_intervals",
-                                 children=["Time intervals: 12"],
-                                 style={'marginTop': '5px', 'color': '#deb522'},
+                        dcc.Loading([html.Div(id='tabs-content')], type='default', color='#deb522'),
+                        html.Br(),
+                        html.Hr(
+                            style={'borderWidth': "0.2vh", "width": "100%", "borderColor": "#deb522", "opacity": "unset"}),
+                        html.Div(id="byvehicles",
+                                 children=[html.H5("Results by vehicles")],
+                                 style={'marginTop': '5px', 'color': '#deb522'}
                                  ),
-                        html.Div(id="street-deviations-results",
-                                 children=["Map of Street Deviations:"],
-                                 style={'marginTop': '5px', 'color': '#deb522'},
+                        html.Div(id="vehicle-ind",
+                                 children="Vehicle indicators",
+                                 style={'marginTop': '15px', 'color': '#deb522'},
                                  ),
-                        html.Div(
-                            [
-                                html.Div(id='description_map_plot'),
-                                dcc.Store(id='map_view_state',
-                                          data={'lat': 50.83401264776447, 'lng': 4.366035991425782, 'zoom': 15}),
-                                dbc.Collapse(
-                                    html.Div([
-                                        dbc.Card(
-                                            dbc.CardBody(
-                                                html.Div([
-                                                    # Aquí está el mapa
-                                                    html.Div(id='map_plot'),
-                                                ]),
-                                                style={"padding": "0.1rem 0.1rem"}
-                                            ),
-                                            color='#deb522'
-                                        ),
-                                        html.Div(
-                                            id="map_color_scale",
-                                            style={"backgroundColor": "transparent", "padding": "10px"}
-                                        )
-                                    ]),
-                                    id="collapse",
-                                    is_open=True,
-                                )
-                            ]
+                        dcc.Dropdown(
+                            id='vehicle-dropdown',
+                            options=dropdown_options_vehicles,
+                            value='Duration (seconds)',
+                            placeholder='Select a vehicular traffic indicator...',
+                            searchable=True,
+                            style={'color': 'black'}
                         ),
-                        collapse_button,
-                    ]),
-                    html.Hr(
-                        style={'borderWidth': "0.2vh", "width": "100%", "borderColor": "#deb522", "opacity": "unset"}),
-                    html.Div(id="bystreets",
-                             children=[html.H5("Results by streets")],
-                             style={'marginTop': '5px', 'color': '#deb522'}
-                             ),
-                    dcc.Loading([html.Div(id='tabs-content')], type='default', color='#deb522'),
-                    html.Br(),
-                    html.Hr(
-                        style={'borderWidth': "0.2vh", "width": "100%", "borderColor": "#deb522", "opacity": "unset"}),
-                    html.Div(id="byvehicles",
-                             children=[html.H5("Results by vehicles")],
-                             style={'marginTop': '5px', 'color': '#deb522'}
-                             ),
-                    html.Div(id="vehicle-ind",
-                             children="Vehicle indicators",
-                             style={'marginTop': '15px', 'color': '#deb522'},
-                             ),
-                    dcc.Dropdown(
-                        id='vehicle-dropdown',
-                        options=dropdown_options_vehicles,
-                        value='Duration (seconds)',
-                        placeholder='Select a vehicular traffic indicator...',
-                        searchable=True,
-                        style={'color': 'black'}
-                    ),
-                    dcc.Loading([html.Div(id='tabs-content_vehicles')], type='default', color='#deb522'),
-                ]), width=7)
-        ])
-    ], style={'backgroundColor': 'black', 'padding': '0px'})
-], style={'backgroundColor': 'black', 'minHeight': '100vh'})
+                        dcc.Loading([html.Div(id='tabs-content_vehicles')], type='default', color='#deb522'),
+                    ] + ([
+                        html.Br(),
+                        html.Hr(style={'borderWidth': "0.2vh", "width": "100%", "borderColor": "#deb522",
+                                       "opacity": "unset"}),
+                        html.Div(id="bystreetvehicles",
+                                 children=[html.H5("Results by vehicles of the selected streets")],
+                                 style={'marginTop': '5px', 'color': '#deb522'}
+                                 ),
+                        dcc.Loading([html.Div(id='street-vehicles')], type='default', color='#deb522'),
+                    ] if dataset['route_index_without'] is not None and vehicle_impact is not None else []) + ([
+                        html.Br(),
+                        html.Hr(style={'borderWidth': "0.2vh", "width": "100%", "borderColor": "#deb522",
+                                       "opacity": "unset"}),
+                        html.Div(id="byimpactedvehicles",
+                                 children=[html.H5("Results by impacted vehicles")],
+                                 style={'marginTop': '5px', 'color': '#deb522'}
+                                 ),
+                        dbc.Row([
+                            dbc.Col(dcc.RadioItems(
+                                id='vehicle-ranking-order',
+                                options=[{'label': ' Most impacted', 'value': 'most'},
+                                         {'label': ' Least impacted', 'value': 'least'}],
+                                value='most', inline=True, inputStyle={'marginLeft': '10px'},
+                                style={'color': '#deb522'}
+                            ), width=5),
+                            dbc.Col(dcc.Dropdown(
+                                id='vehicle-type-dropdown',
+                                options=[{'label': 'All vehicle types', 'value': 'all'}]
+                                        + [{'label': name, 'value': name} for name in vehicle_impact['types']],
+                                value='all', clearable=False, style={'color': 'black'}
+                            ), width=4),
+                            dbc.Col(dcc.Input(id='vehicle-ranking-size', type='number', min=1, max=100, step=1,
+                                              value=15, debounce=True, style={'width': '100%'}), width=3),
+                        ], style={'marginTop': '15px'}),
+                        dcc.Loading([html.Div(id='vehicle-ranking')], type='default', color='#deb522'),
+                        dcc.Input(id='vehicle-search', type='text', placeholder='Find a vehicle by id...',
+                                  debounce=True, style={'marginTop': '15px', 'width': '50%'}),
+                        html.Div(id='vehicle-search-result', style={'marginTop': '10px', 'color': '#deb522'}),
+                    ] if vehicle_impact is not None else [])), width=7)
+            ])
+        ], style={'backgroundColor': 'black', 'padding': '0px'})
+    ], style={'backgroundColor': 'black', 'minHeight': '100vh'})
+
+
+def loading_layout(name):
+    """Build the page shown while a dataset is loading."""
+    return html.Div([
+        dcc.Store(id='dataset', data=name),
+        dcc.Interval(id='loading-interval', interval=1000),
+        dcc.Store(id='loading-state', data='loading'),
+        html.H5("TrafficTwin", style={'color': '#deb522'}),
+        html.Div(id='loading-message', children="Loading the datasets...", style={'marginTop': '25px'}),
+        dbc.Progress(id='loading-progress', value=0, color='warning', striped=True, animated=True,
+                     style={'marginTop': '10px', 'width': '50%'}),
+    ], style={'backgroundColor': 'black', 'color': '#deb522', 'minHeight': '100vh', 'padding': '20px'})
+
+
+def unknown_dataset_layout(name):
+    """Build the page of a dataset that is not in the registry, linking to the ones that are."""
+    return html.Div([
+        html.H5("TrafficTwin", style={'color': '#deb522'}),
+        html.Div(f"Unknown dataset {name}, the datasets are:", style={'marginTop': '25px'}),
+        html.Ul([html.Li(html.A(other, href='?' + urlencode({'dataset': other}), style={'color': '#deb522'}))
+                 for other in registry['entries']]),
+    ], style={'backgroundColor': 'black', 'color': '#deb522', 'minHeight': '100vh', 'padding': '20px'})
+
+
+def requested_dataset(search):
+    """Name of the dataset of a page URL (?dataset=NAME), None for the default one."""
+    return parse_qs((search or '').lstrip('?')).get('dataset', [None])[0]
+
+
+# The page is chosen by serve_page() from the URL
+app.layout = html.Div([dcc.Location(id='url'), html.Div(id='page')])
 
 
 # --- Callback functions ---
 
-# Clientside callback to get the window size
+# Page callback: the loading page until the dataset of the URL is loaded, then its dashboard
+@app.callback(
+    Output('page', 'children'),
+    Input('url', 'search')
+)
+def serve_page(search):
+    """Serve the page of the dataset of the URL (and start loading it), the dashboard being built once per loading."""
+    name = requested_dataset(search)
+    try:
+        entry = dataset_entry(registry, name)
+    except KeyError:
+        return unknown_dataset_layout(name)
+    dataset = entry['dataset']
+    if dataset is None:
+        return loading_layout(name or registry['default'])
+    if dataset['layout'] is None:
+        dataset['layout'] = build_layout(dataset_snapshot(dataset))
+    return dataset['layout']
+
+
+# Dataset picker callback, opening the page of the chosen dataset
+@app.callback(
+    Output('url', 'search'),
+    Input('dataset-picker', 'value'),
+    State('dataset', 'data'),
+    prevent_initial_call=True
+)
+def select_dataset(name, current):
+    """Go to the page of another dataset."""
+    if name == current:
+        raise PreventUpdate
+    return '?' + urlencode({'dataset': name})
+
+
+# Loading progress callback, polled until the datasets are ready
+@app.callback(
+    Output('loading-message', 'children'),
+    Output('loading-progress', 'value'),
+    Output('loading-state', 'data'),
+    Input('loading-interval', 'n_intervals'),
+    State('dataset', 'data')
+)
+def update_loading(_, name):
+    """Report the loading step in progress."""
+    entry = dataset_entry(registry, name)
+    loading_status = entry['status']
+    if loading_status['error']:
+        return "Loading failed: " + loading_status['error'] + " (reload the page to try again)", 100, 'error'
+    if entry['dataset'] is not None:
+        return "Ready", 100, 'ready'
+    step, steps = loading_status['step'], loading_status['steps']
+    return f"{loading_status['message']} ({step}/{steps})", 100 * max(step - 1, 0) / steps, 'loading'
+
+
+# Clientside callback reloading the page (now the dashboard) once the datasets are ready
 app.clientside_callback(
-    """
-    function(n_intervals, current_data) {
-        var width = window.innerWidth;
+    ClientsideFunction(namespace='layout', function_name='reloadWhenReady'),
+    Output('loading-interval', 'disabled'),
+    Input('loading-state', 'data')
+)
 
-        if (current_data && current_data.width === width) {
-            return window.dash_clientside.no_update;
-        }
-        return {'width': width};
-    }
-    """,
+# Clientside callback to get the window size, refreshed by the browser resize event
+app.clientside_callback(
+    ClientsideFunction(namespace='layout', function_name='trackWindowWidth'),
     Output('myDivInfo', 'data'),
-    Input('interval-component', 'n_intervals'),
-    State('myDivInfo', 'data')  # Estado para obtener el tamaño de ventana actual almacenado
+    Input('myDivInfo', 'id')
+)
+
+
+# Clientside callback to update the title size based on window width
+app.clientside_callback(
+    ClientsideFunction(namespace='layout', function_name='titleSize'),
+    Output('titleSizeStore', 'data'),
+    Input('myDivInfo', 'data'),
+    State('titleSizeStore', 'data')
+)
+
+
+# Clientside callback to wrap the figure titles, so a resize never reaches the server
+app.clientside_callback(
+    ClientsideFunction(namespace='layout', function_name='wrapTitles'),
+    Output({'type': 'titled-graph', 'index': ALL}, 'figure'),
+    Input('titleSizeStore', 'data'),
+    Input({'type': 'titled-graph', 'index': ALL}, 'figure')
+)
+
+
+# Clientside callback showing the zones below --zone_zoom and the streets from it, without redrawing the map, and
+# requesting the streets the first time they are shown
+app.clientside_callback(
+    ClientsideFunction(namespace='layout', function_name='switchMapLayers'),
+    Output('map-layer-shown', 'data'),
+    Output('map-streets-request', 'data'),
+    Input('map2', 'zoom'),
+    State('map-zone-zoom', 'data'),
+    State('closed_roads_maps_with', 'data')
 )
 
 
+# Street layer of a map aggregated by zone, only built and sent once it is zoomed in from --zone_zoom
+@app.callback(
+    Output('closed_roads_maps_with', 'data'),
+    Input('map-streets-request', 'data'),
+    State('traffic-dropdown', 'value'),
+    State('my-range-slider', 'value'),
+    State('significant-only', 'value'),
+    State('dataset', 'data'),
+    prevent_initial_call=True
+)
+@instrument('load_street_layer')
+@profiled('load_street_layer')
+@requires_data
+def load_street_layer(dataset, _, traffic, timeframes, significant_only):
+    """Streets GeoJSON of the map shown, from the view cache filled when the map was built."""
+    return map_data(dataset, traffic, selected_time_frames(dataset, timeframes), significant_only)['streets']
+
+
+# Follow mode callback, extending the time frame slider with the intervals written since the page was loaded
+@app.callback(
+    Output('my-range-slider', 'marks'),
+    Output('my-range-slider', 'max'),
+    Output('my-range-slider', 'value'),
+    Input('follow-interval', 'n_intervals'),
+    State('my-range-slider', 'max'),
+    State('my-range-slider', 'value'),
+    State('dataset', 'data'),
+    prevent_initial_call=True
+)
+@requires_data
+def extend_time_slider(dataset, _, slider_max, timeframes):
+    """Add the new intervals to the slider; a selection reaching the last interval keeps following it."""
+    new_max = len(dataset['time_intervals_marks']) - 1
+    if new_max == slider_max:
+        raise PreventUpdate
+    if timeframes[1] == slider_max:
+        timeframes = [timeframes[0], new_max]
+    return slider_marks(dataset), new_max, timeframes
+
+
 # Map update callback
 @app.callback(
     [Output('description_map_plot', 'children'),
      Output('map_plot', 'children'), Output('map_color_scale', 'children')],
     [Input('traffic-dropdown', 'value'),
      Input('my-range-slider', 'value'),
-     Input('map_view_state', 'data')]
+     Input('map_view_state', 'data'),
+     Input('significant-only', 'value')],
+    State('dataset', 'data')
 )
-def update_map_plot(traffic, timeframes, view_state):
+@instrument('update_map_plot')
+@profiled('update_map_plot')
+@requires_data
+def update_map_plot(dataset, traffic, timeframes, view_state, significant_only):
     """Update the map plot based on selected traffic, timeframes, and view state."""
-    list_timeframe_string = []
-    list_timeframe_split = []
-    list_timeframe_in_seconds = []
-    if timeframes[0] != timeframes[1]:
-        time_frames = list(range(timeframes[0], timeframes[1]))
-    else:
-        time_frames = list(range(0, len_time_intervals_string))
+    # The usage only ranks the indicators to warm up
+    if dataset['options'].warm_up and ctx.triggered_id != 'map_view_state':
+        record_usage(traffic)
+    return map_view(dataset, traffic, selected_time_frames(dataset, timeframes), significant_only)
+
+
+def map_view(dataset, traffic, time_frames, significant_only):
+    """map_outputs() through the view cache."""
+    return cached(('map', traffic, tuple(time_frames), bool(significant_only)),
+                  lambda: map_outputs(dataset, traffic, time_frames, significant_only), dataset['version'])
 
-    [list_timeframe_string.append(time_intervals_string[i]) for i in time_frames]
 
-    timeframe_from = get_from_time_intervals_string(list_timeframe_string)
-    timeframe_to = get_to_time_intervals_string(list_timeframe_string)
+def map_data(dataset, traffic, time_frames, significant_only):
+    """map_layer_data() through the view cache, shared by the map and its street layer."""
+    return cached(('map_data', traffic, tuple(time_frames), bool(significant_only)),
+                  lambda: map_layer_data(dataset, traffic, time_frames, significant_only), dataset['version'])
 
-    [list_timeframe_split.append(re.split(" ", list_timeframe_string[i])) for i in range(len(list_timeframe_string))]
-    [list_timeframe_in_seconds.append(selected_timeframe_in_seconds(list_timeframe_split[i])) for i in
-     range(len(list_timeframe_split))]
+
+def map_layer_data(dataset, traffic, time_frames, significant_only):
+    """Streets compared, difference of every street, color scale and classes, and streets GeoJSON of an indicator over
+    the selected intervals."""
+    time_intervals_string = dataset['time_intervals_string']
+    with timed('slicing'):
+        list_timeframe_in_seconds = [selected_timeframe_in_seconds(re.split(" ", time_intervals_string[i]))
+                                     for i in time_frames]
 
     traffic_indicator = "edge_" + get_traffic_name(traffic)
 
-    data_diff, df_data = map_to_geojson(road_network_json_file, dataframe_without, dataframe_with,
-                                        list_timeframe_in_seconds,
-                                        traffic_indicator)
-    colorscale = Color_scale()
-    classes = define_quantile(data_diff)
-    export_png(df_data, colorscale, classes, traffic_indicator)
-
-    map_diff = dl.Map([
-        dl.TileLayer(url=url, attribution=attribution),
-        dl.GeoJSON(data=read_geojson_diff(), id="closed_roads_maps_with",
-                   hideout=dict(colorscale=colorscale, classes=classes, colorProp=traffic_indicator, tname=traffic,
-                                closed=closed_roads),
-                   style=style_color_closed, zoomToBounds=True, onEachFeature=on_each_feature_closed)
-    ], center=(50.82911264776447, 4.369035991425782), zoom=14, zoomControl=False, minZoom=14,
-        style={'height': '56vh', 'width': '100%'}, id="map2")
+    # The map is written to and read back from the same files, one map at a time
+    with map_files_lock:
+        with timed('aggregation'):
+            load_street_indicator(dataset, traffic_indicator)
+            edges = analysis_edges(dataset, traffic_indicator, list_timeframe_in_seconds, significant_only)
+            data_diff, df_data = map_to_geojson(dataset['network_file'], dataset['dataframe_without'],
+                                                dataset['dataframe_with'], list_timeframe_in_seconds,
+                                                traffic_indicator, edges=edges)
+            colorscale = Color_scale()
+            classes = define_quantile(data_diff)
+        with timed('png_export'):
+            export_png(df_data, colorscale, classes, traffic_indicator, dpi=dataset['options'].png_dpi)
+        map_diff_data = read_geojson_diff()
+    return dict(edges=edges, data_diff=data_diff, colorscale=colorscale, classes=classes, streets=map_diff_data)
+
+
+def map_outputs(dataset, traffic, time_frames, significant_only):
+    """Description, map and color scale of an indicator over the selected intervals."""
+    time_intervals_string = dataset['time_intervals_string']
+    impact_edges = dataset['impact_edges']
+    list_timeframe_string = []
+    with timed('slicing'):
+        [list_timeframe_string.append(time_intervals_string[i]) for i in time_frames]
+
+        timeframe_from = get_from_time_intervals_string(list_timeframe_string)
+        timeframe_to = get_to_time_intervals_string(list_timeframe_string)
+
+    traffic_indicator = "edge_" + get_traffic_name(traffic)
+    layer_data = map_data(dataset, traffic, time_frames, significant_only)
+    edges, colorscale, classes = layer_data['edges'], layer_data['colorscale'], layer_data['classes']
+
+    with timed('figure_build'):
+        hideout = dict(colorscale=colorscale, classes=classes, colorProp=traffic_indicator, tname=traffic,
+                       closed=dataset['closed_roads'])
+        if dataset['zone_layer'] is None:
+            streets_layer = dl.GeoJSON(data=layer_data['streets'], id="closed_roads_maps_with", hideout=hideout,
+                                       style=style_color_closed, zoomToBounds=True,
+                                       onEachFeature=on_each_feature_closed)
+            map_layers = [streets_layer]
+            min_zoom = 14
+        else:
+            # Zones below --zone_zoom, streets from it, switched in the browser (see layout.switchMapLayers). The
+            # streets are only sent by load_street_layer once the map is zoomed in, the zones frame the network.
+            streets_layer = dl.GeoJSON(data=EMPTY_FEATURES, id="closed_roads_maps_with", hideout=hideout,
+                                       style=style_color_closed, onEachFeature=on_each_feature_closed)
+            zones_layer = dl.GeoJSON(data=zone_features(dataset['zone_layer'], layer_data['data_diff'],
+                                                        traffic_indicator),
+                                     id="zones_map",
+                                     hideout=dict(colorscale=colorscale, classes=classes, colorProp=traffic_indicator,
+                                                  tname=traffic),
+                                     style=style_zone, zoomToBounds=True, onEachFeature=on_each_feature_zone)
+            map_layers = [dl.Pane(streets_layer, name='streets', style={'zIndex': 400}),
+                          dl.Pane(zones_layer, name='zones', style={'zIndex': 401, 'display': 'none'})]
+            min_zoom = 8
+        map_diff = dl.Map([
+            dl.TileLayer(url=url, attribution=attribution),
+        ] + map_layers, center=map_center(dataset), zoom=14, zoomControl=False, minZoom=min_zoom,
+            style={'height': '56vh', 'width': '100%'}, id="map2")
     return (
         html.Div(
             [
-                '- Showing the difference in terms of ' + traffic + ' for the time interval: ' + timeframe_from + ' to ' + timeframe_to],
+                '- Showing the difference in terms of ' + traffic + ' for the time interval: ' + timeframe_from + ' to ' + timeframe_to
+                + ('' if impact_edges is None else f' (the {len(impact_edges)} streets at most '
+                                                   f'{dataset["options"].impact_hops} junctions away from the closed '
+                                                   f'roads)')
+                + ('' if edges is None or edges is impact_edges else
+                   f', {len(edges)} streets with a significant difference')],
             style={'color': '#deb522', 'text-indent': '1mm'}),
         html.Div([
             html.Div([map_diff], style={'backgroundColor': 'black', 'display': 'block', 'color': '#deb522'}),
@@ -484,72 +928,38 @@ def update_map_plot(traffic, timeframes, view_state):
 
 
 # Collapse button callback
-@app.callback(
+app.clientside_callback(
+    """
+    function(n_clicks) {
+        return n_clicks % 2 ? "Show map" : "Hide map";
+    }
+    """,
     Output('collapse-button', 'children'),
-    Input('collapse-button', 'n_clicks'))
-def update_button(n_clicks):
-    """Toggle button text based on the number of clicks."""
-    return "Show map" if n_clicks % 2 else "Hide map"
-
-
-# Modal toggle callback
-@app.callback(Output("modal", "is_open"),
-              [Input("open", "n_clicks")],
-              [State("modal", "is_open")])
-def toggle_modal(n1, is_open):
-    """Toggle the visibility of the modal."""
-    if n1:
-        return not is_open
-    return is_open
-
-
-@app.callback(Output("indicators_modal", "is_open"),
-              [Input("indicators_open", "n_clicks"),
-               ],
-              [State("indicators_modal", "is_open")])
-def toggle_indicators_modal(n1, is_open):
-    """Toggle the 'Indicators' modal."""
-    if n1:
-        return not is_open
-    return is_open
+    Input('collapse-button', 'n_clicks')
+)
 
 
-@app.callback(
-    Output("collapse", "is_open"),
-    [Input("collapse-button", "n_clicks")],
-    [State("collapse", "is_open")],
+# Modal and collapse toggle callbacks
+app.clientside_callback(
+    ClientsideFunction(namespace='layout', function_name='toggle'),
+    Output("modal", "is_open"),
+    Input("open", "n_clicks"),
+    State("modal", "is_open")
 )
-def toggle_collapse(n, is_open):
-    """Toggle the collapse functionality for the closed streets section."""
-    if n:
-        return not is_open
-    return is_open
-
 
-# Font size update based on window width
-@app.callback(
-    Output('titleSizeStore', 'data'),
-    Input('myDivInfo', 'data'),
-    State('titleSizeStore', 'data')
+app.clientside_callback(
+    ClientsideFunction(namespace='layout', function_name='toggle'),
+    Output("indicators_modal", "is_open"),
+    Input("indicators_open", "n_clicks"),
+    State("indicators_modal", "is_open")
 )
-def update_FontSize(myDivInfo, current_title_size):
-    """Update the font size based on window width."""
-    if myDivInfo is not None:
-        window_width = myDivInfo['width']
-        if window_width < 800:
-            new_paragraph = 30
-        elif window_width < 1000:
-            new_paragraph = 40
-        elif window_width < 1200:
-            new_paragraph = 60
-        elif window_width < 1400:
-            new_paragraph = 70
-        else:
-            new_paragraph = 80
 
-        if new_paragraph != current_title_size:
-            return new_paragraph
-    return dash.no_update
+app.clientside_callback(
+    ClientsideFunction(namespace='layout', function_name='toggle'),
+    Output("collapse", "is_open"),
+    Input("collapse-button", "n_clicks"),
+    State("collapse", "is_open")
+)
 
 
 # Street selection callback
@@ -557,23 +967,65 @@ def update_FontSize(myDivInfo, current_title_size):
     Output("geojson", "hideout"),
     Output('string_names', 'children'),
     Output('dict_names', 'data'),
+    Output('street-search', 'value'),
     Input("geojson", "n_clicks"),
+    Input('street-search', 'value'),
     State("geojson", "clickData"),
     State("geojson", "hideout"),
+    State('dataset', 'data'),
     prevent_initial_call=True)
-def toggle_select(_, feature, hideout):
-    """Handle street selection on the map."""
+@instrument('toggle_select')
+@profiled('toggle_select')
+@requires_data
+def toggle_select(dataset, _, street, feature, hideout):
+    """Handle street selection on the map, or of a whole street (all its edges) in the street picker."""
+    street_index, dict_names = dataset['street_index'], dataset['dict_names']
     selected = hideout["selected"]
-    id = feature["properties"]["id"]
-    name = feature["properties"]["name"]
-    if id in selected:
-        selected.remove(id)
-        del dict_names[id]
+    if ctx.triggered_id == 'street-search':
+        if street is None:
+            raise PreventUpdate
+        edges = street_index['streets'][street]['edges']
+        name = street_index['streets'][street]['name']
+        if all(id in selected for id in edges):
+            # The street is already selected: picking it again unselects it
+            for id in edges:
+                selected.remove(id)
+                del dict_names[id]
+        else:
+            for id in edges:
+                if id not in selected:
+                    selected.append(id)
+                    dict_names[id] = name
     else:
-        selected.append(id)
-        dict_names[id] = name
+        id = feature["properties"]["id"]
+        name = feature["properties"]["name"]
+        if id in selected:
+            selected.remove(id)
+            del dict_names[id]
+        else:
+            selected.append(id)
+            dict_names[id] = name
     return hideout, html.Div(
-        ['Selected street:'] + [html.Div(f"{value} (id:{key})") for (key, value) in dict_names.items()]), dict_names
+        ['Selected street:'] + [html.Div(f"{value} (id:{key})") for (key, value) in dict_names.items()]), \
+        dict_names, None
+
+
+# Street picker callback, offering the streets matching the words typed
+@app.callback(
+    Output('street-search', 'options'),
+    Input('street-search', 'search_value'),
+    State('dataset', 'data'),
+    prevent_initial_call=True)
+@instrument('search_streets')
+@requires_data
+def update_street_search(dataset, search_value):
+    """Offer the streets having a word starting with each word typed."""
+    if not search_value:
+        raise PreventUpdate
+    street_index = dataset['street_index']
+    # The options are already matched, 'search' keeps the dropdown from filtering them again by label
+    return [{'label': street_option(street_index, position), 'value': position, 'search': search_value}
+            for position in search_streets(street_index, search_value)]
 
 
 # Traffic tab update callback
@@ -582,41 +1034,64 @@ def toggle_select(_, feature, hideout):
     [Input('traffic-dropdown', 'value'),
      Input('my-range-slider', 'value'),
      Input("geojson", "hideout"),
-     Input('titleSizeStore', 'data'),
-     Input("geojson", "n_clicks")]
+     Input("geojson", "n_clicks"),
+     Input('significant-only', 'value')],
+    State('dataset', 'data')
 )
-def update_tab(traffic, timeframes, hideout, title_size, string_names):
+@instrument('update_tab_traffic')
+@profiled('update_tab_traffic')
+@requires_data
+def update_tab(dataset, traffic, timeframes, hideout, string_names, significant_only):
     """Update the content of the tabs based on selected traffic, time intervals, and selected streets."""
+    return tab_view(dataset, traffic, selected_time_frames(dataset, timeframes), hideout, dict(dataset['dict_names']),
+                    significant_only)
+
+
+def tab_view(dataset, traffic, time_frames, hideout, names, significant_only):
+    """tab_outputs() through the view cache."""
+    return cached(('tab', traffic, tuple(time_frames), tuple(hideout['selected']), tuple(names.items()),
+                   bool(significant_only)),
+                  lambda: tab_outputs(dataset, traffic, time_frames, hideout, names, significant_only),
+                  dataset['version'])
+
+
+def tab_outputs(dataset, traffic, time_frames, hideout, dict_names, significant_only):
+    """Figures of the traffic tab for an indicator over the selected intervals and the selected streets."""
+    time_intervals_string = dataset['time_intervals_string']
+    len_time_intervals_string = len(time_intervals_string)
     list_timeframe_string = []
     list_timeframe_split = []
     list_timeframe_in_seconds = []
-    if timeframes[0] != timeframes[1]:
-        time_frames = list(range(timeframes[0], timeframes[1]))
-    else:
-        time_frames = list(range(0, len_time_intervals_string))
-    [list_timeframe_string.append(time_intervals_string[i]) for i in time_frames]
-    geo_data = read_geojson()
-    street_data_without, street_data_with = load_street_data(get_traffic_name(traffic))
+    with timed('slicing'):
+        [list_timeframe_string.append(time_intervals_string[i]) for i in time_frames]
+        timeframe_from = get_from_time_intervals_string(list_timeframe_string)
+        timeframe_to = get_to_time_intervals_string(list_timeframe_string)
+
+        [list_timeframe_split.append(re.split(" ", list_timeframe_string[i])) for i in
+         range(len(list_timeframe_string))]
+        [list_timeframe_in_seconds.append(selected_timeframe_in_seconds(list_timeframe_split[i])) for i in
+         range(len(list_timeframe_split))]
+    geo_data = read_geojson(dataset)
+    with timed('aggregation'):
+        edges = analysis_edges(dataset, "edge_" + get_traffic_name(traffic), list_timeframe_in_seconds,
+                               significant_only)
+        street_data_without, street_data_with = load_street_data(dataset, get_traffic_name(traffic),
+                                                                 hideout['selected'], edges)
     traffic_name = get_traffic(traffic)
     traffic_lowercase = get_traffic_lowercase(traffic)
-    timeframe_from = get_from_time_intervals_string(list_timeframe_string)
-    timeframe_to = get_to_time_intervals_string(list_timeframe_string)
-
-    [list_timeframe_split.append(re.split(" ", list_timeframe_string[i])) for i in range(len(list_timeframe_string))]
-    [list_timeframe_in_seconds.append(selected_timeframe_in_seconds(list_timeframe_split[i])) for i in
-     range(len(list_timeframe_split))]
-
-    figure_bystreets = generate_visualizations_bystreets(street_data_without, street_data_with, traffic_name, traffic,
-                                                         dict_names, list_timeframe_in_seconds, list_timeframe_string,
-                                                         len_time_intervals_string, timeframe_from, timeframe_to,
-                                                         title_size)
-    figure_impacted = generate_visualizations_impacted(street_data_without, street_data_with, traffic_name,
-                                                       traffic_lowercase, list_timeframe_in_seconds,
-                                                       list_timeframe_string, len_time_intervals_string, geo_data,
-                                                       hideout, dict_names, timeframe_from, timeframe_to, title_size)
-    figure_byinterval = generate_visualizations_byinterval(street_data_without, street_data_with, traffic_name, traffic,
-                                                           list_timeframe_in_seconds, timeframe_from, timeframe_to,
-                                                           hideout, dict_names, title_size)
+
+    with timed('figure_build'):
+        figure_bystreets = generate_visualizations_bystreets(street_data_without, street_data_with, traffic_name,
+                                                             traffic, dict_names, list_timeframe_in_seconds,
+                                                             list_timeframe_string, len_time_intervals_string,
+                                                             timeframe_from, timeframe_to)
+        figure_impacted = generate_visualizations_impacted(street_data_without, street_data_with, traffic_name,
+                                                           traffic_lowercase, list_timeframe_in_seconds,
+                                                           list_timeframe_string, len_time_intervals_string, geo_data,
+                                                           hideout, dict_names, timeframe_from, timeframe_to)
+        figure_byinterval = generate_visualizations_byinterval(street_data_without, street_data_with, traffic_name,
+                                                               traffic, list_timeframe_in_seconds, timeframe_from,
+                                                               timeframe_to, hideout, dict_names)
     street_condition = ""
     if bool(dict_names):
         impacted = "This figure shows the difference in " + traffic_lowercase + " of the selected streets, in two scenarios: with and without deviations."
@@ -628,7 +1103,7 @@ def update_tab(traffic, timeframes, hideout, title_size, string_names):
         street_condition = " The legend on the right helps to identify which line belongs to which street and condition."
     return (
         html.Div([
-            dcc.Graph(id='graph1', figure=figure_bystreets),
+            dcc.Graph(id={'type': 'titled-graph', 'index': 'graph1'}, figure=figure_bystreets),
         ], style={'width': '100%', 'display': 'inline-block'}),
         html.Div(
             id="histogram_bystreet",
@@ -647,7 +1122,7 @@ def update_tab(traffic, timeframes, hideout, title_size, string_names):
                  style={'marginTop': '5px', 'color': '#deb522'}
                  ),
         html.Div([
-            dcc.Graph(id='graph2', figure=figure_impacted, style={'height': '850px'}),
+            dcc.Graph(id={'type': 'titled-graph', 'index': 'graph2'}, figure=figure_impacted, style={'height': '850px'}),
         ], style={'width': '100%', 'display': 'inline-block'}),
         html.Div(
             id="histogram5",
@@ -666,7 +1141,7 @@ def update_tab(traffic, timeframes, hideout, title_size, string_names):
                  style={'marginTop': '5px', 'color': '#deb522'}
                  ),
         html.Div([
-            dcc.Graph(id='graph3', figure=figure_byinterval),
+            dcc.Graph(id={'type': 'titled-graph', 'index': 'graph3'}, figure=figure_byinterval),
         ], style={'width': '100%', 'display': 'inline-block'}),
         html.Div(
             id="byinterval",
@@ -685,18 +1160,33 @@ def update_tab(traffic, timeframes, hideout, title_size, string_names):
 # Vehicle tab update callback
 @app.callback(
     Output('tabs-content_vehicles', 'children'),
-    [Input('vehicle-dropdown', 'value'),
-     Input('titleSizeStore', 'data')]
+    [Input('vehicle-dropdown', 'value')],
+    State('dataset', 'data')
 )
-def update_tab(vehicle, title_size):
+@instrument('update_tab_vehicles')
+@profiled('update_tab_vehicles')
+@requires_data
+def update_tab(dataset, vehicle):
     """Update the content of the vehicle tab based on selected vehicle indicator."""
+    vehicle_data_without, vehicle_data_with = dataset['vehicle_data_without'], dataset['vehicle_data_with']
     veh_traffic = get_veh_traffic(vehicle)
     veh_expl = get_veh_explanation(vehicle)
-    figure_byvehicles = generate_visualizations_byvehicles(vehicle_data_without, vehicle_data_with,
-                                                           get_vehicle_name(vehicle), veh_traffic, title_size)
+    percentiles = ""
+    with timed('figure_build'):
+        if dataset['options'].trip_sketches:
+            traffic_indicator = "tripinfo_" + get_vehicle_name(vehicle)
+            figure_byvehicles = generate_visualizations_trip_statistics(vehicle_data_without, vehicle_data_with,
+                                                                        veh_traffic, traffic_indicator)
+            percentiles = " Median, 90th and 99th percentiles: " + "; ".join(
+                f"{name} {', '.join(f'{value:.1f}' for value in summary_quantiles(statistics, traffic_indicator).values())}"
+                for name, statistics in (("without deviations", vehicle_data_without),
+                                         ("with deviations", vehicle_data_with))) + "."
+        else:
+            figure_byvehicles = generate_visualizations_byvehicles(vehicle_data_without, vehicle_data_with,
+                                                                   get_vehicle_name(vehicle), veh_traffic)
     return (
         html.Div([
-            dcc.Graph(id='graph4', figure=figure_byvehicles),
+            dcc.Graph(id={'type': 'titled-graph', 'index': 'graph4'}, figure=figure_byvehicles),
         ], style={'width': '100%', 'display': 'inline-block'}),
         html.Div(
             id="byvehicles",
@@ -706,12 +1196,169 @@ def update_tab(vehicle, title_size):
                     children="The figure shows a comparison of the distribution of the " + veh_expl + " in two scenarios: "
                                                                                                       "with and without deviations in their route. The horizontal axis represents the " + veh_traffic +
                              "while the vertical axis shows the number of vehicles with those values. The blue bars correspond "
-                             "to vehicles without deviations, and the red bars to vehicles with deviations.",
+                             "to vehicles without deviations, and the red bars to vehicles with deviations." + percentiles,
+                ),
+            ], style={'color': '#deb522'})
+    )
+
+
+# Vehicles of the selected streets callback (only in the layout when a vehroute output is given)
+@app.callback(
+    Output('street-vehicles', 'children'),
+    [Input('vehicle-dropdown', 'value'),
+     Input("geojson", "hideout")],
+    State('dataset', 'data')
+)
+@instrument('update_street_vehicles')
+@profiled('update_street_vehicles')
+@requires_data
+def update_street_vehicles(dataset, vehicle, hideout):
+    """Compare the vehicle indicator of the trips that drove along the selected streets without deviations."""
+    if not hideout["selected"]:
+        return html.Div("Select streets on the map to compare the vehicles that passed through them.",
+                        style={'marginTop': '5px', 'color': '#deb522'})
+    traffic = get_vehicle_name(vehicle)
+    with timed('aggregation'):
+        trip_ids = trips_on_edges(dataset['route_index_without'], hideout["selected"])
+        values_without, values_with = vehicle_values(dataset['vehicle_impact'], "tripinfo_" + traffic, trip_ids)
+        still = None
+        if dataset['route_index_with'] is not None:
+            still = len(trip_ids.intersection(trips_on_edges(dataset['route_index_with'], hideout["selected"])))
+    with timed('figure_build'):
+        figure_street_vehicles = generate_visualizations_street_vehicles(values_without, values_with,
+                                                                         get_veh_traffic(vehicle),
+                                                                         dataset['dict_names'])
+    summary = f"{len(trip_ids)} vehicles passed through the selected streets without deviations"
+    if still is not None:
+        summary += f", {still} of them still pass through them with deviations"
+    return (
+        html.Div([
+            dcc.Graph(id={'type': 'titled-graph', 'index': 'graph6'}, figure=figure_street_vehicles),
+        ], style={'width': '100%', 'display': 'inline-block'}),
+        html.Div(
+            id="street_vehicles",
+            children=[
+                html.Div(
+                    id="expl_street_vehicles",
+                    children=summary + ". The figure compares the " + get_veh_explanation(vehicle) + " of these "
+                             "vehicles in two scenarios: with and without deviations in their route. The horizontal "
+                             "axis represents the " + get_veh_traffic(vehicle) + " while the vertical axis shows the "
+                             "number of vehicles with those values.",
+                ),
+            ], style={'color': '#deb522'})
+    )
+
+
+# Impacted vehicles ranking callback
+@app.callback(
+    Output('vehicle-ranking', 'children'),
+    [Input('vehicle-dropdown', 'value'),
+     Input('vehicle-ranking-order', 'value'),
+     Input('vehicle-type-dropdown', 'value'),
+     Input('vehicle-ranking-size', 'value')],
+    State('dataset', 'data')
+)
+@instrument('update_vehicle_ranking')
+@profiled('update_vehicle_ranking')
+@requires_data
+def update_vehicle_ranking(dataset, vehicle, order, vehicle_type, size):
+    """Show the most (or least) impacted vehicles for the selected vehicle indicator and vType."""
+    largest = order != 'least'
+    return cached(('ranking', vehicle, largest, vehicle_type, int(size or 15)),
+                  lambda: ranking_outputs(dataset, vehicle, largest, vehicle_type, size), dataset['version'])
+
+
+def ranking_outputs(dataset, vehicle, largest, vehicle_type, size):
+    """Figure of the most (or least) impacted vehicles."""
+    vehicle_impact = dataset['vehicle_impact']
+    traffic = get_vehicle_name(vehicle)
+    with timed('aggregation'):
+        positions = ranked_vehicles(vehicle_impact, "tripinfo_" + traffic, int(size or 15), largest,
+                                    None if vehicle_type == 'all' else vehicle_type)
+        ranking = vehicle_rows(vehicle_impact, "tripinfo_" + traffic, positions)
+    with timed('figure_build'):
+        figure_ranking = generate_visualizations_ranking(ranking, traffic, largest)
+    return (
+        html.Div([
+            dcc.Graph(id={'type': 'titled-graph', 'index': 'graph5'}, figure=figure_ranking),
+        ], style={'width': '100%', 'display': 'inline-block'}),
+        html.Div(
+            id="ranking_vehicles",
+            children=[
+                html.Div(
+                    id="expl_ranking_vehicles",
+                    children="The figure shows the vehicles whose " + get_veh_explanation(vehicle) + " changed the "
+                             + ("most" if largest else "least") + " with deviations in their route. The horizontal "
+                             "axis shows the id of the vehicles, while the vertical axis shows the difference "
+                             "(with - without deviations).",
                 ),
             ], style={'color': '#deb522'})
     )
 
 
+# Vehicle search callback
+@app.callback(
+    Output('vehicle-search-result', 'children'),
+    Input('vehicle-search', 'value'),
+    State('dataset', 'data'),
+    prevent_initial_call=True
+)
+@instrument('find_vehicle')
+@requires_data
+def update_vehicle_search(dataset, trip_id):
+    """Show every vehicle indicator of a trip, with and without deviations."""
+    if not trip_id:
+        return None
+    vehicle_impact = dataset['vehicle_impact']
+    position = find_vehicle(vehicle_impact, trip_id.strip())
+    if position is None:
+        return "No vehicle with the id " + trip_id
+    rows = []
+    for label in VEHICLE_OPTIONS:
+        indicator = "tripinfo_" + get_vehicle_name(label)
+        if indicator in vehicle_impact['diff']:
+            row = vehicle_rows(vehicle_impact, indicator, [position]).iloc[0]
+            rows.append(html.Tr([html.Td(label), html.Td(row['without']), html.Td(row['with']),
+                                 html.Td(row['diff'])]))
+    code = vehicle_impact['type_codes'][position]
+    vehicle_type = vehicle_impact['types'][code] if code >= 0 else ''
+    return html.Div([
+        html.Div(f"Vehicle {trip_id} ({vehicle_type})" if vehicle_type else f"Vehicle {trip_id}"),
+        html.Table([html.Tr([html.Th("Indicator"), html.Th("Without deviations"), html.Th("With deviations"),
+                             html.Th("Difference")])] + rows, style={'width': '100%'})
+    ])
+
+
+# Latency histograms of the callbacks above, served on /metrics
+register_metrics(app)
+# Slowest profiled invocations (TULIPE_PROFILE=1, or ?profile=1 with TULIPE_PROFILE_ALLOW_QUERY=1), served on /profiles
+register_profiling(server)
+register_export_api(server, export_datasets)
+
+
+# Liveness (always up once the server is) and readiness (once the default dataset is loaded) probes, with the state of
+# every dataset
+@server.route('/healthz')
+def healthz():
+    entry = registry['entries'][registry['default']]
+    return jsonify(status=entry_state(entry), **entry['status'],
+                   datasets={name: dict(state=entry_state(other), memory_mb=other['memory'] / 2 ** 20,
+                                        **other['status'])
+                             for name, other in registry['entries'].items()})
+
+
+@server.route('/readyz')
+def readyz():
+    # The default dataset is loaded at start, it is only unloaded once evicted
+    ready = entry_state(registry['entries'][registry['default']]) in ('ready', 'unloaded')
+    return jsonify(ready=ready), 200 if ready else 503
+
+
+# The default dataset is loaded before the server starts, or in the background (--background_loading, --follow); the
+# other ones on their first use
+dataset_entry(registry, background=options.background_loading or options.follow)
+
+
 if __name__ == '__main__':
     Timer(1, open_browser).start()
     app.run_server(port=8050, host='127.0.0.1')
@@ -0,0 +1,135 @@
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    layout: {
+        // Report the window width once on load and again (debounced) on every resize event
+        trackWindowWidth: function(id) {
+            if (!window.tulipeResizeListener) {
+                let timer = null;
+                window.tulipeResizeListener = function() {
+                    clearTimeout(timer);
+                    timer = setTimeout(function() {
+                        window.dash_clientside.set_props(id, {
+                            data: {
+                                width: window.innerWidth
+                            }
+                        });
+                    }, 150);
+                };
+                window.addEventListener('resize', window.tulipeResizeListener);
+            }
+            return {
+                width: window.innerWidth
+            };
+        },
+
+        // Number of characters per title line for the current window width
+        titleSize: function(myDivInfo, currentTitleSize) {
+            if (!myDivInfo) {
+                return window.dash_clientside.no_update;
+            }
+            const width = myDivInfo.width;
+            let newParagraph = 80;
+            if (width < 800) {
+                newParagraph = 30;
+            } else if (width < 1000) {
+                newParagraph = 40;
+            } else if (width < 1200) {
+                newParagraph = 60;
+            } else if (width < 1400) {
+                newParagraph = 70;
+            }
+            if (newParagraph === currentTitleSize) {
+                return window.dash_clientside.no_update;
+            }
+            return newParagraph;
+        },
+
+        // Wrap the figure titles to the current title size, only touching figures that need it
+        wrapTitles: function(titleSize, figures) {
+            const size = titleSize || 80;
+            return figures.map(function(figure) {
+                if (!figure || !figure.layout || !figure.layout.title || !figure.layout.title.text) {
+                    return window.dash_clientside.no_update;
+                }
+                const meta = figure.layout.meta || {};
+                if (meta.titleSize === size) {
+                    return window.dash_clientside.no_update;
+                }
+                const words = figure.layout.title.text.split('<br>').join(' ').split(' ').filter(Boolean);
+                const lines = [];
+                let line = '';
+                words.forEach(function(word) {
+                    if (line && (line.length + 1 + word.length) > size) {
+                        lines.push(line);
+                        line = word;
+                    } else {
+                        line = line ? line + ' ' + word : word;
+                    }
+                });
+                if (line) {
+                    lines.push(line);
+                }
+
+                // Smaller windows get a smaller font and a larger top margin for the extra lines
+                let fontSize = 16;
+                let margin = 100;
+                if (size <= 30) {
+                    fontSize = 12;
+                    margin = 160;
+                } else if (size <= 40) {
+                    margin = 140;
+                }
+                const layout = Object.assign({}, figure.layout, {
+                    title: Object.assign({}, figure.layout.title, {
+                        text: lines.join('<br>'),
+                        font: Object.assign({}, figure.layout.title.font, {
+                            size: fontSize
+                        })
+                    }),
+                    margin: Object.assign({}, figure.layout.margin, {
+                        t: margin
+                    }),
+                    meta: Object.assign({}, meta, {
+                        titleSize: size
+                    })
+                });
+                return Object.assign({}, figure, {
+                    layout: layout
+                });
+            });
+        },
+
+        // Reload the page (served as the dashboard from now on) once the datasets are loaded, and stop polling
+        reloadWhenReady: function(state) {
+            if (state === 'ready') {
+                window.location.reload();
+            }
+            return state === 'ready' || state === 'error';
+        },
+
+        // Show the zones pane of the difference map below the zone zoom level, and the streets pane from it. The
+        // streets are only sent by the server once shown: they are requested while their layer is still empty.
+        switchMapLayers: function(zoom, zoneZoom, streets) {
+            const no_update = window.dash_clientside.no_update;
+            if (zoneZoom === null || zoneZoom === undefined || zoom === null || zoom === undefined) {
+                return [no_update, no_update];
+            }
+            const shown = zoom < zoneZoom ? 'zones' : 'streets';
+            const streetsPane = document.querySelector('#map2 .leaflet-streets-pane');
+            const zonesPane = document.querySelector('#map2 .leaflet-zones-pane');
+            if (streetsPane && zonesPane) {
+                streetsPane.style.display = shown === 'streets' ? '' : 'none';
+                zonesPane.style.display = shown === 'zones' ? '' : 'none';
+            }
+            const empty = !streets || !streets.features || streets.features.length === 0;
+            return [shown, shown === 'streets' && empty ? Date.now() : no_update];
+        },
+
+        // Flip a boolean (modal or collapse) when its button has been clicked
+        toggle: function(n_clicks, is_open) {
+            if (n_clicks) {
+                return !is_open;
+            }
+            return is_open;
+        }
+    }
+});
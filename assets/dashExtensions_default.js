@@ -43,10 +43,33 @@ window.dashExtensions = Object.assign({}, window.dashExtensions, {
             }
 
             ,
-        function2: function(feature, layer, context) {
+        function2: function(feature, context) {
+                const {
+                    colorscale,
+                    classes,
+                    colorProp
+                } = context.hideout;
+                const value = feature.properties[colorProp];
+
+                let fillColor;
+                for (let i = 0; i < classes.length; ++i) {
+                    if (value > classes[i]) {
+                        fillColor = colorscale[i]; // set the fill color according to the class
+                    }
+                }
+                return {
+                    fillColor: fillColor,
+                    color: fillColor,
+                    weight: 1,
+                    fillOpacity: 0.5
+                };
+            }
+
+            ,
+        function3: function(feature, layer, context) {
             layer.bindTooltip(`${feature.properties.name} (id:${feature.properties.id})`)
         },
-        function3: function(feature, layer, context) {
+        function4: function(feature, layer, context) {
             const {
                 colorProp,
                 tname,
@@ -57,6 +80,13 @@ window.dashExtensions = Object.assign({}, window.dashExtensions, {
             } else {
                 layer.bindTooltip(`${feature.properties.name} (${tname}: ${feature.properties[colorProp].toFixed()})`)
             }
+        },
+        function5: function(feature, layer, context) {
+            const {
+                colorProp,
+                tname
+            } = context.hideout;
+            layer.bindTooltip(`${feature.properties.zone} (${tname}: ${feature.properties[colorProp].toFixed()}, mean of ${feature.properties.streets} streets)`)
         }
     }
 });
\ No newline at end of file
@@ -0,0 +1,315 @@
+import datetime
+import gc
+import json
+import optparse
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import geojson
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_sumo import generate_scenario, scenario_arguments, generate_edge_ids, generate_network_geojson
+from src.const import PNG_DPI, detectors_out_to_table, map_to_geojson, export_png, get_traffic, get_traffic_name, \
+    get_traffic_lowercase, get_vehicle_name, get_veh_traffic
+from src.data_loader import read_inputs, load_data, load_vehicles_data, frame_memory, load_indicator, \
+    columnar_sources
+from src.generate_visualizations_interval import generate_visualizations as generate_visualizations_byinterval
+from src.generate_visualizations_streets import generate_visualizations as generate_visualizations_bystreets
+from src.generate_visualizations_vehicles import generate_visualizations as generate_visualizations_byvehicles
+from src.generate_visualizations_impacted import generate_visualizations as generate_visualizations_impacted
+
+
+# --- End-to-end benchmark of the dashboard pipeline on synthetic SUMO outputs ---
+# Every stage is run `repeat` times without tracing to get the wall time, then once more under tracemalloc to get
+# the peak of Python/numpy allocations. Results are written as JSON so that runs of different versions can be
+# compared with --compare.
+
+DEFAULT_SCALES = ['500x4x2000', '2000x12x10000']
+# Streets of the map drawn by the PNG export stage, beyond the default scales
+PNG_EDGES = 100000
+COLOR_SCALE = ["#0F9D58", "#fff757", "#fbbc09", "#E94335", "#822F2B"]
+# Imported lazily by the dashboard (only when a map, a PNG or a bar chart is drawn), so a fresh import should not load
+# them: the import stages report the ones that were
+HEAVY_MODULES = ['geopandas', 'shapely', 'fiona', 'matplotlib.pyplot', 'plotly.express']
+IMPORT_PROBE = """
+import json, sys, time
+module, heavy = sys.argv[1], sys.argv[2].split(',')
+sys.argv = [module + '.py'] + sys.argv[3:]
+start = time.perf_counter()
+__import__(module)
+print(json.dumps({'wall_time_s': time.perf_counter() - start, 'loaded': [name for name in heavy if name in sys.modules]}))
+"""
+
+
+def parse_scale(scale):
+    """Parse a scale written as EDGESxINTERVALSxVEHICLES."""
+    edges, intervals, vehicles = (int(value) for value in scale.lower().split('x'))
+    return {'edges': edges, 'intervals': intervals, 'vehicles': vehicles}
+
+
+def measure(function, args, repeat, trace_memory):
+    """Run function(*args) and return its result, the list of wall times and the traced memory peak (MB)."""
+    wall_times = []
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = function(*args)
+        wall_times.append(time.perf_counter() - start)
+    peak_memory = None
+    if trace_memory:
+        gc.collect()
+        tracemalloc.start()
+        function(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak_memory = peak / 2 ** 20
+    return result, wall_times, peak_memory
+
+
+def time_intervals_string(intervals):
+    """Same human-readable interval labels as the ones shown by the dashboard."""
+    labels = []
+    for interval in intervals:
+        begin, end = interval.split('_to_')
+        labels.append(f"{datetime.timedelta(seconds=int(begin))} to {datetime.timedelta(seconds=int(end))}")
+    return labels
+
+
+def import_time(module, arguments):
+    """Time of the import of a module in a fresh interpreter (with arguments as its command line), and the
+    HEAVY_MODULES this import loaded."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get('PYTHONPATH')])))
+    completed = subprocess.run([sys.executable, '-c', IMPORT_PROBE, module, ','.join(HEAVY_MODULES)] + arguments,
+                               capture_output=True, text=True, env=env, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def read_inputs_cold(args, cache_dir):
+    """read_inputs() on a fresh process without any columnar cache: every file is converted and cached."""
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    del columnar_sources[:]
+    return read_inputs(args)
+
+
+def read_inputs_warm(args):
+    """read_inputs() on a fresh process with the columnar cache already written: only the ids are read."""
+    del columnar_sources[:]
+    return read_inputs(args)
+
+
+def load_indicators(dataframe_without, dataframe_with, traffic_indicator):
+    """Decode one indicator of both scenarios from the columnar cache, as done on its first use."""
+    for dataframe in (dataframe_without, dataframe_with):
+        dataframe.drop(columns=[traffic_indicator], inplace=True, errors='ignore')
+        load_indicator(dataframe, traffic_indicator)
+
+
+def load_street_tables(dataframe_without, dataframe_with, field_name):
+    """Same tables as load_street_data() in app.py."""
+    load_indicator(dataframe_without, "edge_" + field_name)
+    load_indicator(dataframe_with, "edge_" + field_name)
+    df_without = detectors_out_to_table(dataframe_without, field_name).fillna(0)
+    df_with = detectors_out_to_table(dataframe_with, field_name).fillna(0)
+    return df_without.align(df_with, fill_value=0)
+
+
+def table_memory(scale, paths, tables):
+    """Footprint of the loaded tables compared to the plain CSV tables (all columns, object ids, float64)."""
+    raw_tables = {'dataframe_without': load_data(paths['edgedata_without'], pd.DataFrame(), False),
+                  'dataframe_with': load_data(paths['edgedata_with'], pd.DataFrame(), False),
+                  'vehicle_data_without': load_vehicles_data(paths['tripinfo_without'], False),
+                  'vehicle_data_with': load_vehicles_data(paths['tripinfo_with'], False)}
+    memory = []
+    for name, table in tables.items():
+        memory.append({'scale': scale, 'table': name, 'bytes_before': frame_memory(raw_tables[name]),
+                       'bytes_after': frame_memory(table)})
+        print(f"  {name:<45} {memory[-1]['bytes_before'] / 2 ** 20:9.1f} MB -> "
+              f"{memory[-1]['bytes_after'] / 2 ** 20:9.1f} MB", file=sys.stderr)
+    return memory
+
+
+def run_scale(scale, work_dir, traffic, vehicle, repeat, trace_memory, seed):
+    """Generate a scenario of the given scale and time every stage of the pipeline on it."""
+    paths, closed = generate_scenario(work_dir, scale['edges'], scale['intervals'], scale['vehicles'], seed=seed)
+    results = []
+    memory = []
+
+    def stage(name, function, *args):
+        result, wall_times, peak_memory = measure(function, args, repeat, trace_memory)
+        results.append({'scale': scale, 'stage': name, 'wall_time_s': statistics.median(wall_times),
+                        'wall_times_s': wall_times, 'peak_memory_mb': peak_memory})
+        print(f"  {name:<45} {statistics.median(wall_times):9.3f} s"
+              + (f" {peak_memory:9.1f} MB" if peak_memory is not None else ""), file=sys.stderr)
+        return result
+
+    def import_stage(module, arguments):
+        imports = [import_time(module, arguments) for _ in range(repeat)]
+        wall_times = [result['wall_time_s'] for result in imports]
+        results.append({'scale': scale, 'stage': f'import[{module}]', 'wall_time_s': statistics.median(wall_times),
+                        'wall_times_s': wall_times, 'peak_memory_mb': None, 'loaded': imports[-1]['loaded']})
+        print(f"  {'import[' + module + ']':<45} {statistics.median(wall_times):9.3f} s"
+              + (f" (loaded {', '.join(imports[-1]['loaded'])})" if imports[-1]['loaded'] else ""), file=sys.stderr)
+
+    # Every stage writes its side files (CSV conversions, map_plot_diff.geojson, PNG) to the current directory
+    current_dir = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        cache_dir = os.path.join(work_dir, 'cache')
+        arguments = scenario_arguments(paths) + ['--cache_dir=' + cache_dir]
+        # Start-up of a server: the import of the dashboard, its data being loaded in the background
+        import_stage('src.const', [])
+        import_stage('app', arguments + ['--background_loading'])
+        stage('read_inputs[cold]', read_inputs_cold, arguments, cache_dir)
+        (dataframe_without, dataframe_with, vehicle_data_without, vehicle_data_with, road_network_json_file, _,
+         dict_names) = stage('read_inputs', read_inputs_warm, arguments)
+        memory = table_memory(scale, paths, {'dataframe_without': dataframe_without, 'dataframe_with': dataframe_with,
+                                             'vehicle_data_without': vehicle_data_without,
+                                             'vehicle_data_with': vehicle_data_with})
+
+        field_name = get_traffic_name(traffic)
+        traffic_indicator = "edge_" + field_name
+        stage('load_indicator', load_indicators, dataframe_without, dataframe_with, traffic_indicator)
+        stage('detectors_out_to_table', detectors_out_to_table, dataframe_without, field_name)
+        street_data_without, street_data_with = load_street_tables(dataframe_without, dataframe_with, field_name)
+
+        intervals = list(dataframe_without['interval_id'].unique())
+        intervals_string = time_intervals_string(intervals)
+        timeframe_from = intervals_string[0].split(' to ')[0]
+        timeframe_to = intervals_string[-1].split(' to ')[1]
+        data_diff, df_data = stage('map_to_geojson', map_to_geojson, road_network_json_file, dataframe_without,
+                                   dataframe_with, intervals, traffic_indicator)
+        p = [data_diff.quantile(q=q) for q in (0.25, 0.45, 0.65, 0.85)]
+        classes = [data_diff.min()] + p + [data_diff.max()]
+        stage('export_png', export_png, df_data, COLOR_SCALE, classes, traffic_indicator)
+
+        with open(road_network_json_file, encoding='utf-8') as f:
+            geo_data = geojson.load(f)
+        traffic_name = get_traffic(traffic)
+        traffic_lowercase = get_traffic_lowercase(traffic)
+        selected = list(street_data_without.index[:10])
+        for label, names in (('', {}), ('[10 streets]', {edge_id: edge_id for edge_id in selected})):
+            hideout = {'selected': list(names)}
+            stage('generate_visualizations_bystreets' + label, generate_visualizations_bystreets,
+                  street_data_without, street_data_with, traffic_name, traffic, names, intervals, intervals_string,
+                  len(intervals_string), timeframe_from, timeframe_to)
+            stage('generate_visualizations_impacted' + label, generate_visualizations_impacted,
+                  street_data_without, street_data_with, traffic_name, traffic_lowercase, intervals,
+                  intervals_string, len(intervals_string), geo_data, hideout, names, timeframe_from, timeframe_to)
+            stage('generate_visualizations_interval' + label, generate_visualizations_byinterval,
+                  street_data_without, street_data_with, traffic_name, traffic, intervals, timeframe_from,
+                  timeframe_to, hideout, names)
+        stage('generate_visualizations_vehicles', generate_visualizations_byvehicles, vehicle_data_without,
+              vehicle_data_with, get_vehicle_name(vehicle), get_veh_traffic(vehicle))
+    finally:
+        os.chdir(current_dir)
+    return results, memory
+
+
+def png_map_data(work_dir, n_edges, traffic_indicator, seed):
+    """Synthetic map of n_edges streets, as returned by map_to_geojson(): the network with random differences."""
+    import geopandas as gpd
+    network_file = os.path.join(work_dir, 'png_network.geojson')
+    generate_network_geojson(network_file, generate_edge_ids(n_edges), seed=seed)
+    df_data = gpd.read_file(network_file)
+    df_data[traffic_indicator] = np.random.default_rng(seed).normal(0, 10, len(df_data))
+    return df_data
+
+
+def run_png(n_edges, work_dir, traffic, repeat, trace_memory, seed):
+    """Time export_png() alone on a synthetic map of n_edges streets, at the resolution of the dashboard."""
+    os.makedirs(work_dir, exist_ok=True)
+    scale = {'edges': n_edges, 'intervals': 1, 'vehicles': 0}
+    traffic_indicator = "edge_" + get_traffic_name(traffic)
+    df_data = png_map_data(work_dir, n_edges, traffic_indicator, seed)
+    data_diff = df_data[traffic_indicator]
+    classes = [data_diff.min()] + [data_diff.quantile(q=q) for q in (0.25, 0.45, 0.65, 0.85)] + [data_diff.max()]
+    _, wall_times, peak_memory = measure(export_png, (df_data, COLOR_SCALE, classes, traffic_indicator,
+                                                      os.path.join(work_dir, 'map.png'), PNG_DPI),
+                                         repeat, trace_memory)
+    name = f'export_png[{PNG_DPI} dpi]'
+    print(f"  {name:<45} {statistics.median(wall_times):9.3f} s"
+          + (f" {peak_memory:9.1f} MB" if peak_memory is not None else ""), file=sys.stderr)
+    return [{'scale': scale, 'stage': name, 'wall_time_s': statistics.median(wall_times), 'wall_times_s': wall_times,
+             'peak_memory_mb': peak_memory}]
+
+
+def metadata():
+    """Describe the version and environment the benchmark ran on."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'commit': commit, 'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'pandas': pd.__version__, 'platform': platform.platform()}
+
+
+def compare(previous, current):
+    """Print the ratio current/previous of the wall time of every stage present in both runs."""
+    def key(result):
+        scale = result['scale']
+        return f"{scale['edges']}x{scale['intervals']}x{scale['vehicles']}", result['stage']
+
+    before = {key(result): result for result in previous['results']}
+    print(f"Comparing with {previous['metadata'].get('commit')} ({previous['metadata'].get('timestamp')})",
+          file=sys.stderr)
+    for result in current['results']:
+        if key(result) in before:
+            old = before[key(result)]['wall_time_s']
+            ratio = result['wall_time_s'] / old if old else float('nan')
+            print(f"  {key(result)[0]:<16} {key(result)[1]:<45} {old:9.3f} s -> {result['wall_time_s']:9.3f} s "
+                  f"(x{ratio:.2f})", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(usage="python -m benchmarks.run_benchmarks [options]")
+    parser.add_option("--scale", action="append", dest="scales", default=[],
+                      help="Scale as EDGESxINTERVALSxVEHICLES, can be repeated (default: %s)" % DEFAULT_SCALES)
+    parser.add_option("--repeat", dest="repeat", type="int", default=3, help="Runs per stage")
+    parser.add_option("--no_memory", action="store_false", dest="trace_memory", default=True,
+                      help="Skip the extra tracemalloc run of each stage")
+    parser.add_option("--traffic", dest="traffic", default="Travel time (seconds)", help="Street indicator")
+    parser.add_option("--vehicle", dest="vehicle", default="Duration (seconds)", help="Vehicle indicator")
+    parser.add_option("--seed", dest="seed", type="int", default=0, help="Random seed of the generator")
+    parser.add_option("--png_edges", dest="png_edges", type="int", default=PNG_EDGES,
+                      help="Streets of the map of the PNG export stage, 0 to skip it (default: %default)")
+    parser.add_option("--work_dir", dest="work_dir", help="Where to write the scenarios (default: temporary)")
+    parser.add_option("--output", dest="output", help="JSON results file (default: stdout)")
+    parser.add_option("--compare", dest="compare", help="Previous JSON results to compare with")
+    (options, args) = parser.parse_args()
+
+    report = {'metadata': metadata(), 'results': [], 'memory': []}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for scale_option in options.scales or DEFAULT_SCALES:
+            scale = parse_scale(scale_option)
+            print(f"Scale {scale_option}", file=sys.stderr)
+            scale_dir = os.path.join(options.work_dir or temp_dir, scale_option)
+            results, memory = run_scale(scale, scale_dir, options.traffic, options.vehicle, options.repeat,
+                                        options.trace_memory, options.seed)
+            report['results'] += results
+            report['memory'] += memory
+        if options.png_edges:
+            print(f"PNG export of {options.png_edges} streets", file=sys.stderr)
+            report['results'] += run_png(options.png_edges, os.path.join(options.work_dir or temp_dir, 'png'),
+                                         options.traffic, options.repeat, options.trace_memory, options.seed)
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+    if options.compare:
+        with open(options.compare) as f:
+            compare(json.load(f), report)
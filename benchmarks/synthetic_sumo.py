@@ -0,0 +1,171 @@
+import numpy as np
+import json
+import os
+import optparse
+
+
+# --- Synthetic SUMO output generator ---
+# Writes edgedata (meandata) and tripinfo XML files laid out like the ones produced by SUMO 1.20,
+# plus a road network GeoJSON in the format expected by the dashboard (--road_network_json).
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n\n'
+XSI = 'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"'
+
+
+def generate_edge_ids(n_edges):
+    """Return SUMO-like edge ids: numbered streets split into segments, some of them in both directions."""
+    edge_ids = []
+    street = 1000000
+    while len(edge_ids) < n_edges:
+        street += 7
+        for segment in range(3):
+            edge_ids.append(f"{street}#{segment}")
+            if len(edge_ids) < n_edges and street % 2:
+                edge_ids.append(f"-{street}#{segment}")
+            if len(edge_ids) >= n_edges:
+                break
+    return edge_ids
+
+
+def generate_network_geojson(file_name, edge_ids, seed=0):
+    """Write a network GeoJSON with one LineString per edge, laid out on a grid around Brussels."""
+    rng = np.random.default_rng(seed)
+    side = int(np.ceil(np.sqrt(len(edge_ids))))
+    features = []
+    for i, edge_id in enumerate(edge_ids):
+        lon = 4.30 + (i % side) * 0.0015
+        lat = 50.80 + (i // side) * 0.0010
+        points = [[round(lon, 6), round(lat, 6)]]
+        for _ in range(int(rng.integers(1, 4))):
+            lon += float(rng.uniform(0.0002, 0.0006))
+            lat += float(rng.uniform(-0.0002, 0.0002))
+            points.append([round(lon, 6), round(lat, 6)])
+        street = edge_id.lstrip('-').split('#')[0]
+        features.append({
+            'geometry': {'coordinates': points, 'type': 'LineString'},
+            'properties': {'element': 'edge', 'id': edge_id, 'name': f"Street {street}"},
+            'type': 'Feature'
+        })
+    with open(file_name, 'w', encoding='utf-8') as f:
+        json.dump({'features': features, 'type': 'FeatureCollection'}, f)
+
+
+def generate_edgedata_xml(file_name, edge_ids, n_intervals, interval_length=3600, closed=(), seed=0):
+    """Write a meandata file with n_intervals intervals; edges in closed get no traffic at all."""
+    rng = np.random.default_rng(seed)
+    n_edges = len(edge_ids)
+    closed = set(closed)
+    # Per-edge base level, so that the same edge behaves similarly in every interval
+    base = rng.gamma(2.0, 150.0, n_edges)
+    length = rng.uniform(20.0, 300.0, n_edges)
+    speed_limit = rng.choice([8.33, 13.89, 19.44], n_edges)
+    with open(file_name, 'w', encoding='utf-8') as f:
+        f.write(XML_HEADER)
+        f.write(f'<meandata {XSI} xsi:noNamespaceSchemaLocation="http://sumo.dlr.de/xsd/meandata_file.xsd">\n')
+        for interval in range(n_intervals):
+            begin = interval * interval_length
+            end = begin + interval_length
+            f.write(f'    <interval begin="{begin:.2f}" end="{end:.2f}" id="{begin}_to_{end}">\n')
+            sampled = base * rng.uniform(0.2, 1.8, n_edges)
+            empty = rng.random(n_edges) < 0.3
+            # xml2csv takes the columns from the first edge it sees, so that one always carries every attribute
+            empty[0] = False
+            speed = speed_limit * rng.uniform(0.1, 1.0, n_edges)
+            entered = rng.poisson(sampled / 10.0)
+            departed = rng.poisson(2.0, n_edges)
+            arrived = rng.poisson(2.0, n_edges)
+            lane_changes = rng.poisson(0.5, n_edges)
+            lines = []
+            for j, edge_id in enumerate(edge_ids):
+                if empty[j] or edge_id in closed:
+                    lines.append(f'        <edge id="{edge_id}" sampledSeconds="0.00" departed="0" arrived="0" '
+                                 f'entered="0" left="0" laneChangedFrom="0" laneChangedTo="0"/>\n')
+                    continue
+                traveltime = length[j] / speed[j]
+                density = sampled[j] / interval_length / length[j] * 1000.0
+                time_loss = traveltime * (1.0 - speed[j] / speed_limit[j]) * entered[j]
+                lines.append(
+                    f'        <edge id="{edge_id}" sampledSeconds="{sampled[j]:.2f}" traveltime="{traveltime:.2f}" '
+                    f'overlapTraveltime="{traveltime * 1.1:.2f}" density="{density:.2f}" '
+                    f'laneDensity="{density:.2f}" occupancy="{min(density * 0.5, 100.0):.2f}" '
+                    f'waitingTime="{time_loss * 0.6:.2f}" timeLoss="{time_loss:.2f}" speed="{speed[j]:.2f}" '
+                    f'speedRelative="{speed[j] / speed_limit[j]:.2f}" departed="{departed[j]}" '
+                    f'arrived="{arrived[j]}" entered="{entered[j]}" left="{entered[j]}" '
+                    f'laneChangedFrom="{lane_changes[j]}" laneChangedTo="{lane_changes[j]}"/>\n')
+            f.writelines(lines)
+            f.write('    </interval>\n')
+        f.write('</meandata>\n')
+
+
+def generate_tripinfo_xml(file_name, edge_ids, n_vehicles, end_time=3600, delay=0.0, seed=0):
+    """Write a tripinfo file for n_vehicles trips; delay is the share of extra duration added to each trip."""
+    rng = np.random.default_rng(seed)
+    depart = np.sort(rng.uniform(0, end_time, n_vehicles)).round()
+    duration = rng.gamma(2.0, 120.0, n_vehicles).round() * (1.0 + delay * rng.random(n_vehicles))
+    duration = duration.round()
+    route_length = duration * rng.uniform(4.0, 9.0, n_vehicles)
+    time_loss = duration * rng.uniform(0.05, 0.5, n_vehicles)
+    waiting = (time_loss * rng.uniform(0.0, 0.5, n_vehicles)).round()
+    depart_edge = rng.integers(0, len(edge_ids), n_vehicles)
+    arrival_edge = rng.integers(0, len(edge_ids), n_vehicles)
+    v_types = np.where(rng.random(n_vehicles) < 0.9, 'DEFAULT_VEHTYPE', 'DEFAULT_BIKETYPE')
+    with open(file_name, 'w', encoding='utf-8') as f:
+        f.write(XML_HEADER)
+        f.write(f'<tripinfos {XSI} xsi:noNamespaceSchemaLocation="http://sumo.dlr.de/xsd/tripinfo_file.xsd">\n')
+        lines = []
+        for i in range(n_vehicles):
+            lines.append(
+                f'    <tripinfo id="{i}" depart="{depart[i]:.2f}" departLane="{edge_ids[depart_edge[i]]}_0" '
+                f'departPos="5.10" departSpeed="0.00" departDelay="{rng.random():.2f}" '
+                f'arrival="{depart[i] + duration[i]:.2f}" arrivalLane="{edge_ids[arrival_edge[i]]}_0" '
+                f'arrivalPos="{rng.uniform(1, 50):.2f}" arrivalSpeed="{rng.uniform(0, 13):.2f}" '
+                f'duration="{duration[i]:.2f}" routeLength="{route_length[i]:.2f}" waitingTime="{waiting[i]:.2f}" '
+                f'waitingCount="{int(waiting[i] > 0)}" stopTime="0.00" timeLoss="{time_loss[i]:.2f}" '
+                f'rerouteNo="{int(delay > 0 and rng.random() < delay)}" devices="tripinfo_{i}" '
+                f'vType="{v_types[i]}" speedFactor="{rng.uniform(0.8, 1.2):.2f}" vaporized=""/>\n')
+            if len(lines) >= 10000:
+                f.writelines(lines)
+                lines = []
+        f.writelines(lines)
+        f.write('</tripinfos>\n')
+
+
+def generate_scenario(output_dir, n_edges, n_intervals, n_vehicles, interval_length=900, seed=0):
+    """Generate a full with/without scenario pair and return the dashboard options pointing to it."""
+    os.makedirs(output_dir, exist_ok=True)
+    edge_ids = generate_edge_ids(n_edges)
+    closed = edge_ids[1::max(len(edge_ids) // 10, 1)][:10]
+    end_time = interval_length * n_intervals
+    paths = {
+        'road_network_json': os.path.join(output_dir, 'network.geojson'),
+        'edgedata_without': os.path.join(output_dir, 'edgedata.out.xml'),
+        'edgedata_with': os.path.join(output_dir, 'edgedata.withRoadworks.out.xml'),
+        'tripinfo_without': os.path.join(output_dir, 'tripinfo.out.xml'),
+        'tripinfo_with': os.path.join(output_dir, 'tripinfo.withRoadworks.out.xml'),
+    }
+    generate_network_geojson(paths['road_network_json'], edge_ids, seed)
+    generate_edgedata_xml(paths['edgedata_without'], edge_ids, n_intervals, interval_length, (), seed)
+    generate_edgedata_xml(paths['edgedata_with'], edge_ids, n_intervals, interval_length, closed, seed + 1)
+    generate_tripinfo_xml(paths['tripinfo_without'], edge_ids, n_vehicles, end_time, 0.0, seed)
+    generate_tripinfo_xml(paths['tripinfo_with'], edge_ids, n_vehicles, end_time, 0.3, seed)
+    return paths, closed
+
+
+def scenario_arguments(paths):
+    """Return the command-line arguments of app.py for a generated scenario."""
+    return [f"--{option}={path}" for option, path in paths.items()]
+
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(usage="python -m benchmarks.synthetic_sumo [options]")
+    parser.add_option("--output_dir", dest="output_dir", default="synthetic_scenario", help="Output directory")
+    parser.add_option("--edges", dest="edges", type="int", default=2000, help="Number of edges")
+    parser.add_option("--intervals", dest="intervals", type="int", default=12, help="Number of intervals")
+    parser.add_option("--vehicles", dest="vehicles", type="int", default=10000, help="Number of vehicles")
+    parser.add_option("--interval_length", dest="interval_length", type="int", default=900,
+                      help="Length of each interval (seconds)")
+    parser.add_option("--seed", dest="seed", type="int", default=0, help="Random seed")
+    (options, args) = parser.parse_args()
+    scenario_paths, _ = generate_scenario(options.output_dir, options.edges, options.intervals, options.vehicles,
+                                          options.interval_length, options.seed)
+    print("python app.py " + " ".join(scenario_arguments(scenario_paths)))
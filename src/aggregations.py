@@ -0,0 +1,165 @@
+import hashlib
+import itertools
+import threading
+from collections import OrderedDict
+import pandas as pd
+from src.const import detectors_out_to_table, street_means
+from src.data_loader import load_indicator
+from src.disk_cache import disk_get, disk_put
+
+
+# --- Intervals ---
+
+def interval_bounds(interval_id):
+    """Begin and end (seconds) of an interval id such as 0_to_3600."""
+    begin, end = interval_id.split('_to_')
+    return int(begin), int(end)
+
+
+def select_intervals(intervals, time_range):
+    """Intervals fully inside the time range (every interval when time_range is None)."""
+    if time_range is None:
+        return list(intervals)
+    return [interval for interval in intervals
+            if interval_bounds(interval)[0] >= time_range[0] and interval_bounds(interval)[1] <= time_range[1]]
+
+
+# --- Street aggregations ---
+
+def street_tables(dataframe_without, dataframe_with, field_name, edges=None):
+    """Aligned edge x interval tables of an indicator in both scenarios (0 where a street has no value).
+
+    When edges is given, only these streets are kept."""
+    load_indicator(dataframe_without, "edge_" + field_name)
+    load_indicator(dataframe_with, "edge_" + field_name)
+    if edges is not None:
+        dataframe_without = dataframe_without.loc[dataframe_without['edge_id'].isin(edges)]
+        dataframe_with = dataframe_with.loc[dataframe_with['edge_id'].isin(edges)]
+    df_without = detectors_out_to_table(dataframe_without, field_name).fillna(0)
+    df_with = detectors_out_to_table(dataframe_with, field_name).fillna(0)
+    return df_without.align(df_with, fill_value=0)
+
+
+def edge_differences(dataframe_without, dataframe_with, traffic_indicator, intervals, edges=None):
+    """Mean of an indicator of every street over the given intervals in both scenarios, and its difference
+    (with - without)."""
+    load_indicator(dataframe_without, traffic_indicator)
+    load_indicator(dataframe_with, traffic_indicator)
+    if edges is not None:
+        dataframe_without = dataframe_without.loc[dataframe_without['edge_id'].isin(edges)]
+        dataframe_with = dataframe_with.loc[dataframe_with['edge_id'].isin(edges)]
+    without = street_means(dataframe_without, intervals, traffic_indicator)
+    with_deviations = street_means(dataframe_with, intervals, traffic_indicator)
+    without.index, with_deviations.index = without.index.astype(str), with_deviations.index.astype(str)
+    without, with_deviations = without.align(with_deviations, fill_value=0)
+    differences = pd.DataFrame({'without': without, 'with': with_deviations,
+                                'difference': with_deviations - without})
+    differences.index.name = 'edge_id'
+    return differences
+
+
+# --- Cache ---
+# The aggregations and the views are shared by the callbacks of the dashboard, the warm-up and the export API. They are
+# kept in a small LRU cache keyed by the version of the dataset (a new one whenever it is loaded or changes, never
+# shared by two datasets) and the parameters, so the same request made from the interface and from a script is computed
+# once, and a request arriving while the same value is being computed waits for it. The cached values are shared: they
+# must not be modified.
+#
+# When a disk cache is used (see src/disk_cache.py), the values of the data versions registered with a content key
+# are also stored on disk under this content key, and read back from there after a restart.
+
+CACHE_SIZE = 32
+
+_cache = OrderedDict()
+_pending = {}
+_cache_lock = threading.Lock()
+_disk = {'cache': None, 'content_keys': {}}
+_versions = itertools.count(1)
+
+
+def use_disk_cache(disk_cache):
+    """Add a disk cache (see disk_cache.open_disk_cache) below the memory cache."""
+    _disk['cache'] = disk_cache
+
+
+def register_version(version, content_key):
+    """Content key of a data version; the values of the versions without one (follow mode) stay in memory."""
+    _disk['content_keys'][version] = content_key
+
+
+def new_version():
+    """Data version not used yet by any dataset of the process."""
+    return next(_versions)
+
+
+def forget_version(version):
+    """Drop the values of a data version from the memory cache (its dataset was evicted)."""
+    with _cache_lock:
+        for memory_key in [memory_key for memory_key in _cache if memory_key[0] == version]:
+            del _cache[memory_key]
+    _disk['content_keys'].pop(version, None)
+
+
+def index_key(values):
+    """Short, order-independent key of a set of street ids or intervals (None stays None)."""
+    if values is None:
+        return None
+    return hashlib.sha1('\n'.join(sorted(str(value) for value in values)).encode()).hexdigest()
+
+
+def compute_value(key, compute, version):
+    """Value read from the disk cache, or computed (and then stored there)."""
+    content_key = _disk['content_keys'].get(version)
+    if _disk['cache'] is None or content_key is None:
+        return compute()
+    value = disk_get(_disk['cache'], (content_key,) + key)
+    if value is None:
+        value = compute()
+        disk_put(_disk['cache'], (content_key,) + key, value)
+    return value
+
+
+def cached(key, compute, version=None):
+    """Value of key (a tuple) for a data version in the cache, computed (outside the lock) and stored when missing."""
+    key, memory_key = tuple(key), (version,) + tuple(key)
+    with _cache_lock:
+        if memory_key in _cache:
+            _cache.move_to_end(memory_key)
+            return _cache[memory_key]
+        computing = _pending.get(memory_key)
+        if computing is None:
+            computing = _pending[memory_key] = threading.Event()
+            owner = True
+        else:
+            owner = False
+    if not owner:
+        computing.wait()
+        with _cache_lock:
+            if memory_key in _cache:
+                return _cache[memory_key]
+        # The computation waited for failed, it is redone (and fails again) here
+        return compute()
+    try:
+        value = compute_value(key, compute, version)
+        with _cache_lock:
+            _cache[memory_key] = value
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+    finally:
+        with _cache_lock:
+            del _pending[memory_key]
+        computing.set()
+    return value
+
+
+def cached_street_tables(version, dataframe_without, dataframe_with, field_name, edges=None):
+    """street_tables() through the cache."""
+    return cached(('street_tables', field_name, index_key(edges)),
+                  lambda: street_tables(dataframe_without, dataframe_with, field_name, edges), version)
+
+
+def cached_edge_differences(version, dataframe_without, dataframe_with, traffic_indicator, intervals, edges=None):
+    """edge_differences() through the cache."""
+    return cached(('edge_differences', traffic_indicator, index_key(intervals), index_key(edges)),
+                  lambda: edge_differences(dataframe_without, dataframe_with, traffic_indicator, intervals, edges),
+                  version)
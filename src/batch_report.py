@@ -0,0 +1,254 @@
+import datetime
+import html
+import json
+import optparse
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+import geojson
+from src.const import TRAFFIC_OPTIONS, VEHICLE_OPTIONS, PNG_DPI, map_to_geojson, export_png, \
+    get_traffic, get_traffic_name, get_traffic_lowercase, get_vehicle_name, get_veh_traffic
+from src.data_loader import read_inputs, available_indicators, CACHE_DIR
+from src.aggregations import interval_bounds, select_intervals, street_tables
+from src.generate_visualizations_interval import generate_visualizations as generate_visualizations_byinterval
+from src.generate_visualizations_streets import generate_visualizations as generate_visualizations_bystreets
+from src.generate_visualizations_vehicles import generate_visualizations as generate_visualizations_byvehicles
+from src.generate_visualizations_impacted import generate_visualizations as generate_visualizations_impacted
+
+
+# --- Headless batch reports ---
+# Renders the map and the figures of the dashboard, without the Dash server, for every indicator and time range of a
+# list of scenario pairs. Each scenario pair is one task of the process pool: its files are parsed once (and kept in
+# the columnar cache for the next runs) and reused for all of its outputs.
+#
+# The scenarios file is a JSON list of objects with the command-line options of app.py, plus an optional name:
+#   [{"name": "roadworks-1", "edgedata_without": "...", "edgedata_with": "...", "tripinfo_without": "...",
+#     "tripinfo_with": "...", "road_network_json": "..."}, ...]
+# Relative paths are relative to the scenarios file.
+
+SCENARIO_OPTIONS = ['edgedata_without', 'edgedata_with', 'tripinfo_without', 'tripinfo_with', 'road_network_json']
+FORMATS = ['html', 'png', 'json']
+COLOR_SCALE = ["#0F9D58", "#fff757", "#fbbc09", "#E94335", "#822F2B"]
+MOST_IMPACTED = 15
+
+
+def read_scenarios(file_name):
+    """Read the scenarios file, with absolute paths and a name for every scenario."""
+    with open(file_name, encoding='utf-8') as f:
+        scenarios = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(file_name))
+    for i, scenario in enumerate(scenarios):
+        scenario.setdefault('name', f"scenario-{i + 1:03d}")
+        for option in SCENARIO_OPTIONS:
+            paths = scenario[option] if isinstance(scenario[option], list) else [scenario[option]]
+            paths = [os.path.join(base_dir, path) for path in paths]
+            scenario[option] = paths if option.startswith('edgedata') else paths[0]
+    return scenarios
+
+
+def scenario_arguments(scenario, cache_dir):
+    """Command-line arguments of read_inputs() for a scenario."""
+    arguments = ['--cache_dir=' + cache_dir]
+    for option in SCENARIO_OPTIONS:
+        values = scenario[option] if isinstance(scenario[option], list) else [scenario[option]]
+        arguments += [f"--{option}={value}" for value in values]
+    return arguments
+
+
+def parse_time_range(text):
+    """Parse a time range written as BEGIN-END (seconds of simulation)."""
+    begin, end = (int(value) for value in text.split('-'))
+    return begin, end
+
+
+def interval_label(interval_id):
+    """Human-readable label of an interval, as shown by the dashboard."""
+    begin, end = interval_bounds(interval_id)
+    return f"{datetime.timedelta(seconds=begin)} to {datetime.timedelta(seconds=end)}"
+
+
+def define_quantile(data_diff):
+    """Same color classes as the map of the dashboard."""
+    quantiles = [data_diff.quantile(q=q) for q in (0.25, 0.45, 0.65, 0.85)]
+    return [data_diff.min()] + quantiles + [data_diff.max()]
+
+
+def safe_name(text):
+    """File name made of the letters and digits of a label."""
+    return ''.join(c if c.isalnum() else '_' for c in text).strip('_').lower()
+
+
+def write_figure(figure, file_name, formats, files):
+    """Write a plotly figure as HTML, and as PNG when the image export of plotly (kaleido) is available."""
+    if 'html' in formats:
+        figure.write_html(file_name + '.html', include_plotlyjs='cdn')
+        files.append(file_name + '.html')
+    if 'png' in formats:
+        try:
+            figure.write_image(file_name + '.png')
+            files.append(file_name + '.png')
+        except (ImportError, ValueError):
+            # plotly needs kaleido to export images, the HTML file has the same content
+            pass
+
+
+def render_street_indicator(tables, street_tables, geo_data, label, intervals, all_intervals, output_dir, formats,
+                            png_dpi=PNG_DPI):
+    """Render the map, the figures and the summary of a street indicator over the given intervals."""
+    dataframe_without, dataframe_with, _, _, road_network_json_file, _, _ = tables
+    street_data_without, street_data_with = street_tables
+    os.makedirs(output_dir, exist_ok=True)
+    files = []
+    field_name = get_traffic_name(label)
+    traffic_indicator = "edge_" + field_name
+    timeframe_strings = [interval_label(interval) for interval in intervals]
+    timeframe_from = timeframe_strings[0].split(' to ')[0]
+    timeframe_to = timeframe_strings[-1].split(' to ')[1]
+
+    data_diff, df_data = map_to_geojson(road_network_json_file, dataframe_without, dataframe_with, intervals,
+                                        traffic_indicator, os.path.join(output_dir, 'map.geojson'))
+    if 'json' in formats:
+        files.append(os.path.join(output_dir, 'map.geojson'))
+    else:
+        os.remove(os.path.join(output_dir, 'map.geojson'))
+    classes = define_quantile(data_diff)
+    if 'png' in formats:
+        export_png(df_data, COLOR_SCALE, classes, traffic_indicator, os.path.join(output_dir, 'map.png'), png_dpi)
+        files.append(os.path.join(output_dir, 'map.png'))
+
+    traffic_name = get_traffic(label)
+    traffic_lowercase = get_traffic_lowercase(label)
+    hideout = {'selected': []}
+    write_figure(generate_visualizations_bystreets(street_data_without, street_data_with, traffic_name, label, {},
+                                                   intervals, timeframe_strings, len(all_intervals),
+                                                   timeframe_from, timeframe_to),
+                 os.path.join(output_dir, 'streets'), formats, files)
+    write_figure(generate_visualizations_impacted(street_data_without, street_data_with, traffic_name,
+                                                  traffic_lowercase, intervals, timeframe_strings,
+                                                  len(all_intervals), geo_data, hideout, {}, timeframe_from,
+                                                  timeframe_to),
+                 os.path.join(output_dir, 'impacted'), formats, files)
+    write_figure(generate_visualizations_byinterval(street_data_without, street_data_with, traffic_name, label,
+                                                    intervals, timeframe_from, timeframe_to, hideout, {}),
+                 os.path.join(output_dir, 'interval'), formats, files)
+
+    if 'json' in formats:
+        most_impacted = data_diff.sort_values(ascending=False).head(MOST_IMPACTED)
+        names = df_data['name'] if 'name' in df_data.columns else {}
+        summary = {
+            'indicator': label, 'from': timeframe_from, 'to': timeframe_to, 'intervals': list(intervals),
+            'classes': [float(value) for value in classes],
+            'mean_without': float(street_data_without[street_data_without.columns.intersection(intervals)]
+                                  .stack().mean()),
+            'mean_with': float(street_data_with[street_data_with.columns.intersection(intervals)].stack().mean()),
+            'most_impacted': [{'edge_id': edge_id, 'name': names.get(edge_id), 'difference': float(value)}
+                              for edge_id, value in most_impacted.items()],
+        }
+        with open(os.path.join(output_dir, 'summary.json'), 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, default=str)
+        files.append(os.path.join(output_dir, 'summary.json'))
+    return files
+
+
+def render_scenario(scenario, output_dir, labels, time_ranges, formats, cache_dir, png_dpi=PNG_DPI):
+    """Process pool task: load a scenario pair once and render all its outputs. Returns its report entry."""
+    start = time.perf_counter()
+    scenario_dir = os.path.join(output_dir, safe_name(scenario['name']))
+    report = {'name': scenario['name'], 'directory': scenario_dir, 'files': [], 'errors': []}
+    try:
+        tables = read_inputs(scenario_arguments(scenario, cache_dir))
+        with open(tables[4], encoding='utf-8') as f:
+            geo_data = geojson.load(f)
+        all_intervals = [str(interval) for interval in tables[0]['interval_id'].unique()]
+        indicators = available_indicators(tables[0])
+        for label in labels or [TRAFFIC_OPTIONS[column] for column in indicators]:
+            if get_traffic_name(label) == '' or "edge_" + get_traffic_name(label) not in indicators:
+                report['errors'].append(f"{label}: not available in this scenario")
+                continue
+            label_tables = street_tables(tables[0], tables[1], get_traffic_name(label))
+            for time_range in time_ranges or [None]:
+                intervals = select_intervals(all_intervals, time_range)
+                if not intervals:
+                    report['errors'].append(f"{label} {time_range}: no interval in this time range")
+                    continue
+                range_name = 'all' if time_range is None else f"{time_range[0]}_to_{time_range[1]}"
+                report['files'] += render_street_indicator(
+                    tables, label_tables, geo_data, label, intervals, all_intervals,
+                    os.path.join(scenario_dir, safe_name(label), range_name), formats, png_dpi)
+        vehicle_dir = os.path.join(scenario_dir, 'vehicles')
+        os.makedirs(vehicle_dir, exist_ok=True)
+        for label in VEHICLE_OPTIONS:
+            figure = generate_visualizations_byvehicles(tables[2], tables[3], get_vehicle_name(label),
+                                                        get_veh_traffic(label))
+            write_figure(figure, os.path.join(vehicle_dir, safe_name(label)), formats, report['files'])
+    except Exception:
+        report['errors'].append(traceback.format_exc())
+    report['duration'] = time.perf_counter() - start
+    return report
+
+
+def write_index(output_dir, reports):
+    """Write index.json (every file and error of the run) and an index.html linking the outputs."""
+    with open(os.path.join(output_dir, 'index.json'), 'w', encoding='utf-8') as f:
+        json.dump(reports, f, indent=2)
+    lines = ["<html><head><meta charset='utf-8'><title>TrafficTwin reports</title></head><body>",
+             "<h1>TrafficTwin reports</h1>"]
+    for report in reports:
+        lines.append(f"<h2>{html.escape(report['name'])}</h2><ul>")
+        for file_name in report['files']:
+            relative = os.path.relpath(file_name, output_dir)
+            lines.append(f"<li><a href='{html.escape(relative)}'>{html.escape(relative)}</a></li>")
+        lines += [f"<li><pre>{html.escape(error)}</pre></li>" for error in report['errors']]
+        lines.append("</ul>")
+    lines.append("</body></html>")
+    with open(os.path.join(output_dir, 'index.html'), 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines))
+
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(usage="python -m src.batch_report --scenarios FILE [options]")
+    parser.add_option("--scenarios", dest="scenarios", help="JSON file listing the scenario pairs", metavar="FILE")
+    parser.add_option("--output_dir", dest="output_dir", default="reports", help="Where to write the reports")
+    parser.add_option("--indicator", action="append", dest="indicators", default=[],
+                      help="Street indicator label, can be repeated (default: every available indicator)")
+    parser.add_option("--time_range", action="append", dest="time_ranges", default=[],
+                      help="Time range as BEGIN-END in seconds, can be repeated (default: the whole simulation)")
+    parser.add_option("--formats", dest="formats", default=','.join(FORMATS),
+                      help="Comma-separated output formats among %s" % FORMATS)
+    parser.add_option("--processes", dest="processes", type="int", default=os.cpu_count(),
+                      help="Number of worker processes")
+    parser.add_option("--cache_dir", dest="cache_dir", default=CACHE_DIR,
+                      help="Directory of the columnar cache of the edgedata files", metavar="DIR")
+    parser.add_option("--png_dpi", dest="png_dpi", type="int", default=PNG_DPI,
+                      help="Resolution of the PNG maps (default: %default)", metavar="DPI")
+    (options, args) = parser.parse_args()
+    if not options.scenarios:
+        parser.error("--scenarios is required")
+
+    output_dir = os.path.abspath(options.output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    formats = [value for value in options.formats.split(',') if value in FORMATS]
+    time_ranges = [parse_time_range(value) for value in options.time_ranges]
+    scenarios = read_scenarios(options.scenarios)
+
+    start = time.perf_counter()
+    reports = []
+    with ProcessPoolExecutor(max_workers=max(1, min(options.processes, len(scenarios)))) as pool:
+        futures = [pool.submit(render_scenario, scenario, output_dir, options.indicators, time_ranges, formats,
+                               os.path.abspath(options.cache_dir), options.png_dpi) for scenario in scenarios]
+        for future in as_completed(futures):
+            report = future.result()
+            reports.append(report)
+            print(f"{report['name']:<30} {len(report['files']):5d} files {len(report['errors']):3d} errors "
+                  f"{report['duration']:8.1f} s", file=sys.stderr)
+    reports.sort(key=lambda report: report['name'])
+    write_index(output_dir, reports)
+    print(f"{len(scenarios)} scenarios in {time.perf_counter() - start:.1f} s, see "
+          f"{os.path.join(output_dir, 'index.html')}", file=sys.stderr)
@@ -0,0 +1,125 @@
+import gzip
+import hashlib
+import threading
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# --- Compressed responses ---
+# The layout, the callback responses (GeoJSON of the map, figures) and the static files are compressed when the browser
+# accepts it: brotli when the optional brotli package is installed, gzip otherwise. The hook is registered before the
+# other after_request hooks of the app, so it runs last and they still see the uncompressed responses.
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/geo+json', 'application/javascript', 'text/html', 'text/css',
+                      'text/javascript', 'text/plain')
+MINIMUM_SIZE = 500  # bytes, smaller responses are not worth compressing
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def accepted_encoding():
+    """Best encoding accepted by the browser for the current request, None if neither brotli nor gzip."""
+    accepted = request.headers.get('Accept-Encoding', '').lower()
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding):
+    """Compress bytes with the given encoding ('br' or 'gzip')."""
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _compress_response(response):
+    """Flask after_request hook compressing the textual responses."""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    encoding = accepted_encoding()
+    data = response.get_data()
+    if encoding is None or len(data) < MINIMUM_SIZE:
+        return response
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    if response.headers.get('ETag'):
+        # The compressed body differs from the uncompressed one, so does its entity tag
+        etag, weak = response.get_etag()
+        response.set_etag(f"{etag}-{encoding}", weak=weak)
+    return response
+
+
+def register_compression(server):
+    """Compress the responses of the Flask server of the Dash app."""
+    server.after_request(_compress_response)
+
+
+# --- Network asset ---
+# The street networks are served as static files whose URL contains a hash of their content: browsers keep them for a
+# year and revalidate them with their strong ETag, so a geometry is downloaded once instead of being embedded in every
+# layout. A network is compressed once, when its first dataset is loaded, and dropped when no loaded dataset uses it.
+
+NETWORK_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_network_assets = {}
+_network_assets_lock = threading.Lock()
+
+
+def register_network_assets(server):
+    """Serve the networks added by add_network_asset() at their versioned URLs."""
+    @server.route('/network/<version>.geojson')
+    def network_asset(version):
+        asset = _network_assets.get(version)
+        if asset is None:
+            return Response(status=404)
+        encoding = accepted_encoding()
+        etag = version if encoding is None else f"{version}-{encoding}"
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(asset['bodies'][encoding], mimetype='application/geo+json')
+            if encoding is not None:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = NETWORK_CACHE_CONTROL
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+def network_version(url):
+    """Content hash of a network URL."""
+    return url.rsplit('/', 1)[-1][:-len('.geojson')]
+
+
+def add_network_asset(geojson_file):
+    """Serve a network GeoJSON (compressed once per content, however many datasets use it) and return its URL."""
+    with open(geojson_file, 'rb') as f:
+        data = f.read()
+    version = hashlib.sha1(data).hexdigest()[:16]
+    with _network_assets_lock:
+        asset = _network_assets.get(version)
+        if asset is None:
+            bodies = {None: data, 'gzip': compress(data, 'gzip')}
+            if brotli is not None:
+                bodies['br'] = compress(data, 'br')
+            asset = _network_assets[version] = {'bodies': bodies, 'users': 0}
+        asset['users'] += 1
+    return f"/network/{version}.geojson"
+
+
+def release_network_asset(url):
+    """Stop serving a network once none of the datasets using it is loaded."""
+    with _network_assets_lock:
+        asset = _network_assets.get(network_version(url))
+        if asset is not None:
+            asset['users'] -= 1
+            if asset['users'] <= 0:
+                del _network_assets[network_version(url)]
@@ -1,79 +1,124 @@
-import geopandas as gpd
 import pandas as pd
-import fiona  # don't remove please
 import numpy as np
 from dash_extensions.javascript import assign
 from dash import html, dcc
 import dash_bootstrap_components as dbc
 import os
-import matplotlib.pyplot as plt
+
+# geopandas (with fiona) and matplotlib take most of the start-up time of the server and are only needed to build the
+# map (map_to_geojson, export_png): they are imported by these functions, on their first call
+
+
+# Resolution of the exported map PNG: at 1000 dpi, a 10-inch map of a large network took seconds and hundreds of MB
+PNG_DPI = 150
+
+# Street indicators offered in the traffic dropdown (edgedata column -> label), and vehicle indicators of the vehicle one
+TRAFFIC_OPTIONS = {
+    'edge_traveltime': 'Travel time (seconds)',
+    'edge_density': 'Density (vehicles/kilometres)',
+    'edge_occupancy': 'Occupancy (%)',
+    'edge_timeLoss': 'Time loss (seconds)',
+    'edge_waitingTime': 'Waiting time (seconds)',
+    'edge_speed': 'Speed (meters/seconds)',
+    'edge_speedRelative': 'Speed relative (average speed / speed limit)',
+    'edge_sampledSeconds': 'Sampled seconds (vehicles/seconds)',
+}
+VEHICLE_OPTIONS = ['Duration (seconds)', 'Route length (meters)', 'Time loss (seconds)', 'Waiting time (seconds)']
+
+
+def indicator_values(series):
+    """Return a float64 copy of a float32 indicator column, rounded back to the decimals of the SUMO outputs it was
+    read from (attrs['decimals'] of its table, see src/sumo_xml.py). Columns of unknown decimals, such as the means of
+    replicated runs, are not rounded."""
+    values = series.astype(np.float64)
+    decimals = series.attrs.get('decimals', {}).get(series.name)
+    return values if decimals is None else values.round(decimals)
 
 
 def detectors_out_to_table(sim_data_df, field_name):
     """Converts simulation data into a table format where each row corresponds
         to a time interval and each column corresponds to an edge ID.
         The table contains traffic indicator data for each edge."""
-    # parse all the intervals in the edgedata file
+    # One row per edge (in id order) and one column per time interval (in the order of the edgedata), filled in a
+    # single scatter of the values at their (edge, interval) codes
     traffic_indicator = "edge_" + field_name
-    time_intervals = sim_data_df['interval_id'].unique()
-    data_dict = {}
-    for time_interval in time_intervals:
-        # get the DF related to time_interval
-        data_interval = sim_data_df.loc[sim_data_df['interval_id'] == time_interval]
-        # get the IDs of the edges that has an edgedata output value in the current time interval
-        list_edges = data_interval['edge_id'].unique()
-        for edge_id in list_edges:
-            # get the data for all the edges
-            data = data_interval.loc[data_interval['edge_id'] == edge_id][traffic_indicator]
-            if time_interval not in data_dict:
-                data_dict[time_interval] = {}
-            data_dict[time_interval][edge_id] = data.item()
-    return pd.DataFrame.from_dict(data_dict)
-
-
-def map_to_geojson(tulipe_geojson_file, edgedata_without, edgedata_with, interval, traffic_indicator):
+    edge_codes, edges = pd.factorize(sim_data_df['edge_id'], sort=True)
+    interval_codes, intervals = pd.factorize(sim_data_df['interval_id'])
+    table = np.full((len(edges), len(intervals)), np.nan)
+    table[edge_codes, interval_codes] = indicator_values(sim_data_df[traffic_indicator]).to_numpy()
+    return pd.DataFrame(table, index=pd.Index(np.asarray(edges), dtype=object),
+                        columns=pd.Index(np.asarray(intervals), dtype=object))
+
+
+def street_means(edgedata, interval, traffic_indicator):
+    """Mean of the indicator of every street over the given intervals (only the intervals where it has a value)."""
+    rows = edgedata.loc[edgedata['interval_id'].isin(interval)]
+    return indicator_values(rows[traffic_indicator]).groupby(rows['edge_id'], observed=True).mean()
+
+
+def map_to_geojson(tulipe_geojson_file, edgedata_without, edgedata_with, interval, traffic_indicator,
+                   output_file='map_plot_diff.geojson', edges=None):
     """Generate GeoJSON files with street-level differences in traffic indicators
-        between two datasets (with and without deviations)."""
+        between two datasets (with and without deviations).
+        When edges is given, only these streets are compared, the others are left at 0."""
+    import geopandas as gpd
+    import fiona  # don't remove please
     net_gdf = gpd.read_file(tulipe_geojson_file)
     net_gdf['index'] = net_gdf['id']
     net_gdf = net_gdf.set_index('index')
 
-    street_data_without = edgedata_without.loc[edgedata_without['interval_id'].isin(interval)].copy()
-    street_data_without = street_data_without.groupby('edge_id')[traffic_indicator].mean()
+    if edges is not None:
+        edgedata_without = edgedata_without.loc[edgedata_without['edge_id'].isin(edges)]
+        edgedata_with = edgedata_with.loc[edgedata_with['edge_id'].isin(edges)]
 
-    street_data_with = edgedata_with.loc[edgedata_with['interval_id'].isin(interval)].copy()
-    street_data_with = street_data_with.groupby('edge_id')[traffic_indicator].mean()
+    street_data_without = street_means(edgedata_without, interval, traffic_indicator)
+    street_data_with = street_means(edgedata_with, interval, traffic_indicator)
 
     diff = np.subtract(street_data_without, street_data_with)
     absolute_values = diff.abs()
     df_data = net_gdf.join(absolute_values).fillna(0)
-    df_data.to_file('map_plot_diff.geojson')
+    df_data.to_file(output_file)
     return absolute_values, df_data
 
 
-def export_png(df_data, colorscale, classes, traffic_indicator):
-    """Export a visual map of traffic data with a color scale as a PNG image."""
-    df_data['color'] = df_data[traffic_indicator].apply(assign_color, args=(classes, colorscale))
-    fig, ax = plt.subplots(figsize=(10, 10))
-    df_data.plot(ax=ax, color=df_data['color'], linewidth=2)
+def export_png(df_data, colorscale, classes, traffic_indicator, output_file='output_image_transparent.png',
+               dpi=PNG_DPI):
+    """Export a visual map of traffic data with a color scale as a PNG image.
+
+    The lines of each color class are batched into a single path and drawn in one call, on a figure with the
+    proportions of the network, so the image is rendered once, without having to be cropped afterwards."""
+    import shapely
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import PathCollection
+    from matplotlib.path import Path
+    color_index = classify(df_data[traffic_indicator], classes)
+    parts, part_index = shapely.get_parts(np.asarray(df_data.geometry.array), return_index=True)
+    coordinates, coordinate_index = shapely.get_coordinates(parts, return_index=True)
+    codes = np.full(len(coordinates), Path.LINETO, dtype=Path.code_type)
+    codes[np.flatnonzero(np.diff(coordinate_index, prepend=-1))] = Path.MOVETO
+    coordinate_color = color_index[part_index][coordinate_index]
+    paths = [Path(coordinates[coordinate_color == i], codes[coordinate_color == i]) for i in range(len(colorscale))]
+
+    # Same framing as GeoDataFrame.plot: 5% margins, and the latitude scaled for geographic coordinates
+    min_x, min_y, max_x, max_y = df_data.total_bounds
+    margin_x, margin_y = (max_x - min_x) * 0.05 or 1e-6, (max_y - min_y) * 0.05 or 1e-6
+    aspect = 1 / np.cos(np.radians((min_y + max_y) / 2)) if df_data.crs is not None and df_data.crs.is_geographic else 1
+    width, height = max_x - min_x + 2 * margin_x, (max_y - min_y + 2 * margin_y) * aspect
+    fig = plt.figure(figsize=(10, 10 * height / width) if width >= height else (10 * width / height, 10))
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.add_collection(PathCollection(paths, facecolors='none', edgecolors=colorscale, linewidths=2))
+    ax.set_xlim(min_x - margin_x, max_x + margin_x)
+    ax.set_ylim(min_y - margin_y, max_y + margin_y)
     ax.set_axis_off()
-    plt.subplots_adjust(left=0, right=1, top=1, bottom=0)
-    plt.savefig('output_image_transparent.png', dpi=1000, bbox_inches='tight', pad_inches=0, transparent=True)
-    plt.close()
+    # Most of the image is transparent, a fast zlib level barely changes the file size
+    fig.savefig(output_file, dpi=dpi, transparent=True, pil_kwargs={'compress_level': 1})
+    plt.close(fig)
 
 
-def assign_color(value, list_intervals, color_scale):
-    """Assign a color to a given value based on predefined quantile intervals."""
-    if value <= list_intervals[1]:
-        return color_scale[0]
-    elif value <= list_intervals[2]:
-        return color_scale[1]
-    elif value <= list_intervals[3]:
-        return color_scale[2]
-    elif value <= list_intervals[4]:
-        return color_scale[3]
-    else:
-        return color_scale[4]
+def classify(values, classes):
+    """Index in the color scale of every value: 0 up to classes[1] (included), 1 up to classes[2], 2 up to classes[3],
+    3 up to classes[4], and 4 above it or for a missing (NaN) value."""
+    return np.searchsorted(np.asarray(classes[1:5], dtype=float), np.asarray(values, dtype=float), side='left')
 
 
 # --- Style Definitions ---
@@ -138,6 +183,23 @@ style_color_closed = assign("""function(feature, context)
 """)
 
 
+# Color styling of the zones shown instead of the streets at low zoom
+style_zone = assign("""function(feature, context)
+{
+    const {colorscale, classes, colorProp} = context.hideout;
+    const value = feature.properties[colorProp];
+
+    let fillColor;
+    for (let i = 0; i < classes.length; ++i) {
+        if (value > classes[i]) {
+            fillColor = colorscale[i];  // set the fill color according to the class
+        }
+    }
+    return {fillColor: fillColor, color: fillColor, weight: 1, fillOpacity: 0.5};
+}
+""")
+
+
 # Tooltips for displaying street information when hovering over a feature
 on_each_feature = assign("""function(feature, layer, context){
     layer.bindTooltip(`${feature.properties.name} (id:${feature.properties.id})`)
@@ -156,6 +218,13 @@ on_each_feature_closed = assign("""function(feature, layer, context){
 }""")
 
 
+# Tooltips of the zones, with the mean difference of their streets
+on_each_feature_zone = assign("""function(feature, layer, context){
+    const {colorProp, tname} = context.hideout;
+    layer.bindTooltip(`${feature.properties.zone} (${tname}: ${feature.properties[colorProp].toFixed()}, mean of ${feature.properties.streets} streets)`)
+}""")
+
+
 # --- Modal Content ---
 
 # Information about the team and the project
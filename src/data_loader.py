@@ -0,0 +1,417 @@
+import pandas as pd
+import numpy as np
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import optparse
+from src.sumo_xml import EDGE_INDICATORS, VEHICLE_INDICATORS, VEHICLE_COLUMNS, is_compressed, read_edgedata_xml, \
+    read_tripinfo_xml, read_rerouter_closures, value_decimals, most_decimals
+from src.const import PNG_DPI
+from src.replicates import aggregate_runs, replicate_runs
+from src.trip_sketches import read_trip_statistics
+
+# Edgedata files are converted once into one .npy file per column, so that later startups only read the ids and the
+# indicators are decoded the first time they are used (see load_indicator)
+CACHE_DIR = '.tulipe_cache'
+COLUMNAR_CACHE_VERSION = 2
+columnar_sources = []
+_indicator_lock = threading.Lock()
+
+# Closed roads of the sample scenario, used when neither --rerouter nor --closed_roads is given
+CLOSED_ROADS = ["231483314", "832488061", "616545123", "150276002", "8384928", "606127853", "4730627", "4726710#0",
+                "627916937", "4726681#0"]
+
+
+# --- Data loading functions ---
+
+def convert_xml_to_csv(output_file_name, xmlfile):
+    """Convert an XML file to CSV using SUMO tools."""
+    if os.path.exists(xmlfile):
+        os.system(
+            f"python \"{os.path.join(os.environ['SUMO_HOME'], 'tools', 'xml', 'xml2csv.py')}\" {xmlfile} -o {output_file_name}")
+
+
+def read_xml_as_csv(xmlfile, dtype):
+    """Convert an XML file to a CSV file of its own and read it.
+
+    The CSV file is a new temporary file, deleted once read, so that the datasets loaded at the same time by the
+    server threads never read each other's conversion."""
+    handle, file_name = tempfile.mkstemp(suffix='.csv')
+    os.close(handle)
+    try:
+        convert_xml_to_csv(file_name, xmlfile)
+        return pd.read_csv(file_name, sep=";", dtype=dtype)
+    finally:
+        os.remove(file_name)
+
+def load_data(xmlfile, dataframe, compact=True, cache_dir=CACHE_DIR):
+    """Load the edge and interval ids of an edgedata file into a DataFrame (indicators are loaded by load_indicator).
+
+    With compact=False, the whole file is converted and returned as it is, with every column."""
+    if not compact:
+        return pd.concat([dataframe, read_edgedata(xmlfile, compact=False)])
+    source = columnar_source(xmlfile, cache_dir)
+    frames = [dataframe, read_columnar_ids(source)]
+    return pd.concat(frames)
+
+
+def read_edgedata(xmlfile, compact=True):
+    """Read an edgedata file: compressed files (.gz, .zst) are parsed directly, the others are converted to CSV.
+
+    The parsed files only have the columns used by the dashboard, unless compact is False."""
+    if is_compressed(xmlfile):
+        return read_edgedata_xml(xmlfile, compact)
+    return read_edgedata_csv(xmlfile)
+
+
+def read_edgedata_csv(xmlfile):
+    """Convert an edgedata XML file to CSV and read every column of it."""
+    return read_xml_as_csv(xmlfile, {'edge_id': str, 'interval_id': str})
+
+
+def load_vehicles_data(xml_tripinfo_file, compact=True):
+    """Load vehicle data from an XML file and convert it to a CSV (compressed files are parsed directly).
+
+    With compact=False, every column is kept, as they are."""
+    if is_compressed(xml_tripinfo_file):
+        return read_tripinfo_xml(xml_tripinfo_file, compact)
+    vehicle_data = read_xml_as_csv(xml_tripinfo_file, {'tripinfo_id': str})
+    if compact:
+        vehicle_data = drop_unused_columns(vehicle_data, VEHICLE_COLUMNS, VEHICLE_INDICATORS)
+        if 'tripinfo_vType' in vehicle_data.columns:
+            vehicle_data['tripinfo_vType'] = vehicle_data['tripinfo_vType'].astype('category')
+    return vehicle_data
+
+
+def load_run(files, cache_dir=CACHE_DIR):
+    """Edgedata table of one run (the files of its time intervals), with every indicator loaded."""
+    dataframe = pd.DataFrame()
+    for xmlfile in files:
+        dataframe = load_data(xmlfile, dataframe, cache_dir=cache_dir)
+    for column in available_indicators(dataframe):
+        load_indicator(dataframe, column)
+    return dataframe.drop(columns=['_source', '_row'])
+
+
+def iter_runs(runs, cache_dir=CACHE_DIR, report=None):
+    """Load the replicated runs one after the other, for aggregate_runs()."""
+    for number, files in enumerate(runs):
+        if report:
+            report(f"Loading run {number + 1} of {len(runs)}")
+        yield load_run(files, cache_dir)
+
+
+# --- Columnar cache ---
+
+def columnar_cache_path(xmlfile, cache_dir):
+    """Cache directory of an edgedata file, keyed by its path, size and modification time."""
+    stat = os.stat(xmlfile)
+    key = f"{COLUMNAR_CACHE_VERSION}:{os.path.abspath(xmlfile)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return os.path.join(cache_dir, 'columns', hashlib.sha1(key.encode('utf-8')).hexdigest()[:16])
+
+
+def write_columnar_cache(dataframe, path):
+    """Write the ids (as integer codes) and every indicator of an edgedata table to path."""
+    os.makedirs(path, exist_ok=True)
+    edge_codes, edges = pd.factorize(dataframe['edge_id'], sort=True)
+    interval_codes, intervals = pd.factorize(dataframe['interval_id'])
+    interval_begin = dataframe.groupby(interval_codes)['interval_begin'].first()
+    np.save(os.path.join(path, 'edge_id.npy'), edge_codes.astype(np.int32))
+    np.save(os.path.join(path, 'interval_id.npy'), interval_codes.astype(np.int32))
+    indicators = [column for column in EDGE_INDICATORS if column in dataframe.columns]
+    for column in indicators:
+        np.save(os.path.join(path, column + '.npy'), dataframe[column].to_numpy(np.float32))
+    meta = {'edges': list(edges), 'intervals': list(intervals), 'interval_begin': interval_begin.tolist(),
+            'indicators': indicators, 'rows': len(dataframe),
+            'decimals': {column: value_decimals(dataframe[column]) for column in indicators}}
+    # meta.json is written last, a cache directory without it is incomplete and gets rebuilt
+    with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+
+def columnar_source(xmlfile, cache_dir=CACHE_DIR):
+    """Return the index in columnar_sources of an edgedata file, converting it to the columnar cache if needed."""
+    path = columnar_cache_path(xmlfile, cache_dir)
+    for index, source in enumerate(columnar_sources):
+        if source['path'] == path:
+            return index
+    if not os.path.exists(os.path.join(path, 'meta.json')):
+        write_columnar_cache(read_edgedata(xmlfile), path)
+    with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    columnar_sources.append({'path': path, 'file': xmlfile, **meta})
+    return len(columnar_sources) - 1
+
+
+def read_columnar_ids(index):
+    """Build the id-only table of a cached edgedata file.
+
+    _source and _row remember where every row comes from, so indicators can be added after sorting and concatenating."""
+    source = columnar_sources[index]
+    interval_codes = np.load(os.path.join(source['path'], 'interval_id.npy'))
+    return pd.DataFrame({
+        'interval_begin': np.asarray(source['interval_begin'], dtype=np.float32)[interval_codes],
+        'interval_id': pd.Categorical.from_codes(interval_codes, categories=source['intervals']),
+        'edge_id': pd.Categorical.from_codes(np.load(os.path.join(source['path'], 'edge_id.npy')),
+                                             categories=source['edges']),
+        '_source': np.full(source['rows'], index, dtype=np.int16),
+        '_row': np.arange(source['rows'], dtype=np.int32),
+    })
+
+
+def available_indicators(dataframe):
+    """Indicators of an edgedata table, whether they are already loaded or still in the columnar cache."""
+    columns = set(dataframe.columns)
+    if '_source' in dataframe.columns:
+        for index in np.unique(dataframe['_source']):
+            columns.update(columnar_sources[index]['indicators'])
+    return [column for column in EDGE_INDICATORS if column in columns]
+
+
+def load_indicator(dataframe, column):
+    """Add an indicator to an edgedata table (in place), decoding it from the columnar cache the first time.
+
+    The decimals of the indicator in its files are kept in attrs['decimals'] of the table."""
+    if column in dataframe.columns or '_source' not in dataframe.columns:
+        return dataframe
+    with _indicator_lock:
+        if column not in dataframe.columns:
+            values = np.full(len(dataframe), np.nan, dtype=np.float32)
+            sources = dataframe['_source'].to_numpy()
+            rows = dataframe['_row'].to_numpy()
+            decimals = []
+            for index in np.unique(sources):
+                if column in columnar_sources[index]['indicators']:
+                    mask = sources == index
+                    cached = np.load(os.path.join(columnar_sources[index]['path'], column + '.npy'), mmap_mode='r')
+                    values[mask] = cached[rows[mask]]
+                    decimals.append(columnar_sources[index]['decimals'][column])
+            dataframe[column] = values
+            dataframe.attrs['decimals'] = {**dataframe.attrs.get('decimals', {}), column: most_decimals(decimals)}
+    return dataframe
+
+
+# --- Compact representation ---
+
+def drop_unused_columns(dataframe, columns, indicators):
+    """Keep only the given columns, with the indicators stored as float32."""
+    dataframe = dataframe[[column for column in columns if column in dataframe.columns]]
+    return dataframe.astype({column: np.float32 for column in indicators if column in dataframe.columns})
+
+
+def compact_edgedata(dataframe_without, dataframe_with):
+    """Encode edge_id and interval_id of both scenarios as categoricals sharing the same categories.
+
+    Interval categories follow the simulation time, and interval_begin (only needed to sort) is dropped."""
+    intervals = pd.concat([dataframe_without[['interval_begin', 'interval_id']],
+                           dataframe_with[['interval_begin', 'interval_id']]]).drop_duplicates('interval_id')
+    interval_dtype = pd.CategoricalDtype(intervals.sort_values('interval_begin')['interval_id'])
+    edge_dtype = pd.CategoricalDtype(sorted(set(unique_ids(dataframe_without['edge_id']))
+                                            | set(unique_ids(dataframe_with['edge_id']))))
+    frames = []
+    for dataframe in (dataframe_without, dataframe_with):
+        dataframe = dataframe.drop(columns=['interval_begin'])
+        frames.append(dataframe.astype({'interval_id': interval_dtype, 'edge_id': edge_dtype}))
+    return frames
+
+
+def unique_ids(series):
+    """Distinct values of an id column, read from the categories when it is already categorical."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.categories
+    return series.unique()
+
+
+def frame_memory(dataframe):
+    """Memory used by a DataFrame, including the Python strings of object columns (bytes)."""
+    return int(dataframe.memory_usage(deep=True).sum())
+
+
+def print_memory_report(frames_before, frames_after):
+    """Print the footprint of the loaded tables before and after the compact representation."""
+    print(f"{'table':<22}{'before (MB)':>14}{'after (MB)':>14}{'ratio':>8}", file=sys.stderr)
+    for name in frames_before:
+        before = frame_memory(frames_before[name]) / 2 ** 20
+        after = frame_memory(frames_after[name]) / 2 ** 20
+        print(f"{name:<22}{before:>14.2f}{after:>14.2f}{after / before if before else 0:>8.2f}", file=sys.stderr)
+
+
+def sort_data(dataframe):
+    """Sort the data by 'interval_begin' and 'edge_id'."""
+    return dataframe.sort_values(by=['interval_begin', 'edge_id'], ignore_index=True)
+
+
+# --- Input function ---
+def parse_inputs(args=None):
+    """Parse the command-line inputs (or the given argument list)."""
+    parser = optparse.OptionParser()
+    parser.add_option("--edgedata_without", action="append", dest="edgedata_without", default=[],
+                      help="File without deviations", metavar="FILE_name_without")
+    parser.add_option("--edgedata_with", action="append", dest="edgedata_with", default=[], help="File with deviations",
+                      metavar="FILE_name_with")
+    parser.add_option("--tripinfo_without", dest="tripinfo_without", help="Tripinfo file without deviations",
+                      metavar="TRIPINFO_without")
+    parser.add_option("--tripinfo_with", dest="tripinfo_with", help="Tripinfo file with deviations",
+                      metavar="TRIPINFO_with")
+    parser.add_option("--vehroutes_without", dest="vehroutes_without",
+                      help="Vehroute output without deviations, to find the vehicles that used the selected streets "
+                           "(read once at load, not followed with --follow)",
+                      metavar="VEHROUTES_without")
+    parser.add_option("--vehroutes_with", dest="vehroutes_with", help="Vehroute output with deviations",
+                      metavar="VEHROUTES_with")
+    parser.add_option("--road_network_json", dest="road_network_json", help="TrafficTwin geojson", metavar="GeoJson")
+    parser.add_option("--rerouter", action="append", dest="rerouter", default=[],
+                      help="Rerouter additional file of the scenario with deviations, its closingReroute edges are "
+                           "the closed roads (can be repeated)", metavar="FILE")
+    parser.add_option("--closed_roads", dest="closed_roads", help="Comma-separated ids of the closed roads",
+                      metavar="IDS")
+    parser.add_option("--impact_hops", dest="impact_hops", type="int",
+                      help="Restrict the default rankings and the map to the streets at most HOPS junctions away "
+                           "from the closed roads", metavar="HOPS")
+    parser.add_option("--zones", dest="zones",
+                      help="Polygons (GeoJSON or any file read by geopandas) aggregating the streets at low zoom",
+                      metavar="FILE")
+    parser.add_option("--hex_size", dest="hex_size", type="float",
+                      help="Aggregate the streets at low zoom on a hexagonal grid of this radius", metavar="METRES")
+    parser.add_option("--zone_zoom", dest="zone_zoom", type="int", default=14,
+                      help="Zoom level from which the streets are shown instead of the zones", metavar="LEVEL")
+    parser.add_option("--png_dpi", dest="png_dpi", type="int", default=PNG_DPI,
+                      help="Resolution of the PNG export of the map (default: %default)", metavar="DPI")
+    parser.add_option("--replicate_without", action="append", dest="replicate_without", default=[],
+                      help="Comma-separated edgedata files of another run without deviations (with another seed), "
+                           "can be repeated: the runs are aggregated into means and confidence intervals",
+                      metavar="FILES")
+    parser.add_option("--replicate_with", action="append", dest="replicate_with", default=[],
+                      help="Comma-separated edgedata files of another run with deviations, can be repeated",
+                      metavar="FILES")
+    parser.add_option("--confidence", dest="confidence", type="float", default=0.95,
+                      help="Confidence level of the significance tests of the replicated runs", metavar="LEVEL")
+    parser.add_option("--memory_report", action="store_true", dest="memory_report", default=False,
+                      help="Print the memory used by the tables before and after the compact representation")
+    parser.add_option("--cache_dir", dest="cache_dir", default=CACHE_DIR,
+                      help="Directory of the columnar cache of the edgedata files", metavar="DIR")
+    parser.add_option("--background_loading", action="store_true", dest="background_loading", default=False,
+                      help="Start the server right away and load the datasets in a background thread")
+    parser.add_option("--follow", action="store_true", dest="follow", default=False,
+                      help="Follow the outputs of a running simulation, adding the intervals and trips as they are "
+                           "written (implies --background_loading)")
+    parser.add_option("--follow_interval", dest="follow_interval", type="float", default=5.0,
+                      help="Seconds between two reads of the followed outputs", metavar="SECONDS")
+    parser.add_option("--trip_sketches", action="store_true", dest="trip_sketches", default=False,
+                      help="Stream the tripinfo files once into quantile sketches and histograms instead of loading "
+                           "every trip (for very large runs; the per-vehicle views are then not available)")
+    parser.add_option("--disk_cache", dest="disk_cache", type="float", default=0,
+                      help="Keep up to MB megabytes of computed tables and views in the cache directory, reused after "
+                           "a restart or by other workers on the same data (not in follow mode)", metavar="MB")
+    parser.add_option("--warm_up", dest="warm_up", type="int", default=0,
+                      help="Once the datasets are loaded, precompute the map and figures of the default indicator and "
+                           "of the most used ones over the full time range, N indicators in all", metavar="N")
+    parser.add_option("--warm_up_workers", dest="warm_up_workers", type="int", default=2,
+                      help="Threads computing the warm-up views", metavar="N")
+    parser.add_option("--datasets", dest="datasets",
+                      help="JSON file naming several datasets (a network and its scenario outputs), each with the "
+                           "arguments describing it, added to the ones of the command line; a page shows one with "
+                           "?dataset=NAME (the first by default), loaded on its first use", metavar="FILE")
+    parser.add_option("--memory_budget", dest="memory_budget", type="float",
+                      help="Evict the least recently used datasets once the loaded ones take more than MB megabytes",
+                      metavar="MB")
+
+    (options, args) = parser.parse_args(args)
+    return options
+
+
+def loading_steps(options):
+    """Number of progress steps reported by load_inputs() (or follow_inputs()) for the given options, plus the
+    optional steps of the app (vehroute indexes, impact region and zones)."""
+    steps = (options.impact_hops is not None) + bool(options.zones or options.hex_size)
+    if options.follow:
+        return steps + 1
+    if options.replicate_without or options.replicate_with:
+        steps += 2 + len(options.replicate_without) + len(options.replicate_with)
+    else:
+        steps += len(options.edgedata_without) + len(options.edgedata_with)
+    return steps + 3 + bool(options.vehroutes_without) + bool(options.vehroutes_with)
+
+
+def read_closed_roads(options):
+    """Closed roads given by the rerouter files or on the command line, the sample ones otherwise."""
+    if not options.rerouter and not options.closed_roads:
+        return list(CLOSED_ROADS)
+    closed_roads = [edge_id for xmlfile in options.rerouter for edge_id in read_rerouter_closures(xmlfile)]
+    if options.closed_roads:
+        closed_roads += [edge_id.strip() for edge_id in options.closed_roads.split(',') if edge_id.strip()]
+    return list(dict.fromkeys(closed_roads))
+
+
+def load_inputs(options, report=None):
+    """Load the datasets for analysis; report(message) is called before each step when given.
+
+    With --trip_sketches, the vehicle data are the statistics of the trips (see read_trip_statistics), not tables."""
+    report = report or (lambda message: None)
+
+    # Load data
+    xml_edgedata_without = options.edgedata_without
+    xml_edgedata_with = options.edgedata_with
+    xml_tripinfo_without = options.tripinfo_without
+    xml_tripinfo_with = options.tripinfo_with
+    road_network_json_file = options.road_network_json
+
+    dataframe_without = pd.DataFrame()
+    dataframe_with = pd.DataFrame()
+
+    if options.replicate_without or options.replicate_with:
+        # Replicated runs: the tables hold the means of the runs, with their variance and count
+        dataframe_without = sort_data(aggregate_runs(iter_runs(
+            replicate_runs(xml_edgedata_without, options.replicate_without), options.cache_dir, report)))
+        dataframe_with = sort_data(aggregate_runs(iter_runs(
+            replicate_runs(xml_edgedata_with, options.replicate_with), options.cache_dir, report)))
+    else:
+        # Load XML data into dataframes
+        for xmldata_without in xml_edgedata_without:
+            report(f"Loading {os.path.basename(xmldata_without)}")
+            dataframe_without = load_data(xmldata_without, dataframe_without, cache_dir=options.cache_dir)
+        dataframe_without = sort_data(dataframe_without)
+
+        for xmldata_with in xml_edgedata_with:
+            report(f"Loading {os.path.basename(xmldata_with)}")
+            dataframe_with = load_data(xmldata_with, dataframe_with, cache_dir=options.cache_dir)
+        dataframe_with = sort_data(dataframe_with)
+
+    # Load vehicle data (with --trip_sketches, only their statistics, see src/trip_sketches.py)
+    load_trips = read_trip_statistics if options.trip_sketches else load_vehicles_data
+    report(f"Loading {os.path.basename(xml_tripinfo_without)}")
+    vehicle_data_without = load_trips(xml_tripinfo_without)
+    report(f"Loading {os.path.basename(xml_tripinfo_with)}")
+    vehicle_data_with = load_trips(xml_tripinfo_with)
+
+    if options.memory_report:
+        frames_before = {'dataframe_without': pd.concat([load_data(xml, pd.DataFrame(), False)
+                                                         for xml in xml_edgedata_without]),
+                         'dataframe_with': pd.concat([load_data(xml, pd.DataFrame(), False)
+                                                      for xml in xml_edgedata_with])}
+        if not options.trip_sketches:
+            frames_before.update({'vehicle_data_without': load_vehicles_data(xml_tripinfo_without, False),
+                                  'vehicle_data_with': load_vehicles_data(xml_tripinfo_with, False)})
+
+    report("Preparing the tables")
+    dataframe_without, dataframe_with = compact_edgedata(dataframe_without, dataframe_with)
+
+    if options.memory_report:
+        frames_after = {'dataframe_without': dataframe_without, 'dataframe_with': dataframe_with}
+        if not options.trip_sketches:
+            frames_after.update({'vehicle_data_without': vehicle_data_without,
+                                 'vehicle_data_with': vehicle_data_with})
+        print_memory_report(frames_before, frames_after)
+
+    closed_roads = read_closed_roads(options)
+    dict_names = {}
+
+    return dataframe_without, dataframe_with, vehicle_data_without, vehicle_data_with, road_network_json_file, closed_roads, dict_names
+
+
+def read_inputs(args=None):
+    """Read command-line inputs (or the given argument list) and load datasets for analysis."""
+    return load_inputs(parse_inputs(args))
@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+
+
+# --- Disk cache ---
+# Second tier of the cache of src/aggregations.py: the street tables, views and rankings computed for a dataset are
+# also stored, pickled and compressed, in an SQLite file of the cache directory, so a restarted server (or another
+# worker started on the same data) serves them without computing them again. The entries are keyed by the content key
+# of the dataset (see dataset_key) and the normalized parameters; the least recently used ones are evicted once the
+# file holds more than its size limit. SQLite (in WAL mode) lets several processes share the file.
+#
+# The entries are pickles: the cache directory must only be writable by the users running the dashboard.
+
+DISK_CACHE_FILE = 'results.sqlite'
+# Bumped when the cached values change, so the entries of an older version are never read back
+DISK_CACHE_VERSION = 2
+COMPRESSION_LEVEL = 1
+
+# Options that do not change the results (how the data are loaded and served, not what they are)
+RUNTIME_OPTIONS = {'memory_report', 'cache_dir', 'background_loading', 'follow_interval', 'warm_up', 'warm_up_workers',
+                   'disk_cache', 'datasets', 'memory_budget', 'png_dpi'}
+
+
+def file_identity(path):
+    """Path, size and modification time of a file, as for the columnar cache."""
+    stat = os.stat(path)
+    return [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+
+
+def dataset_key(options):
+    """Content key of the loaded dataset: the options that change the results, and the identity of the input files."""
+    parameters = {}
+    for name, value in sorted(vars(options).items()):
+        if name in RUNTIME_OPTIONS:
+            continue
+        values = value if isinstance(value, list) else [value]
+        parameters[name] = [file_identity(item) if isinstance(item, str) and os.path.isfile(item) else item
+                            for item in values]
+    parameters['version'] = DISK_CACHE_VERSION
+    return hashlib.sha1(json.dumps(parameters, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def open_disk_cache(cache_dir, max_bytes):
+    """Open (creating it if needed) the disk cache of a cache directory, limited to max_bytes."""
+    os.makedirs(cache_dir, exist_ok=True)
+    connection = sqlite3.connect(os.path.join(cache_dir, DISK_CACHE_FILE), timeout=30, check_same_thread=False,
+                                 isolation_level=None)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, '
+                       'size INTEGER NOT NULL, accessed REAL NOT NULL)')
+    connection.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+    return {'connection': connection, 'max_bytes': max_bytes, 'lock': threading.Lock()}
+
+
+def entry_key(key):
+    """Text key of an entry from its key tuple."""
+    return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+
+def disk_get(disk_cache, key):
+    """Value stored under key, None when missing (or unreadable)."""
+    with disk_cache['lock']:
+        row = disk_cache['connection'].execute('SELECT value FROM entries WHERE key = ?',
+                                               (entry_key(key),)).fetchone()
+        if row is None:
+            return None
+        disk_cache['connection'].execute('UPDATE entries SET accessed = ? WHERE key = ?',
+                                         (time.time(), entry_key(key)))
+    try:
+        return pickle.loads(zlib.decompress(row[0]))
+    except Exception:
+        return None
+
+
+def disk_put(disk_cache, key, value):
+    """Store a value under key, then evict the least recently used entries beyond the size limit."""
+    data = zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), COMPRESSION_LEVEL)
+    if len(data) > disk_cache['max_bytes']:
+        return
+    with disk_cache['lock']:
+        connection = disk_cache['connection']
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)',
+                               (entry_key(key), data, len(data), time.time()))
+            total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+            if total > disk_cache['max_bytes']:
+                evicted = 0
+                for old_key, size in connection.execute('SELECT key, size FROM entries ORDER BY accessed').fetchall():
+                    if total - evicted <= disk_cache['max_bytes']:
+                        break
+                    connection.execute('DELETE FROM entries WHERE key = ?', (old_key,))
+                    evicted += size
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
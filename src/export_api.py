@@ -0,0 +1,196 @@
+import io
+import numpy as np
+import pandas as pd
+from flask import Response, request, jsonify
+from src.const import TRAFFIC_OPTIONS
+from src.data_loader import available_indicators
+from src.aggregations import select_intervals, cached_street_tables, cached_edge_differences
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+# --- Bulk export API ---
+# Scripted analyses get the per-street values and differences (with - without) of an indicator over a time range
+# without going through the figures:
+#   /api/indicators                                  indicators and intervals of the loaded datasets
+#   /api/edges?indicator=speed&begin=0&end=3600      mean over the time range of every street
+#   /api/intervals?indicator=speed&begin=0&end=3600  value of every street in every interval of the time range
+# with format=json (default), csv or arrow (Arrow IPC stream, needs the optional pyarrow package), edges=id1,id2...
+# to keep only some streets, and dataset=NAME to query a dataset of the registry (the default one otherwise). The
+# tables come from the same cached aggregations as the dashboard, and are streamed in chunks of CHUNK_ROWS rows, so a
+# large network is never serialized at once.
+
+CHUNK_ROWS = 50000
+FORMATS = {'json': 'application/json', 'csv': 'text/csv', 'arrow': 'application/vnd.apache.arrow.stream'}
+
+
+def resolve_indicator(dataframe, name):
+    """Column (edge_...) of an indicator given by its column, its short name or its label, None if unknown."""
+    labels = {label: column for column, label in TRAFFIC_OPTIONS.items()}
+    column = labels.get(name, name if name.startswith('edge_') else "edge_" + name)
+    return column if column in available_indicators(dataframe) else None
+
+
+def requested_time_range():
+    """(begin, end) of the begin and end query parameters (seconds), None when neither is given."""
+    begin, end = request.args.get('begin', type=float), request.args.get('end', type=float)
+    if begin is None and end is None:
+        return None
+    return begin if begin is not None else -np.inf, end if end is not None else np.inf
+
+
+def requested_edges():
+    """Street ids of the edges query parameter, None for every street."""
+    edges = request.args.get('edges')
+    if not edges:
+        return None
+    return pd.Index([edge.strip() for edge in edges.split(',') if edge.strip()], dtype=object)
+
+
+def edge_chunks(differences):
+    """Chunks of the table of the mean of every street."""
+    table = differences.reset_index()
+    # An empty table still gives one (empty) chunk, for the CSV header and the Arrow schema
+    for start in range(0, max(len(table), 1), CHUNK_ROWS):
+        yield table.iloc[start:start + CHUNK_ROWS]
+
+
+def interval_chunks(tables, intervals):
+    """Chunks of the long table (edge_id, interval_id, without, with, difference) of the given intervals."""
+    table_without, table_with = (table[intervals] for table in tables)
+    streets = max(CHUNK_ROWS // max(len(intervals), 1), 1)
+    for start in range(0, max(len(table_without), 1), streets):
+        without = table_without.iloc[start:start + streets].to_numpy(np.float64)
+        with_deviations = table_with.iloc[start:start + streets].to_numpy(np.float64)
+        yield pd.DataFrame({
+            'edge_id': np.repeat(table_without.index[start:start + streets].astype(str), len(intervals)),
+            'interval_id': np.tile(np.asarray(intervals, dtype=str), len(without)),
+            'without': without.ravel(),
+            'with': with_deviations.ravel(),
+            'difference': (with_deviations - without).ravel(),
+        })
+
+
+def stream_json(chunks):
+    """JSON array of records, one chunk at a time."""
+    yield '['
+    first = True
+    for chunk in chunks:
+        if len(chunk):
+            records = chunk.to_json(orient='records', double_precision=6)[1:-1]
+            yield records if first else ',' + records
+            first = False
+    yield ']'
+
+
+def stream_csv(chunks):
+    """CSV with a header, one chunk at a time."""
+    header = True
+    for chunk in chunks:
+        yield chunk.to_csv(index=False, header=header)
+        header = False
+
+
+def stream_arrow(chunks, columns):
+    """Arrow IPC stream, one record batch per chunk."""
+    schema = pa.schema([(column, pa.string() if column.endswith('_id') else pa.float64()) for column in columns])
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for chunk in chunks:
+            writer.write_batch(pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
+
+
+def export_response(chunks, columns, output_format, name):
+    """Streamed response of the chunks in the requested format."""
+    if output_format == 'csv':
+        body = stream_csv(chunks)
+    elif output_format == 'arrow':
+        body = stream_arrow(chunks, columns)
+    else:
+        body = stream_json(chunks)
+    response = Response(body, mimetype=FORMATS[output_format])
+    if output_format != 'json':
+        extension = 'arrows' if output_format == 'arrow' else output_format
+        response.headers['Content-Disposition'] = f'attachment; filename="{name}.{extension}"'
+    return response
+
+
+def requested_datasets(datasets):
+    """Tables of the dataset of the dataset query parameter, or the error response."""
+    name = request.args.get('dataset')
+    try:
+        current = datasets(name)
+    except KeyError:
+        return None, (jsonify(error=f"Unknown dataset {name}"), 404)
+    if current is None:
+        return None, (jsonify(error='The datasets are still loading'), 503)
+    return current, None
+
+
+def register_export_api(server, datasets):
+    """Expose the export API on the Flask server. datasets(name) returns (version, edgedata without, edgedata with)
+    of a dataset (the default one when name is None) once it is loaded, None before, and raises KeyError for an unknown
+    dataset."""
+
+    def export_request():
+        """Datasets and parameters of an export request, or the error response."""
+        current, error = requested_datasets(datasets)
+        if error is not None:
+            return None, error
+        version, dataframe_without, dataframe_with = current
+        output_format = request.args.get('format', 'json')
+        if output_format not in FORMATS:
+            return None, (jsonify(error=f"Unknown format {output_format}, expected one of {', '.join(FORMATS)}"),
+                          400)
+        if output_format == 'arrow' and pa is None:
+            return None, (jsonify(error='The arrow format needs the pyarrow package'), 501)
+        indicator = resolve_indicator(dataframe_without, request.args.get('indicator', ''))
+        if indicator is None:
+            return None, (jsonify(error='Unknown indicator', indicators=available_indicators(dataframe_without)), 400)
+        intervals = select_intervals([str(interval) for interval in dataframe_without['interval_id'].unique()],
+                                     requested_time_range())
+        if not intervals:
+            return None, (jsonify(error='No interval in this time range'), 400)
+        return (version, dataframe_without, dataframe_with, indicator, intervals, requested_edges(),
+                output_format), None
+
+    @server.route('/api/indicators')
+    def export_indicators():
+        current, error = requested_datasets(datasets)
+        if error is not None:
+            return error
+        dataframe_without = current[1]
+        return jsonify(indicators=[{'indicator': column, 'name': column[len('edge_'):],
+                                    'label': TRAFFIC_OPTIONS.get(column, column)}
+                                   for column in available_indicators(dataframe_without)],
+                       intervals=[str(interval) for interval in dataframe_without['interval_id'].unique()])
+
+    @server.route('/api/edges')
+    def export_edges():
+        parameters, error = export_request()
+        if error is not None:
+            return error
+        version, dataframe_without, dataframe_with, indicator, intervals, edges, output_format = parameters
+        differences = cached_edge_differences(version, dataframe_without, dataframe_with, indicator, intervals,
+                                              edges)
+        return export_response(edge_chunks(differences), ['edge_id', 'without', 'with', 'difference'],
+                               output_format, indicator)
+
+    @server.route('/api/intervals')
+    def export_intervals():
+        parameters, error = export_request()
+        if error is not None:
+            return error
+        version, dataframe_without, dataframe_with, indicator, intervals, edges, output_format = parameters
+        tables = cached_street_tables(version, dataframe_without, dataframe_with, indicator[len('edge_'):], edges)
+        selected = set(intervals)
+        intervals = [interval for interval in tables[0].columns if str(interval) in selected]
+        return export_response(interval_chunks(tables, intervals),
+                               ['edge_id', 'interval_id', 'without', 'with', 'difference'], output_format, indicator)
@@ -0,0 +1,291 @@
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+import numpy as np
+import pandas as pd
+from src.sumo_xml import EDGE_INDICATORS, VEHICLE_INDICATORS, decompressor, interval_records, tripinfo_records, \
+    edgedata_frame, tripinfo_frame, value_decimals, most_decimals
+
+
+# --- Follow mode ---
+# SUMO writes an <interval> of the edgedata output (and a <tripinfo> of the tripinfo output) once it is over, so the
+# files can be read while the simulation is still running: every poll feeds the bytes appended since the previous one
+# to an incremental XML parser and only converts the elements closed in the meantime. The new rows are then appended to
+# growable tables, so the cost of an update depends on what SUMO wrote since the previous poll, not on the size of the
+# files or of the tables.
+
+READ_SIZE = 1 << 20
+
+
+def tail_records(xmlfile, tag, convert):
+    """Generator returning, on every next(), the records convert(element) of the <tag> elements closed since the
+    previous call. The file does not have to exist yet, and .gz/.zst files are decompressed as they grow."""
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    stream = decompressor(xmlfile)
+    root = None
+    offset = 0
+    while True:
+        records = []
+        if os.path.exists(xmlfile):
+            with open(xmlfile, 'rb') as f:
+                f.seek(offset)
+                for chunk in iter(lambda: f.read(READ_SIZE), b''):
+                    offset += len(chunk)
+                    parser.feed(stream.decompress(chunk) if stream is not None else chunk)
+                    for event, element in parser.read_events():
+                        if event == 'start':
+                            if root is None:
+                                root = element
+                        elif element.tag == tag:
+                            records.extend(convert(element))
+                            # Closed elements are not needed anymore, only keep the ones still being written
+                            root.remove(element)
+        yield records
+
+
+def open_follower(options):
+    """Start tailing the edgedata and tripinfo outputs given on the command line."""
+    return {
+        'edgedata_without': [tail_records(xml, 'interval', interval_records) for xml in options.edgedata_without],
+        'edgedata_with': [tail_records(xml, 'interval', interval_records) for xml in options.edgedata_with],
+        'tripinfo_without': tail_records(options.tripinfo_without, 'tripinfo', tripinfo_records),
+        'tripinfo_with': tail_records(options.tripinfo_with, 'tripinfo', tripinfo_records),
+        # The tables the new rows are appended to
+        'tables': new_follow_tables(trip_impact=not options.trip_sketches),
+    }
+
+
+def poll_follower(follower):
+    """Return the new edgedata rows (interval_begin included) and the new trips of both scenarios."""
+    return (edgedata_frame([record for tail in follower['edgedata_without'] for record in next(tail)]),
+            edgedata_frame([record for tail in follower['edgedata_with'] for record in next(tail)]),
+            tripinfo_frame(next(follower['tripinfo_without'])),
+            tripinfo_frame(next(follower['tripinfo_with'])))
+
+
+# --- Growable tables ---
+# The followed tables are kept in arrays with room for more rows, twice as large as needed when they grow, and every
+# update publishes DataFrames viewing their filled part. The rows already loaded are neither copied nor re-cast: an
+# update only writes its new rows, and an array is copied into a larger one once its room is used up, so the copies
+# add up to a constant cost per row. A categorical column stores its codes; its categories (shared by both scenarios)
+# only grow at the end, so the codes already written stay valid.
+
+MIN_CAPACITY = 1024
+
+
+def new_categories():
+    """Categories of a categorical column: their codes {value: code}, in the order they were added, and their dtype."""
+    return {'codes': {}, 'dtype': pd.CategoricalDtype([])}
+
+
+def add_categories(categories, values):
+    """Add the values missing from the categories, in their order; the dtype is only rebuilt when there are some."""
+    added = [value for value in dict.fromkeys(values) if value not in categories['codes']]
+    for value in added:
+        categories['codes'][value] = len(categories['codes'])
+    if added:
+        categories['dtype'] = pd.CategoricalDtype(list(categories['codes']))
+
+
+def new_table(frame, categories):
+    """Empty growable table with the columns of frame; categories maps its categorical columns to new_categories(),
+    possibly shared with another table."""
+    return {'rows': 0, 'categories': categories, 'seen': {column: {} for column in categories},
+            'arrays': {column: np.empty(0, dtype=np.int8 if column in categories else frame[column].dtype)
+                       for column in frame.columns}}
+
+
+def written(array, rows, values):
+    """Write values after the first rows of array, moved first into an array twice as large when they do not fit."""
+    if rows + len(values) > len(array):
+        grown = np.empty(max(2 * (rows + len(values)), MIN_CAPACITY), dtype=array.dtype)
+        grown[:rows] = array[:rows]
+        array = grown
+    array[rows:rows + len(values)] = values
+    return array
+
+
+def codes_array(table, column):
+    """Code array of a categorical column, widened when its categories outgrew it (at most three times)."""
+    dtype = pd.Categorical.from_codes([], dtype=table['categories'][column]['dtype']).codes.dtype
+    if table['arrays'][column].dtype != dtype:
+        table['arrays'][column] = table['arrays'][column].astype(dtype)
+    return table['arrays'][column]
+
+
+def append_rows(table, frame):
+    """Write the rows of frame (with the columns of the table) after the rows of the table."""
+    rows = table['rows']
+    for column in table['arrays']:
+        if column in table['categories']:
+            categories = table['categories'][column]
+            codes, values = pd.factorize(frame[column].astype(object))
+            add_categories(categories, values)
+            table['seen'][column].update(dict.fromkeys(values))
+            # Missing values (code -1) take the last code of the lookup, -1
+            lookup = np.array([categories['codes'][value] for value in values] + [-1], dtype=np.int64)
+            array = codes_array(table, column)
+            table['arrays'][column] = written(array, rows, lookup[codes].astype(array.dtype))
+        else:
+            array = table['arrays'][column]
+            table['arrays'][column] = written(array, rows, frame[column].to_numpy(array.dtype))
+    table['rows'] = rows + len(frame)
+
+
+def table_frame(table):
+    """DataFrame viewing the rows of a table, which are never written again."""
+    columns = {}
+    for column in table['arrays']:
+        if column in table['categories']:
+            columns[column] = pd.Categorical.from_codes(codes_array(table, column)[:table['rows']], validate=False,
+                                                        dtype=table['categories'][column]['dtype'])
+        else:
+            columns[column] = table['arrays'][column][:table['rows']]
+    return pd.DataFrame(columns, copy=False)
+
+
+# --- Appending to the followed tables ---
+
+def new_follow_tables(trip_impact=True):
+    """Empty tables of both scenarios (the edgedata ones sharing their categories), and the impact of the trips
+    unless trip_impact is False."""
+    edgedata = edgedata_frame([]).drop(columns=['interval_begin'])
+    edgedata_categories = {'interval_id': new_categories(), 'edge_id': new_categories()}
+    tripinfo = tripinfo_frame([])
+    return {
+        'edgedata_without': new_table(edgedata, edgedata_categories),
+        'edgedata_with': new_table(edgedata, edgedata_categories),
+        'vehicles_without': new_table(tripinfo, {'tripinfo_vType': new_categories()}),
+        'vehicles_with': new_table(tripinfo, {'tripinfo_vType': new_categories()}),
+        'decimals_without': {}, 'decimals_with': {},
+        'impact': new_trip_impact() if trip_impact else None,
+    }
+
+
+def append_edgedata(tables, new_without, new_with):
+    """Append new rows to the edgedata tables of both scenarios and return the tables of both.
+
+    The new intervals and edges are added to the categories in the order of the simulation time (and of the edge
+    ids), the order compact_edgedata() gives them."""
+    new_without = new_without.sort_values(by=['interval_begin', 'edge_id'])
+    new_with = new_with.sort_values(by=['interval_begin', 'edge_id'])
+    intervals = {}
+    for new_rows in (new_without, new_with):
+        first_rows = new_rows.drop_duplicates('interval_id')
+        intervals.update(zip(first_rows['interval_id'], first_rows['interval_begin']))
+    add_categories(tables['edgedata_without']['categories']['interval_id'], sorted(intervals, key=intervals.get))
+    add_categories(tables['edgedata_without']['categories']['edge_id'],
+                   sorted(set(new_without['edge_id']) | set(new_with['edge_id'])))
+    frames = []
+    for scenario, new_rows in (('without', new_without), ('with', new_with)):
+        append_rows(tables['edgedata_' + scenario], new_rows)
+        decimals = tables['decimals_' + scenario]
+        for column in EDGE_INDICATORS:
+            new_decimals = value_decimals(new_rows[column])
+            decimals[column] = new_decimals if column not in decimals else most_decimals([decimals[column],
+                                                                                           new_decimals])
+        frame = table_frame(tables['edgedata_' + scenario])
+        frame.attrs['decimals'] = dict(decimals)
+        frames.append(frame)
+    return frames
+
+
+def followed_intervals(tables):
+    """Intervals of the edgedata table without deviations, in time order, without scanning its rows."""
+    return list(tables['edgedata_without']['seen']['interval_id'])
+
+
+def append_vehicles(tables, new_trips_without, new_trips_with):
+    """Append finished trips to the vehicle tables of both scenarios and to their impact.
+
+    Returns the vehicle tables of both scenarios and the impact of their trips (None without trip impact)."""
+    start_without = tables['vehicles_without']['rows']
+    start_with = tables['vehicles_with']['rows']
+    append_rows(tables['vehicles_without'], new_trips_without)
+    append_rows(tables['vehicles_with'], new_trips_with)
+    impact = None
+    if tables['impact'] is not None:
+        impact = add_trip_impact(tables['impact'], tables['vehicles_without'], tables['vehicles_with'],
+                                 start_without, start_with)
+    return table_frame(tables['vehicles_without']), table_frame(tables['vehicles_with']), impact
+
+
+# --- Impact of the followed trips ---
+# The trips get their position in the impact when they finish without deviations, in the order of the vehicle table,
+# so the impact ends as build_vehicle_impact() of the whole tables. A trip is matched with its trip with deviations by
+# a hash lookup of its id, whichever finishes first: the trips with deviations waiting for theirs are kept aside, and a
+# trip already in the impact gets its values with deviations in place (the views computed from the previous version
+# may then already show them). The differences are sorted by the first ranking of each version (see impact_orders),
+# and the ids by the first vehicle search.
+
+def new_trip_impact():
+    """Values of the followed trips, by indicator, growing with the vehicle table without deviations."""
+    return {'positions': {}, 'pending': {}, 'present': np.zeros(0, dtype=bool),
+            'without': {indicator: np.zeros(0, dtype=np.float32) for indicator in VEHICLE_INDICATORS},
+            'with': {indicator: np.zeros(0, dtype=np.float32) for indicator in VEHICLE_INDICATORS},
+            'diff': {indicator: np.zeros(0, dtype=np.float32) for indicator in VEHICLE_INDICATORS}}
+
+
+def add_trip_impact(trip_impact, vehicles_without, vehicles_with, start_without, start_with):
+    """Add the trips appended to the vehicle tables from the given rows on, and return the impact of all the trips
+    (the fields of build_vehicle_impact)."""
+    rows = vehicles_without['rows']
+    new_rows = rows - start_without
+    trip_impact['present'] = written(trip_impact['present'], start_without, np.zeros(new_rows, dtype=bool))
+    for indicator in VEHICLE_INDICATORS:
+        without = vehicles_without['arrays'][indicator][start_without:rows]
+        trip_impact['without'][indicator] = written(trip_impact['without'][indicator], start_without,
+                                                    np.nan_to_num(without, nan=0.0))
+        for field in ('with', 'diff'):
+            trip_impact[field][indicator] = written(trip_impact[field][indicator], start_without,
+                                                    np.zeros(new_rows, dtype=np.float32))
+    positions, pending = trip_impact['positions'], trip_impact['pending']
+    ids_without, ids_with = vehicles_without['arrays']['tripinfo_id'], vehicles_with['arrays']['tripinfo_id']
+    matched = []
+    for position in range(start_without, rows):
+        trip_id = str(ids_without[position])
+        positions[trip_id] = position
+        if trip_id in pending:
+            matched.append((position, pending.pop(trip_id)))
+    for row in range(start_with, vehicles_with['rows']):
+        trip_id = str(ids_with[row])
+        if trip_id in positions:
+            matched.append((positions[trip_id], row))
+        else:
+            pending[trip_id] = row
+    if matched:
+        matched_positions, matched_rows = np.array(matched, dtype=np.intp).T
+        for indicator in VEHICLE_INDICATORS:
+            with_deviations = vehicles_with['arrays'][indicator][matched_rows]
+            without = vehicles_without['arrays'][indicator][matched_positions]
+            trip_impact['with'][indicator][matched_positions] = np.nan_to_num(with_deviations, nan=0.0)
+            trip_impact['diff'][indicator][matched_positions] = np.nan_to_num(with_deviations - without, nan=0.0)
+        trip_impact['present'][matched_positions] = True
+    return {'trips': pd.Index(ids_without[:rows], copy=False), 'present': trip_impact['present'][:rows],
+            'types': [str(name) for name in vehicles_without['categories']['tripinfo_vType']['dtype'].categories],
+            'type_codes': vehicles_without['arrays']['tripinfo_vType'][:rows],
+            'without': {indicator: values[:rows] for indicator, values in trip_impact['without'].items()},
+            'with': {indicator: values[:rows] for indicator, values in trip_impact['with'].items()},
+            'diff': {indicator: values[:rows] for indicator, values in trip_impact['diff'].items()},
+            'orders': {}, 'lock': threading.Lock()}
+
+
+def follow_inputs(options, report=None):
+    """Open the follower and wait until both scenarios have at least one closed interval.
+
+    Returns the follower, the tables loaded so far in the order of load_inputs(), and the impact of their trips (None
+    with --trip_sketches)."""
+    report = report or (lambda message: None)
+    follower = open_follower(options)
+    tables = follower['tables']
+    report("Waiting for the first interval of the simulation outputs")
+    while True:
+        new_without, new_with, new_trips_without, new_trips_with = poll_follower(follower)
+        dataframe_without, dataframe_with = append_edgedata(tables, new_without, new_with)
+        vehicle_data_without, vehicle_data_with, vehicle_impact = append_vehicles(tables, new_trips_without,
+                                                                                  new_trips_with)
+        if len(dataframe_without) and len(dataframe_with):
+            return (follower, dataframe_without, dataframe_with, vehicle_data_without, vehicle_data_with,
+                    vehicle_impact)
+        time.sleep(options.follow_interval)
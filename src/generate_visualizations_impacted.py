@@ -1,11 +1,9 @@
-import plotly.express as px
 import datetime
-import textwrap
 
 
 def generate_visualizations(street_data_without, street_data_with, traffic_name, traffic_lowercase,
                             list_timeframe_in_seconds, list_timeframe_string, len_time_intervals_string, geo_data,
-                            hideout, dict_names, timeframe_from, timeframe_to, title_size):
+                            hideout, dict_names, timeframe_from, timeframe_to):
     """Generate visualizations based on the street data."""
 
     # If specific streets are selected in the hideout
@@ -15,20 +13,21 @@ def generate_visualizations(street_data_without, street_data_with, traffic_name,
             for v in value:
                 my_list.append(v)
         fig = generate_figure(street_data_without, street_data_with, traffic_name, traffic_lowercase,
-                              list_timeframe_in_seconds, timeframe_from, timeframe_to, geo_data, my_list, title_size)
+                              list_timeframe_in_seconds, timeframe_from, timeframe_to, geo_data, my_list)
         return fig
     else:
         # Generate figure for the 15 most impacted streets
         fig = generate_figure_15_most_impacted(street_data_without, street_data_with, traffic_name, traffic_lowercase,
                                                list_timeframe_in_seconds, list_timeframe_string,
-                                               len_time_intervals_string, geo_data, timeframe_from, timeframe_to,
-                                               title_size)
+                                               len_time_intervals_string, geo_data, timeframe_from, timeframe_to)
         return fig
 
 
 def generate_figure(street_data_without, street_data_with, traffic_name, traffic_lowercase, list_timeframe_in_seconds,
-                    timeframe_from, timeframe_to, geojson, my_list, title_size):
+                    timeframe_from, timeframe_to, geojson, my_list):
     """Generate a bar plot for selected streets based on the difference between with and without deviations."""
+    # Imported here: plotly.express is slow to import and only needed once a tab is drawn
+    import plotly.express as px
 
     # Filter the data based on the selected streets
     df_without = street_data_without[street_data_without.columns.intersection(list_timeframe_in_seconds)].copy()
@@ -58,12 +57,6 @@ def generate_figure(street_data_without, street_data_with, traffic_name, traffic
 
     title = 'Difference of the streets in terms of ' + traffic_name + ' for the time interval ' + timeframe_from + ' to ' + timeframe_to
 
-    # Wrap the title text for better readability
-    wrapped_title = '<br>'.join(textwrap.wrap(title, width=title_size))
-
-    # Adjust title font size based on title size
-    title_font_size, margin = adjust_title_formatting(title_size)
-
     # Map street names to the plot's x-axis
     for elem in index_names:
         for i in geojson['features']:
@@ -73,7 +66,7 @@ def generate_figure(street_data_without, street_data_with, traffic_name, traffic
     # generate bar plot
     fig = px.bar(df, y='diff_dates', x=df.index, orientation='v', text='diff_dates',
                  # color='diff_dates',
-                 title=wrapped_title)
+                 title=title)
     if traffic_lowercase == 'time loss (seconds)' or traffic_lowercase == 'travel time (seconds)' or traffic_lowercase == 'waiting time (seconds)':
         fig.update_traces(texttemplate='%{text}', textposition='outside')
     else:
@@ -90,15 +83,15 @@ def generate_figure(street_data_without, street_data_with, traffic_name, traffic
                    ticktext=list_names),
         yaxis=dict(showticklabels=False),
         title={'y': 0.95, 'pad': {'b': 50}},
-        title_font_size=title_font_size,
-        autosize=True, margin=dict(t=margin))
+        autosize=True)
     return fig
 
 
 def generate_figure_15_most_impacted(street_data_without, street_data_with, traffic_name, traffic_lowercase,
                                      list_timeframe_in_seconds, list_timeframe_string, len_time_intervals_string,
-                                     geo_data, timeframe_from, timeframe_to, title_size):
+                                     geo_data, timeframe_from, timeframe_to):
     """Generate a bar plot for the 15 most impacted streets based on the difference between with and without deviations."""
+    import plotly.express as px
     df_without = street_data_without[street_data_without.columns.intersection(list_timeframe_in_seconds)].copy()
     df_with = street_data_with[street_data_with.columns.intersection(list_timeframe_in_seconds)].copy()
 
@@ -121,12 +114,6 @@ def generate_figure_15_most_impacted(street_data_without, street_data_with, traf
 
     title = '15 most impacted streets in terms of ' + traffic_name + ' for the time interval ' + timeframe_from + ' to ' + timeframe_to
 
-    # Wrap the title text for better readability
-    wrapped_title = '<br>'.join(textwrap.wrap(title, width=title_size))
-
-    # Adjust title font size and margin based on title size
-    title_font_size, margin = adjust_title_formatting(title_size)
-
     # Map street names to the plot's x-axis
     for elem in index_names:
         for i in geo_data['features']:
@@ -136,7 +123,7 @@ def generate_figure_15_most_impacted(street_data_without, street_data_with, traf
     # generate bar plot
     fig = px.bar(df, y='diff_dates', x=df.index, orientation='v', text='diff_dates',
                  # color='diff_dates',
-                 title=wrapped_title
+                 title=title
                  )
     if traffic_lowercase == 'time loss (seconds)' or traffic_lowercase == 'travel time (seconds)' or traffic_lowercase == 'waiting time (seconds)':
         fig.update_traces(texttemplate='%{text}', textposition='outside')
@@ -155,8 +142,7 @@ def generate_figure_15_most_impacted(street_data_without, street_data_with, traf
                    tickangle=90),
         yaxis=dict(showticklabels=False),
         title={'y': 0.95, 'pad': {'b': 50}},
-        title_font_size=title_font_size,
-        autosize=True, margin=dict(t=margin))
+        autosize=True)
     return fig
 
 
@@ -201,14 +187,3 @@ def get_response(traffic):
         inf = True
     return inf
 
-
-def adjust_title_formatting(title_size):
-    """Adjust the title font size and margin based on the provided title size."""
-    title_font_size = 16
-    margin = 100
-    if title_size == 40:
-        margin = 140
-    elif title_size == 30:
-        title_font_size = 12
-        margin = 160
-    return title_font_size, margin
@@ -1,9 +1,8 @@
 import plotly.graph_objects as go
-import textwrap
 
 
 def generate_visualizations(street_data_without, street_data_with, traffic_3, traffic, list_timeframe_in_seconds,
-                            timeframe_from, timeframe_to, hideout, dict_names, title_size):
+                            timeframe_from, timeframe_to, hideout, dict_names):
     """Generate visualizations comparing street data with and without deviations over a specified timeframe."""
 
     # Filter data to match selected timeframes
@@ -20,15 +19,15 @@ def generate_visualizations(street_data_without, street_data_with, traffic_3, tr
         for (key, value) in hideout.items():
             for v in value:
                 my_list.append(v)
-        fig = generate_figure(df_without, df_with, traffic_3, traffic, timeframe_from, timeframe_to, my_list, title_size)
+        fig = generate_figure(df_without, df_with, traffic_3, traffic, timeframe_from, timeframe_to, my_list)
         return fig
     else:
         # Otherwise, generate a figure for all streets/vehicles
-        fig = generate_figure_all(df_without, df_with, traffic_3, traffic, timeframe_from, timeframe_to, title_size)
+        fig = generate_figure_all(df_without, df_with, traffic_3, traffic, timeframe_from, timeframe_to)
         return fig
 
 
-def generate_figure_all(df_without, df_with, traffic_3, traffic, timeframe_from, timeframe_to, title_size):
+def generate_figure_all(df_without, df_with, traffic_3, traffic, timeframe_from, timeframe_to):
     """Generate a histogram for all streets/vehicles comparing results with and without deviations."""
 
     # Create a figure with histograms comparing means
@@ -38,31 +37,24 @@ def generate_figure_all(df_without, df_with, traffic_3, traffic, timeframe_from,
     figures.add_trace(go.Histogram(x=df_without['mean'], name="Without deviations"))
     figures.add_trace(go.Histogram(x=df_with['mean'], name="With deviations"))
 
-    # Create the plot title and adjust its formatting
+    # Create the plot title
     title = 'Frequency distribution of the results obtained by the vehicles in terms of ' + traffic_3 + ' for the time interval ' + timeframe_from + ' to ' + timeframe_to
 
-    # Wrap the title text for better readability
-    wrapped_title = '<br>'.join(textwrap.wrap(title, width=title_size))
-
-    # Adjust title font size based on title size
-    title_font_size = 16 if title_size != 30 else 12
-
     # Update the layout and title
     figures.update_layout(
-        title_text=wrapped_title,
+        title_text=title,
         xaxis_title_text=traffic,  # xaxis label
         yaxis_title_text='Number of vehicles',  # yaxis label
         bargap=0.2,  # gap between bars of adjacent location coordinates
         bargroupgap=0.1,  # gap between bars of the same location coordinates
         template = 'plotly_dark',
         font = dict(color='#deb522'),
-        title={'y': 0.95, 'pad': {'b': 50}},
-        title_font_size=title_font_size
+        title={'y': 0.95, 'pad': {'b': 50}}
     )
     return figures
 
 
-def generate_figure(df_without, df_with, traffic_3, traffic, timeframe_from, timeframe_to, my_list, title_size):
+def generate_figure(df_without, df_with, traffic_3, traffic, timeframe_from, timeframe_to, my_list):
     """Generate a histogram for selected streets/vehicles comparing results with and without deviations."""
 
     # Filter data based on the selected streets/vehicles
@@ -77,22 +69,15 @@ def generate_figure(df_without, df_with, traffic_3, traffic, timeframe_from, tim
 
     title = 'Frequency distribution of the results obtained by the vehicles in terms of ' + traffic_3 + ' for the time interval ' + timeframe_from + ' to ' + timeframe_to
 
-    # Wrap the title text for better readability
-    wrapped_title = '<br>'.join(textwrap.wrap(title, width=title_size))
-
-    # Adjust title font size based on title size
-    title_font_size = 16 if title_size != 30 else 12
-
     # Update the layout and title
     figures.update_layout(
-        title_text=wrapped_title,
+        title_text=title,
         xaxis_title_text=traffic,  # xaxis label
         yaxis_title_text='Number of vehicles',  # yaxis label
         bargap=0.2,  # gap between bars of adjacent location coordinates
         bargroupgap=0.1,  # gap between bars of the same location coordinates
         template='plotly_dark',
         font=dict(color='#deb522'),
-        title={'y': 0.95, 'pad': {'b': 50}},
-        title_font_size=title_font_size
+        title={'y': 0.95, 'pad': {'b': 50}}
     )
     return figures
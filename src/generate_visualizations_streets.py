@@ -1,10 +1,67 @@
+import numpy as np
 import plotly.graph_objects as go
-import textwrap
+
+
+# --- Dense time series ---
+# On fine-grained simulations a street has hundreds of intervals, and several selected streets make thousands of SVG
+# points. From WEBGL_POINTS points in a figure its lines are drawn with WebGL (Scattergl), and a line longer than
+# MAX_LINE_POINTS is downsampled with Largest-Triangle-Three-Buckets, which keeps its peaks and overall shape.
+
+WEBGL_POINTS = 1000
+MAX_LINE_POINTS = 500
+
+
+def lttb(y, threshold):
+    """Positions of the threshold points of y (at regular x) that best keep its shape (Largest-Triangle-Three-Buckets)."""
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    y = np.asarray(y, dtype=np.float64)
+    # The first and last points are kept, the others are split into threshold - 2 buckets of one point each
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket == threshold - 3:
+            next_x, next_y = n - 1, y[-1]
+        else:
+            next_x = (edges[bucket + 1] + edges[bucket + 2] - 1) / 2
+            next_y = y[edges[bucket + 1]:edges[bucket + 2]].mean()
+        # Point of the bucket making the largest triangle with the previous selected point and the next bucket mean
+        x = np.arange(start, end)
+        areas = np.abs((previous - next_x) * (y[start:end] - y[previous]) - (previous - x) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def time_series_traces(lines):
+    """Traces of the (series, name) lines, with WebGL and downsampling when the figure is dense.
+
+    Returns the traces and whether a line was downsampled (its intervals then have to be listed on the x axis)."""
+    trace = go.Scattergl if sum(len(data) for data, _ in lines) >= WEBGL_POINTS else go.Scatter
+    traces, downsampled = [], False
+    for data, name in lines:
+        if len(data) > MAX_LINE_POINTS:
+            data = data.iloc[lttb(data.values, MAX_LINE_POINTS)]
+            downsampled = True
+        traces.append(trace(x=data.index, y=data.values, mode='lines+markers', name=name))
+    return traces, downsampled
+
+
+def interval_axis(intervals, list_timeframe_string, downsampled):
+    """Time interval x axis; the intervals are listed in order when some lines were downsampled."""
+    xaxis = dict(tickmode='array', tickvals=intervals, ticktext=list_timeframe_string)
+    if downsampled:
+        xaxis.update(type='category', categoryorder='array', categoryarray=list(intervals))
+    return xaxis
 
 
 def generate_visualizations(street_data_without, street_data_with, traffic_name, traffic, dict_names,
                             list_timeframe_in_seconds, list_timeframe_string, len_time_intervals_string, timeframe_from,
-                            timeframe_to, title_size):
+                            timeframe_to):
     """Generate visualizations comparing street data with and without deviations over a specified timeframe."""
 
     if bool(dict_names):  # Check if any specific streets are selected
@@ -12,13 +69,13 @@ def generate_visualizations(street_data_without, street_data_with, traffic_name,
             # If a single street is selected, generate a specific figure for it
             fig = generate_figure1(street_data_without, street_data_with, traffic_name, traffic, dict_names,
                                    list_timeframe_in_seconds, list_timeframe_string, len_time_intervals_string,
-                                   timeframe_from, timeframe_to, title_size)
+                                   timeframe_from, timeframe_to)
             return fig
         else:
             # If multiple streets are selected, generate a comparative figure for them
             fig = generate_figure_some(street_data_without, street_data_with, traffic_name, traffic, dict_names,
                                        list_timeframe_in_seconds, list_timeframe_string, len_time_intervals_string,
-                                       timeframe_from, timeframe_to, title_size)
+                                       timeframe_from, timeframe_to)
             return fig
     else:
         # If no specific streets are selected, generate a figure for all streets
@@ -26,13 +83,13 @@ def generate_visualizations(street_data_without, street_data_with, traffic_name,
         mean_street_data_with = street_data_with.mean()
         fig = generate_figure_all(mean_street_data_without, mean_street_data_with, traffic_name, traffic,
                                   list_timeframe_in_seconds, list_timeframe_string, len_time_intervals_string,
-                                  timeframe_from, timeframe_to, title_size)
+                                  timeframe_from, timeframe_to)
         return fig
 
 
 def generate_figure1(street_data_without, street_data_with, traffic_name, traffic, dict_names,
                      list_timeframe_in_seconds, list_timeframe_string, len_time_intervals_string, timeframe_from,
-                     timeframe_to, title_size):
+                     timeframe_to):
     """Generate a figure comparing data for a single selected street over time."""
 
     name = ''
@@ -51,32 +108,19 @@ def generate_figure1(street_data_without, street_data_with, traffic_name, traffi
     else:
         title = 'Comparing the ' + traffic_name + ' for the vehicles that originally passed through ' + name + ' for all the time intervals'
 
-    # Wrap the title text for better readability
-    wrapped_title = '<br>'.join(textwrap.wrap(title, width=title_size))
-
-    # Adjust title font size and margin based on title size
-    title_font_size = 12 if title_size <= 40 else 16
-    margin = 160 if title_size <= 40 else 100
-
     # Plot the data
-    fig1.add_trace(go.Scatter(x=street_data_without.index, y=street_data_without.values,
-                              mode='lines+markers',
-                              name='without deviations'))
-    fig1.add_trace(go.Scatter(x=street_data_with.index, y=street_data_with.values,
-                              mode='lines+markers',
-                              name='with deviations'))
+    traces, downsampled = time_series_traces([(street_data_without, 'without deviations'),
+                                              (street_data_with, 'with deviations')])
+    fig1.add_traces(traces)
 
     # Update the layout and title
     fig1.update_layout(
         yaxis_title=traffic,
-        title_text=wrapped_title,
+        title_text=title,
         xaxis_title_text='Time interval',
-        xaxis=dict(
-            tickmode='array',
-            tickvals=street_data_without.index,
-            ticktext=list_timeframe_string),
-        title={'y': 0.95, 'pad': {'b': 50}}, title_font_size=title_font_size,
-        autosize=True, margin=dict(t=margin),
+        xaxis=interval_axis(street_data_without.index, list_timeframe_string, downsampled),
+        title={'y': 0.95, 'pad': {'b': 50}},
+        autosize=True,
         template='plotly_dark',
         font=dict(color='#deb522'))
     return fig1
@@ -84,11 +128,12 @@ def generate_figure1(street_data_without, street_data_with, traffic_name, traffi
 
 def generate_figure_some(street_data_without, street_data_with, traffic_name, traffic, dict_names,
                          list_timeframe_in_seconds, list_timeframe_string, len_time_intervals_string, timeframe_from,
-                         timeframe_to, title_size):
+                         timeframe_to):
     """Generate a figure comparing data for multiple selected streets over time."""
 
     title = ''
     fig1 = go.Figure()
+    lines = []
     # Iterate through the selected streets
     for key, value in dict_names.items():
         df_without = street_data_without.loc[key]
@@ -107,32 +152,18 @@ def generate_figure_some(street_data_without, street_data_with, traffic_name, tr
                                                        'streets for all the time intervals')
 
         # Plot the data for each street
-        fig1.add_trace(go.Scatter(x=df_without.index, y=df_without.values,
-                                  mode='lines+markers',
-                                  name=name + '<br>without deviations'))
-        fig1.add_trace(go.Scatter(x=df_with.index, y=df_with.values,
-                                  mode='lines+markers',
-                                  name=name + '<br>with deviations'))
+        lines += [(df_without, name + '<br>without deviations'), (df_with, name + '<br>with deviations')]
         fig1.update_layout(yaxis_title=traffic)
-
-    # Wrap the title text for better readability
-    wrapped_title = '<br>'.join(textwrap.wrap(title, width=title_size))
-
-    # Adjust title font size based on title size
-    title_font_size = 16 if title_size <= 40 else 12
+    traces, downsampled = time_series_traces(lines)
+    fig1.add_traces(traces)
 
     # Update the layout and title
     fig1.update_layout(
-        title_text=wrapped_title,
+        title_text=title,
         xaxis_title_text='Time interval',
-        xaxis=dict(
-            tickmode='array',
-            tickvals=df_without.index,
-            ticktext=list_timeframe_string),
+        xaxis=interval_axis(df_without.index, list_timeframe_string, downsampled),
         title={'y': 0.95, 'pad': {'b': 50}},
-        title_font_size=title_font_size,
         autosize=True,
-        margin=dict(t=100),
         template='plotly_dark',
         font=dict(color='#deb522')
     )
@@ -141,7 +172,7 @@ def generate_figure_some(street_data_without, street_data_with, traffic_name, tr
 
 def generate_figure_all(mean_street_data_without, mean_street_data_with, traffic_name, traffic,
                         list_timeframe_in_seconds, list_timeframe_string, len_time_intervals_string, timeframe_from,
-                        timeframe_to, title_size):
+                        timeframe_to):
     """Generate a figure comparing the average data of all streets over time."""
 
     # Filter data for selected timeframes
@@ -156,31 +187,17 @@ def generate_figure_all(mean_street_data_without, mean_street_data_with, traffic
 
     fig1 = go.Figure()
     # Plot the data for each street
-    fig1.add_trace(go.Scatter(x=mean_street_data_without.index, y=mean_street_data_without.values,
-                              mode='lines+markers',
-                              name='without deviations'))
-    fig1.add_trace(go.Scatter(x=mean_street_data_with.index, y=mean_street_data_with.values,
-                              mode='lines+markers',
-                              name='with deviations'))
-
-    # Wrap the title text for better readability
-    wrapped_title = '<br>'.join(textwrap.wrap(title, width=title_size))
-
-    # Adjust title font size based on title size
-    title_font_size = 16 if title_size <= 40 else 12
+    traces, downsampled = time_series_traces([(mean_street_data_without, 'without deviations'),
+                                              (mean_street_data_with, 'with deviations')])
+    fig1.add_traces(traces)
 
     # Update the layout and title
     fig1.update_layout(
         yaxis_title=traffic,
-        title_text=wrapped_title,
+        title_text=title,
         xaxis_title_text='Time interval',
-        xaxis=dict(
-            tickmode='array',
-            tickvals=mean_street_data_without.index,
-            ticktext=list_timeframe_string
-        ),
+        xaxis=interval_axis(mean_street_data_without.index, list_timeframe_string, downsampled),
         title={'y': 0.95, 'pad': {'b': 50}},
-        title_font_size=title_font_size,
         template='plotly_dark',
         font=dict(color='#deb522')
     )
@@ -1,9 +1,8 @@
-import plotly.express as px
 import plotly.graph_objects as go
-import textwrap
+from src.trip_sketches import histogram_bars
 
 
-def generate_visualizations(vehicle_data_without, vehicle_data_with, vehicle, veh_traffic, title_size):
+def generate_visualizations(vehicle_data_without, vehicle_data_with, vehicle, veh_traffic):
     traffic_indicator = "tripinfo_" + vehicle
     vehicle_data_without = vehicle_data_without.loc[:,
                            ['tripinfo_id',
@@ -13,11 +12,11 @@ def generate_visualizations(vehicle_data_without, vehicle_data_with, vehicle, ve
                          traffic_indicator]]
 
     # Generate the histogram figure comparing both datasets
-    fig1 = generate_figure1(vehicle_data_without, vehicle_data_with, veh_traffic, traffic_indicator, title_size)
+    fig1 = generate_figure1(vehicle_data_without, vehicle_data_with, veh_traffic, traffic_indicator)
     return fig1
 
 
-def generate_figure1(vehicle_data_without, vehicle_data_with, veh_traffic, traffic_indicator, title_size):
+def generate_figure1(vehicle_data_without, vehicle_data_with, veh_traffic, traffic_indicator):
     """Generate a histogram comparing vehicle data for selected traffic indicators."""
     fig1 = go.Figure()
 
@@ -25,79 +24,109 @@ def generate_figure1(vehicle_data_without, vehicle_data_with, veh_traffic, traff
     fig1.add_trace(go.Histogram(x=vehicle_data_without[traffic_indicator], name="Without deviations"))
     fig1.add_trace(go.Histogram(x=vehicle_data_with[traffic_indicator], name="With deviations"))
 
-    # Wrap the title text for better readability
     title = 'Frequency distribution of the results obtained by the vehicles in terms of ' + veh_traffic + ' for the whole simulation'
-    wrapped_title = '<br>'.join(textwrap.wrap(title, width=title_size))
-
-    # Adjust title font size based on title size
-    title_font_size = 16 if title_size != 30 else 12
 
     # Update figure layout
     fig1.update_layout(
-        title_text=wrapped_title,
+        title_text=title,
         # title of plot
         xaxis_title_text=veh_traffic,  # xaxis label
         yaxis_title_text='Number of vehicles',  # yaxis label
         bargap=0.2,  # gap between bars of adjacent location coordinates
         bargroupgap=0.1,  # gap between bars of the same location coordinates
         title={'y': 0.95, 'pad': {'b': 50}},
-        title_font_size=title_font_size,
         template='plotly_dark',
         font=dict(color='#deb522')
     )
     return fig1
 
 
-def generate_figure2(vehicle_data_without, vehicle_data_with, traffic, traffic_indicator, title_size):
-    """Generate a bar chart comparing the top 15 most impacted vehicles in terms of traffic metrics."""
+def generate_figure4(statistics_without, statistics_with, veh_traffic, traffic_indicator):
+    """Same histogram as generate_figure1(), from the binned counts of the trip statistics (--trip_sketches)."""
+    fig4 = go.Figure()
 
-    # Set up vehicle IDs as string index
-    vehicle_data_without['id'] = vehicle_data_without['tripinfo_id'].astype(str)
-    vehicle_data_without = vehicle_data_without.set_index('tripinfo_id')
-    vehicle_data_with = vehicle_data_with.set_index('tripinfo_id')
+    # Add a bar trace of the counts of each scenario
+    for statistics, name in ((statistics_without, "Without deviations"), (statistics_with, "With deviations")):
+        left_edges, width, counts = histogram_bars(statistics['indicators'][traffic_indicator]['histogram'])
+        fig4.add_trace(go.Bar(x=left_edges + width / 2, y=counts, width=width, name=name))
 
-    # Merge data and calculate differences
-    df = vehicle_data_without.merge(vehicle_data_with, left_index=True, right_index=True, how="left")
-    value_x = traffic_indicator + '_x'
-    value_y = traffic_indicator + '_y'
+    title = 'Frequency distribution of the results obtained by the vehicles in terms of ' + veh_traffic + ' for the whole simulation'
 
-    # Compute the difference and fill NaN values
-    df['diff'] = df[value_y].sub(df[value_x], axis=0).fillna(0)
-    df[value_x] = df[value_x].fillna(0)
-    df[value_y] = df[value_y].fillna(0)
+    # Update figure layout
+    fig4.update_layout(
+        title_text=title,
+        xaxis_title_text=veh_traffic,
+        yaxis_title_text='Number of vehicles',
+        barmode='group',
+        bargap=0.2,
+        bargroupgap=0.1,
+        title={'y': 0.95, 'pad': {'b': 50}},
+        template='plotly_dark',
+        font=dict(color='#deb522')
+    )
+    return fig4
+
+
+def generate_figure2(ranking, traffic, largest=True):
+    """Generate a bar chart of the most (or least) impacted vehicles in terms of traffic metrics.
 
-    # Sort by the difference and select the top 15 impacted vehicles
-    df = df.sort_values(by=['diff'], ascending=False).head(15)
+    ranking is the table of the vehicles to show (see vehicle_impact.vehicle_rows), already sorted."""
+    # Imported here: plotly.express is slow to import and only needed once the ranking is drawn
+    import plotly.express as px
 
     # Define the y-axis label based on traffic type
     value = ''
     if traffic == 'duration':
         value = 'duration (s)'
+    if traffic == 'routeLength':
+        value = 'route length (m)'
     if traffic == 'timeLoss':
         value = 'time loss (s)'
     if traffic == 'waitingTime':
         value = 'waiting time (s)'
 
     # Title for the chart
-    title = '15 most impacted vehicles in terms of ' + value + ' comparing with and without deviations'
-    wrapped_title = '<br>'.join(textwrap.wrap(title, width=title_size))
-
-    # Adjust title font size
-    title_font_size = 16 if title_size != 30 else 12
+    title = (f"{len(ranking)} {'most' if largest else 'least'} impacted vehicles in terms of " + value
+             + ' comparing with and without deviations')
 
     # Generate the bar chart
-    fig2 = px.bar(df, y='diff', x='id', orientation='v',
+    unit = '(s)' if traffic != 'routeLength' else '(m)'
+    fig2 = px.bar(ranking, y='diff', x='id', orientation='v',
                   color='diff', text='diff',
-                  title=wrapped_title,
-                  labels={'id': 'Id of the vehicles', 'diff': 'Difference in seconds'}
+                  title=title, hover_data=['vType', 'without', 'with'],
+                  labels={'id': 'Id of the vehicles',
+                          'diff': 'Difference in ' + ('meters' if traffic == 'routeLength' else 'seconds')}
                   )
     # Update trace labels based on the traffic type
-    unit = '(s)' if traffic != 'routeLength' else '(m)'
     fig2.update_traces(texttemplate=f'%{{text}}{unit}', textposition='outside')
 
-    # Update figure layout
-    fig2.update_layout(yaxis=dict(categoryorder='total ascending'))
-    fig2.update_layout(title={'y': 0.95, 'pad': {'b': 50}}, title_font_size=title_font_size)
+    # Update figure layout (trip ids are often numbers, they are kept as categories in the order of the ranking)
+    fig2.update_layout(xaxis=dict(type='category'))
+    fig2.update_layout(title={'y': 0.95, 'pad': {'b': 50}})
     fig2.update_layout(template='plotly_dark', font=dict(color='#deb522'))
 
     return fig2
+
+
+def generate_figure3(values_without, values_with, veh_traffic, names):
+    """Generate a histogram comparing the vehicles that originally passed through the selected streets."""
+    fig3 = go.Figure()
+
+    fig3.add_trace(go.Histogram(x=values_without, name="Without deviations"))
+    fig3.add_trace(go.Histogram(x=values_with, name="With deviations"))
+
+    streets = ', '.join(names.values()) if names else 'the selected streets'
+    title = ('Frequency distribution of the ' + veh_traffic + ' of the ' + str(len(values_without))
+             + ' vehicles that originally passed through ' + streets)
+
+    fig3.update_layout(
+        title_text=title,
+        xaxis_title_text=veh_traffic,
+        yaxis_title_text='Number of vehicles',
+        bargap=0.2,
+        bargroupgap=0.1,
+        title={'y': 0.95, 'pad': {'b': 50}},
+        template='plotly_dark',
+        font=dict(color='#deb522')
+    )
+    return fig3
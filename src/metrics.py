@@ -0,0 +1,120 @@
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import Response, request
+
+
+# --- Callback latency metrics ---
+# Cumulative histograms kept in memory and exposed in the Prometheus text format on /metrics.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 3e5, 1e6, 3e6, 1e7, 3e7, 1e8)
+
+METRICS = {
+    'tulipe_callback_duration_seconds': ('Duration of the Dash callbacks.', LATENCY_BUCKETS),
+    'tulipe_callback_stage_duration_seconds': ('Duration of the stages of the Dash callbacks.', LATENCY_BUCKETS),
+    'tulipe_callback_response_bytes': ('Size of the serialized Dash callback responses.', SIZE_BUCKETS),
+}
+
+_lock = threading.Lock()
+_histograms = {}
+_errors = {}
+_current = threading.local()
+_callback_outputs = {}
+
+
+def observe(metric, value, **labels):
+    """Add one observation to the histogram of the given metric and labels."""
+    buckets = METRICS[metric][1]
+    key = (metric, tuple(sorted(labels.items())))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                histogram['buckets'][i] += 1
+        histogram['sum'] += value
+        histogram['count'] += 1
+
+
+def instrument(callback_name):
+    """Decorator recording the duration (and failures) of a callback under the given name."""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            _current.callback = callback_name
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            except Exception as e:
+                # PreventUpdate and friends are part of the normal flow of Dash
+                if not type(e).__module__.startswith('dash'):
+                    with _lock:
+                        _errors[callback_name] = _errors.get(callback_name, 0) + 1
+                raise
+            finally:
+                observe('tulipe_callback_duration_seconds', time.perf_counter() - start, callback=callback_name)
+                _current.callback = None
+        wrapper.metrics_name = callback_name
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def timed(stage):
+    """Record the duration of a stage (data slicing, aggregation, figure build...) of the running callback."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe('tulipe_callback_stage_duration_seconds', time.perf_counter() - start,
+                callback=getattr(_current, 'callback', None) or 'unknown', stage=stage)
+
+
+def _record_response_size(response):
+    """Flask after_request hook measuring the serialized size of the callback responses."""
+    if request.path.endswith('/_dash-update-component') and response.status_code == 200:
+        payload = request.get_json(silent=True) or {}
+        callback_name = _callback_outputs.get(payload.get('output'))
+        if callback_name is not None:
+            observe('tulipe_callback_response_bytes', response.calculate_content_length() or 0,
+                    callback=callback_name)
+    return response
+
+
+def render_prometheus():
+    """Return every metric in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        for metric, (description, buckets) in METRICS.items():
+            lines.append(f"# HELP {metric} {description}")
+            lines.append(f"# TYPE {metric} histogram")
+            for (name, labels), histogram in sorted(_histograms.items()):
+                if name != metric:
+                    continue
+                label_text = ','.join(f'{key}="{value}"' for key, value in labels)
+                for bound, count in zip(buckets, histogram['buckets']):
+                    lines.append(f'{metric}_bucket{{{label_text},le="{bound:g}"}} {count}')
+                lines.append(f'{metric}_bucket{{{label_text},le="+Inf"}} {histogram["count"]}')
+                lines.append(f'{metric}_sum{{{label_text}}} {histogram["sum"]}')
+                lines.append(f'{metric}_count{{{label_text}}} {histogram["count"]}')
+        lines.append("# HELP tulipe_callback_errors_total Dash callbacks that raised an exception.")
+        lines.append("# TYPE tulipe_callback_errors_total counter")
+        for callback_name, count in sorted(_errors.items()):
+            lines.append(f'tulipe_callback_errors_total{{callback="{callback_name}"}} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def register_metrics(app):
+    """Expose /metrics on the Flask server of the Dash app and track the size of the instrumented callbacks."""
+    for output, spec in app.callback_map.items():
+        callback_name = getattr(spec.get('callback'), 'metrics_name', None)
+        if callback_name is not None:
+            _callback_outputs[output] = callback_name
+    app.server.after_request(_record_response_size)
+
+    @app.server.route('/metrics')
+    def metrics():
+        return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
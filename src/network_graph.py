@@ -0,0 +1,119 @@
+import json
+import numpy as np
+import pandas as pd
+
+
+# --- Network graph ---
+# The street network GeoJSON has no junction ids, and the street geometries are lane shapes that stop a few metres
+# from each other, so the junctions are the clusters of street end points closer than JUNCTION_TOLERANCE: every street
+# links the junction where its line starts to the one where it ends. The junction -> streets adjacency is kept in CSR
+# form, and the impact region of the closures is found by a breadth-first search over it, one vectorized step per hop.
+
+JUNCTION_TOLERANCE = 10.0  # metres
+EARTH_RADIUS = 6371008.8  # metres
+
+
+def line_ends(geometry):
+    """First and last point of a LineString or MultiLineString."""
+    coordinates = geometry['coordinates']
+    if geometry['type'] == 'MultiLineString':
+        return coordinates[0][0][:2], coordinates[-1][-1][:2]
+    return coordinates[0][:2], coordinates[-1][:2]
+
+
+def project(points, latitude):
+    """Local equirectangular projection (in metres) of (longitude, latitude) points, around the given latitude."""
+    return np.radians(points) * EARTH_RADIUS * np.array([np.cos(np.radians(latitude)), 1])
+
+
+def unproject(xy, latitude):
+    """(longitude, latitude) of points given in the projection of project()."""
+    return np.degrees(xy / (EARTH_RADIUS * np.array([np.cos(np.radians(latitude)), 1])))
+
+
+def cluster_points(points, tolerance):
+    """Cluster label of every (longitude, latitude) point, the points closer than tolerance metres sharing one."""
+    xy = project(points, points[:, 1].mean() if len(points) else 0)
+    cells = pd.DataFrame(np.floor(xy / tolerance).astype(np.int64), columns=['x', 'y'])
+    cells['point'] = np.arange(len(points))
+    # Candidate pairs: the points of neighbouring grid cells
+    pairs = []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            neighbours = cells.assign(x=cells['x'] + dx, y=cells['y'] + dy)
+            merged = cells.merge(neighbours, on=['x', 'y'], suffixes=('', '_other'))
+            pairs.append(merged.loc[merged['point'] < merged['point_other'], ['point', 'point_other']].to_numpy())
+    pairs = np.concatenate(pairs)
+    pairs = pairs[np.hypot(*(xy[pairs[:, 0]] - xy[pairs[:, 1]]).T) <= tolerance]
+    # Connected components of the close pairs, by propagating the smallest label until nothing changes
+    labels = np.arange(len(points))
+    while len(pairs):
+        smallest = np.minimum(labels[pairs[:, 0]], labels[pairs[:, 1]])
+        updated = labels.copy()
+        np.minimum.at(updated, pairs[:, 0], smallest)
+        np.minimum.at(updated, pairs[:, 1], smallest)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            break
+        labels = updated
+    return pd.factorize(labels)[0]
+
+
+def build_network_graph(geojson_file, tolerance=JUNCTION_TOLERANCE):
+    """Junction graph of the street network of a GeoJSON file."""
+    with open(geojson_file, encoding='utf-8') as f:
+        features = [feature for feature in json.load(f)['features'] if feature['geometry'] is not None]
+    points = np.array([point for feature in features for point in line_ends(feature['geometry'])],
+                      dtype=float).reshape(-1, 2)
+    junctions = cluster_points(points, tolerance)
+    from_junction, to_junction = junctions[0::2], junctions[1::2]
+    # Junction -> streets starting or ending there
+    incident = np.concatenate([from_junction, to_junction])
+    order = np.argsort(incident, kind='stable')
+    counts = np.bincount(incident, minlength=junctions.max() + 1 if len(junctions) else 0)
+    return {'edges': pd.Index([str(feature['properties']['id']) for feature in features], dtype=object),
+            'from': from_junction, 'to': to_junction,
+            'indptr': np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+            'incident': order % max(len(features), 1)}
+
+
+def impact_region(graph, closed_roads, hops):
+    """Ids of the streets at most `hops` junctions away from the closed roads (the closed roads included)."""
+    reached = np.zeros(len(graph['edges']), dtype=bool)
+    codes = graph['edges'].get_indexer(pd.Index(closed_roads, dtype=object))
+    codes = codes[codes >= 0]
+    reached[codes] = True
+    visited = np.zeros(len(graph['indptr']) - 1, dtype=bool)
+    frontier = np.unique(np.concatenate([graph['from'][codes], graph['to'][codes]]))
+    for _ in range(hops):
+        visited[frontier] = True
+        streets = graph['incident'][csr_positions(graph['indptr'], frontier)]
+        reached[streets] = True
+        frontier = np.unique(np.concatenate([graph['from'][streets], graph['to'][streets]]))
+        frontier = frontier[~visited[frontier]]
+    return graph['edges'][reached]
+
+
+def csr_positions(indptr, rows):
+    """Positions of the values of the given rows of a CSR array, without a Python loop over the rows."""
+    starts, lengths = indptr[rows], indptr[rows + 1] - indptr[rows]
+    offsets = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+    return offsets + np.arange(lengths.sum())
+
+
+# --- Network extent ---
+
+def line_points(geometry):
+    """(longitude, latitude) points of a LineString or MultiLineString."""
+    lines = geometry['coordinates'] if geometry['type'] == 'MultiLineString' else [geometry['coordinates']]
+    return [point[:2] for line in lines for point in line]
+
+
+def network_bounds(geojson_file):
+    """South-west and north-east corners, [[latitude, longitude], [latitude, longitude]], of the streets of a GeoJSON
+    file."""
+    with open(geojson_file, encoding='utf-8') as f:
+        points = np.array([point for feature in json.load(f)['features'] if feature['geometry'] is not None
+                           for point in line_points(feature['geometry'])], dtype=float).reshape(-1, 2)
+    (west, south), (east, north) = points.min(axis=0), points.max(axis=0)
+    return [[float(south), float(west)], [float(north), float(east)]]
@@ -0,0 +1,141 @@
+import cProfile
+import hashlib
+import json
+import optparse
+import os
+import threading
+import time
+from functools import wraps
+from urllib.parse import urlparse, parse_qs
+from flask import has_request_context, request, jsonify
+
+
+# --- On-demand profiling of the Dash callbacks ---
+# Profiling is off by default. It is turned on for every callback with TULIPE_PROFILE=1, or, with
+# TULIPE_PROFILE_ALLOW_QUERY=1, only for the callbacks fired from a page opened with ?profile=1 in its URL (any visitor
+# can then profile, so the query is ignored otherwise). Each profiled invocation is written as a pstats file named
+# after the callback and a hash of its inputs, and listed in index.jsonl so the slowest ones can be found later with
+# /profiles (only served when profiling is on) or `python -m src.profiling`. Only the TULIPE_PROFILE_MAX slowest
+# invocations are kept.
+
+PROFILE_DIR = os.environ.get('TULIPE_PROFILE_DIR', 'profiles')
+PROFILE_ALL = os.environ.get('TULIPE_PROFILE', '') not in ('', '0')
+PROFILE_QUERY = os.environ.get('TULIPE_PROFILE_ALLOW_QUERY', '') not in ('', '0')
+MAX_PROFILES = int(os.environ.get('TULIPE_PROFILE_MAX', '200'))
+MIN_SECONDS = float(os.environ.get('TULIPE_PROFILE_MIN_SECONDS', '0'))
+INDEX_FILE = 'index.jsonl'
+
+_index_lock = threading.Lock()
+
+
+def profiling_requested():
+    """True if profiling is on for every callback or for the page the current callback was fired from."""
+    if PROFILE_ALL:
+        return True
+    if not PROFILE_QUERY or not has_request_context():
+        return False
+    if request.args.get('profile'):
+        return True
+    page_query = parse_qs(urlparse(request.referrer or '').query)
+    return page_query.get('profile', ['0'])[0] not in ('', '0')
+
+
+def inputs_key(args, kwargs):
+    """Short stable hash of the callback inputs, used in the name of the pstats files."""
+    text = json.dumps([args, kwargs], sort_keys=True, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+
+
+def profiled(callback_name):
+    """Decorator profiling the callback with cProfile when profiling_requested()."""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not profiling_requested():
+                return function(*args, **kwargs)
+            profile = cProfile.Profile()
+            start = time.perf_counter()
+            try:
+                return profile.runcall(function, *args, **kwargs)
+            finally:
+                duration = time.perf_counter() - start
+                if duration >= MIN_SECONDS:
+                    save_profile(profile, callback_name, args, kwargs, duration)
+        return wrapper
+    return decorator
+
+
+def save_profile(profile, callback_name, args, kwargs, duration):
+    """Write the pstats file of one invocation and add it to the index, then drop the fastest ones beyond
+    MAX_PROFILES."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    key = inputs_key(args, kwargs)
+    file_name = f"{callback_name}-{key}-{int(time.time() * 1000)}.pstats"
+    profile.dump_stats(os.path.join(PROFILE_DIR, file_name))
+    entry = {'callback': callback_name, 'inputs_key': key, 'duration': duration, 'timestamp': time.time(),
+             'file': file_name, 'inputs': json.dumps([args, kwargs], default=str)[:1000]}
+    with _index_lock:
+        with open(os.path.join(PROFILE_DIR, INDEX_FILE), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+        prune_profiles()
+
+
+def read_index():
+    """Every entry of the index, [] when nothing was recorded yet."""
+    index_path = os.path.join(PROFILE_DIR, INDEX_FILE)
+    if not os.path.exists(index_path):
+        return []
+    with open(index_path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def prune_profiles():
+    """Keep the MAX_PROFILES slowest invocations: delete the pstats files of the others and rewrite the index."""
+    entries = read_index()
+    if len(entries) <= MAX_PROFILES:
+        return
+    entries.sort(key=lambda entry: entry['duration'], reverse=True)
+    for entry in entries[MAX_PROFILES:]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, entry['file']))
+        except OSError:
+            pass
+    index_path = os.path.join(PROFILE_DIR, INDEX_FILE)
+    with open(index_path + '.tmp', 'w', encoding='utf-8') as f:
+        f.writelines(json.dumps(entry) + '\n' for entry in sorted(entries[:MAX_PROFILES],
+                                                                  key=lambda entry: entry['timestamp']))
+    os.replace(index_path + '.tmp', index_path)
+
+
+def list_slowest(top=10, callback_name=None):
+    """Return the index entries of the slowest recorded invocations, optionally for a single callback."""
+    entries = read_index()
+    if callback_name:
+        entries = [entry for entry in entries if entry['callback'] == callback_name]
+    return sorted(entries, key=lambda entry: entry['duration'], reverse=True)[:top]
+
+
+def register_profiling(server):
+    """Expose the slowest recorded invocations on /profiles (?top=N&callback=name), when profiling is on."""
+    if not (PROFILE_ALL or PROFILE_QUERY):
+        return
+
+    @server.route('/profiles')
+    def profiles():
+        return jsonify(list_slowest(request.args.get('top', 10, type=int), request.args.get('callback')))
+
+
+if __name__ == '__main__':
+    import pstats
+
+    parser = optparse.OptionParser(usage="python -m src.profiling [options]")
+    parser.add_option("--top", dest="top", type="int", default=10, help="Number of invocations to list")
+    parser.add_option("--callback", dest="callback", help="Only list the invocations of this callback")
+    parser.add_option("--stats", dest="stats", type="int", default=0,
+                      help="Also print the N most expensive functions (cumulative time) of each invocation")
+    (options, args) = parser.parse_args()
+
+    for entry in list_slowest(options.top, options.callback):
+        print(f"{entry['duration']:9.3f} s  {entry['callback']:<22} {entry['file']}  {entry['inputs'][:120]}")
+        if options.stats:
+            pstats.Stats(os.path.join(PROFILE_DIR, entry['file'])).sort_stats('cumulative').print_stats(options.stats)
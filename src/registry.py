@@ -0,0 +1,163 @@
+import json
+import shlex
+import sys
+import threading
+import time
+import numpy as np
+import pandas as pd
+from src.data_loader import frame_memory, loading_steps
+
+
+# --- Dataset registry ---
+# One server can serve several datasets, each a street network and the outputs of its scenarios. --datasets names them
+# in a JSON file, each with the command-line arguments describing it, added to the ones of the command line (which thus
+# apply to every dataset):
+#   {"brussels": "--road_network_json=brussels.geojson --edgedata_without=... --tripinfo_with=...",
+#    "liege": ["--road_network_json=liege.geojson", ...]}
+# Without --datasets, the command line describes the only dataset, DEFAULT_DATASET.
+#
+# A dataset is loaded on its first use, in a background thread, by the load function of the registry. With a memory
+# budget, once a dataset is loaded, the least recently used ones are evicted while the loaded datasets take more than
+# the budget; an evicted dataset is loaded again (from the columnar and disk caches) on its next use. As the indicators
+# of a dataset are only decoded on their first use, its footprint grows after it is loaded: the budget is also checked
+# every MEMORY_CHECK_INTERVAL seconds, the footprint of the datasets being measured again at each check. A followed
+# dataset (--follow) is updated by its own thread for as long as the server runs, so it is never evicted.
+#
+# A failed load is reported until its next use LOAD_RETRY_DELAY seconds later at least, which loads the dataset again:
+# the failure may only be transient (an output still being written, an I/O error).
+
+DEFAULT_DATASET = 'default'
+MEMORY_CHECK_INTERVAL = 30
+LOAD_RETRY_DELAY = 10
+
+
+def read_dataset_arguments(registry_file):
+    """Arguments of every dataset of a registry file, {name: [arguments]} in the order of the file."""
+    with open(registry_file, encoding='utf-8') as f:
+        definitions = json.load(f)
+    if not isinstance(definitions, dict) or not definitions:
+        raise ValueError(f"{registry_file} should map the name of every dataset to its arguments")
+    return {str(name): shlex.split(arguments) if isinstance(arguments, str) else [str(argument) for argument in arguments]
+            for name, arguments in definitions.items()}
+
+
+def object_memory(value):
+    """Approximate memory (bytes) of the tables, arrays and containers of a loaded dataset."""
+    if isinstance(value, pd.DataFrame):
+        return frame_memory(value)
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(object_memory(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(object_memory(item) for item in value)
+    return sys.getsizeof(value)
+
+
+def new_registry(dataset_options, load, unload, memory_budget=None):
+    """Registry of datasets, {name: options} (the first one is the default). load(name, options, report) loads a
+    dataset (a dict), calling report(message) before each step; unload(dataset) releases an evicted one. memory_budget
+    is in bytes, None for no limit."""
+    return {'entries': {name: new_entry(options) for name, options in dataset_options.items()},
+            'default': next(iter(dataset_options)), 'load': load, 'unload': unload, 'memory_budget': memory_budget,
+            'lock': threading.Lock()}
+
+
+def new_entry(options):
+    """Entry of a dataset not loaded yet."""
+    return {'options': options, 'dataset': None, 'loading': False, 'memory': 0, 'last_used': 0.0, 'failed_at': 0.0,
+            'status': {'message': 'Not loaded', 'step': 0, 'steps': loading_steps(options), 'error': None}}
+
+
+def entry_state(entry):
+    """'unloaded', 'loading', 'ready' or 'error'."""
+    if entry['status']['error']:
+        return 'error'
+    if entry['dataset'] is not None:
+        return 'ready'
+    return 'loading' if entry['loading'] else 'unloaded'
+
+
+def dataset_entry(registry, name=None, background=True):
+    """Entry of a dataset (the default one when name is None), whose loading is started (in a background thread, or
+    right away) if it is not loaded, or if its load failed LOAD_RETRY_DELAY seconds ago at least. Raises KeyError for
+    an unknown dataset."""
+    name = name or registry['default']
+    entry = registry['entries'][name]
+    with registry['lock']:
+        entry['last_used'] = time.monotonic()
+        retry = entry['status']['error'] and entry['last_used'] - entry['failed_at'] >= LOAD_RETRY_DELAY
+        start = entry['dataset'] is None and not entry['loading'] and (not entry['status']['error'] or retry)
+        if start:
+            entry['loading'] = True
+            entry['status'].update(message='Starting', step=0, error=None)
+    if start and background:
+        threading.Thread(target=load_entry, args=(registry, name), name='load_' + name, daemon=True).start()
+    elif start:
+        load_entry(registry, name)
+    return entry
+
+
+def load_entry(registry, name):
+    """Load a dataset of the registry, then evict the others beyond the memory budget."""
+    entry = registry['entries'][name]
+
+    def report(message):
+        entry['status']['message'] = message
+        entry['status']['step'] += 1
+
+    try:
+        dataset = registry['load'](name, entry['options'], report)
+    except Exception as e:
+        entry['failed_at'] = time.monotonic()
+        entry['status']['error'] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        entry['loading'] = False
+    entry['dataset'] = dataset
+    entry['status']['message'] = 'Ready'
+    evict(registry, name)
+
+
+def evict(registry, keep=None):
+    """Unload the least recently used datasets (but keep, by default the most recently used one, and the followed
+    ones) while the loaded datasets take more than the memory budget."""
+    if registry['memory_budget'] is None:
+        return
+    evicted = []
+    with registry['lock']:
+        loaded = [(name, entry) for name, entry in registry['entries'].items() if entry['dataset'] is not None]
+        if keep is None and loaded:
+            keep = max(loaded, key=lambda item: item[1]['last_used'])[0]
+        for _, entry in loaded:
+            # A copy of the dataset dict, as a followed dataset swaps its tables while it is measured
+            entry['memory'] = object_memory(dict(entry['dataset']))
+        total = sum(entry['memory'] for _, entry in loaded)
+        for name, entry in sorted(loaded, key=lambda item: item[1]['last_used']):
+            if total <= registry['memory_budget']:
+                break
+            if name == keep or entry['options'].follow:
+                continue
+            evicted.append((name, entry['dataset'], entry['memory']))
+            total -= entry['memory']
+            entry['dataset'], entry['memory'] = None, 0
+            entry['status'].update(message='Not loaded', step=0)
+    for name, dataset, memory in evicted:
+        registry['unload'](dataset)
+        print(f"Evicted the dataset {name} ({memory / 2 ** 20:.0f} MB) to stay within the memory budget",
+              file=sys.stderr)
+
+
+def start_memory_check(registry, interval=MEMORY_CHECK_INTERVAL):
+    """Check the memory budget every interval seconds in a daemon thread, as the datasets grow once loaded."""
+    if registry['memory_budget'] is None:
+        return
+
+    def check_periodically():
+        while True:
+            time.sleep(interval)
+            evict(registry)
+
+    threading.Thread(target=check_periodically, name='memory_check', daemon=True).start()
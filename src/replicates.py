@@ -0,0 +1,115 @@
+from statistics import NormalDist
+import numpy as np
+import pandas as pd
+from src.sumo_xml import EDGE_INDICATORS
+
+
+# --- Replicated runs ---
+# SUMO draws a new random seed for every run (<random value="true"/>), so one run per scenario is a single sample.
+# The edgedata of the replicated runs are aggregated in a single pass (Welford's algorithm): runs are consumed one at a
+# time, and the accumulators (count, mean and sum of squared deviations of every indicator, per edge x interval) grow
+# with the number of distinct edge x interval pairs, not with the number of runs.
+#
+# The aggregated table has the means under the usual indicator columns, so every view shows the mean of the runs, plus
+# <indicator>_var (sample variance) and <indicator>_n (number of runs with a value) used by the significance tests.
+
+def aggregate_runs(runs):
+    """Streaming mean and variance, per edge x interval, of an iterable of edgedata tables (one per run)."""
+    accumulators = None
+    indicators = []
+    for run in runs:
+        run = run.set_index([run['interval_id'].astype(str), run['edge_id'].astype(str)])
+        run.index.names = ['interval_id', 'edge_id']
+        indicators = [column for column in EDGE_INDICATORS if column in indicators or column in run.columns]
+        if accumulators is None:
+            accumulators = pd.DataFrame({'interval_begin': run['interval_begin'].to_numpy(np.float64)},
+                                        index=run.index)
+        else:
+            accumulators = accumulators.reindex(accumulators.index.union(run.index, sort=False))
+            accumulators['interval_begin'] = accumulators['interval_begin'].fillna(
+                run['interval_begin'].astype(np.float64).reindex(accumulators.index))
+        for column in indicators:
+            count, mean, squares = (accumulators[name].fillna(0).to_numpy() if name in accumulators.columns
+                                    else np.zeros(len(accumulators))
+                                    for name in (column + '_n', column, column + '_m2'))
+            values = (run[column].reindex(accumulators.index).to_numpy(np.float64) if column in run.columns
+                      else np.full(len(accumulators), np.nan))
+            present = ~np.isnan(values)
+            count = count + present
+            delta = np.where(present, values - mean, 0.0)
+            mean = mean + np.where(present, delta / np.maximum(count, 1), 0.0)
+            squares = squares + np.where(present, delta * (values - mean), 0.0)
+            accumulators[column + '_n'] = count
+            accumulators[column] = mean
+            accumulators[column + '_m2'] = squares
+    return replicate_table(accumulators, indicators)
+
+
+def replicate_table(accumulators, indicators):
+    """Long edgedata table of the means, variances and counts of the accumulators."""
+    dataframe = accumulators.reset_index()
+    table = dataframe[['interval_begin', 'interval_id', 'edge_id']].copy()
+    for column in indicators:
+        count = dataframe[column + '_n'].to_numpy()
+        table[column] = np.where(count > 0, dataframe[column], np.nan).astype(np.float32)
+        table[column + '_var'] = np.where(count > 1, dataframe[column + '_m2'] / np.maximum(count - 1, 1),
+                                          np.nan).astype(np.float32)
+        table[column + '_n'] = count.astype(np.uint16)
+    return table
+
+
+def replicate_runs(primary_files, replicates):
+    """Runs of a scenario: the edgedata files given as usual, then one run per comma-separated --replicate_ option."""
+    return [list(primary_files)] + [[xmlfile.strip() for xmlfile in files.split(',') if xmlfile.strip()]
+                                    for files in replicates]
+
+
+# --- Significance of the differences ---
+
+def t_quantile(p, df):
+    """Quantile p of Student's t distribution with df degrees of freedom (df >= 1).
+
+    Cornish-Fisher expansion (within 1% from 2 degrees of freedom), and the quantile of df = 1 below 2, which is
+    larger than the exact one there, so the tests stay conservative."""
+    z = NormalDist().inv_cdf(p)
+    df = np.asarray(df, dtype=np.float64)
+    terms = [(z ** 3 + z) / 4,
+             (5 * z ** 5 + 16 * z ** 3 + 3 * z) / 96,
+             (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / 384,
+             (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 - 945 * z) / 92160]
+    expansion = z + sum(term / df ** (power + 1) for power, term in enumerate(terms))
+    return np.where(df < 2, np.tan(np.pi * (p - 0.5)), expansion)
+
+
+def street_statistics(edgedata, interval, traffic_indicator):
+    """Mean over the given intervals of every street, with the variance of this mean and the runs behind it."""
+    rows = edgedata.loc[edgedata['interval_id'].isin(interval)]
+    grouped = pd.DataFrame({
+        'mean': rows[traffic_indicator].astype(np.float64),
+        # Variance of the mean of the runs of an interval
+        'variance': rows[traffic_indicator + '_var'].astype(np.float64) / rows[traffic_indicator + '_n'],
+        'runs': rows[traffic_indicator + '_n'].astype(np.float64),
+    }).groupby(rows['edge_id'].astype(str))
+    intervals = grouped['mean'].count()
+    # The intervals are taken as independent samples: Var(mean of k means) = sum of their variances / k^2
+    return pd.DataFrame({'mean': grouped['mean'].mean(), 'variance': grouped['variance'].sum(min_count=1)
+                         / intervals ** 2, 'runs': grouped['runs'].mean()})
+
+
+def significant_streets(edgedata_without, edgedata_with, interval, traffic_indicator, confidence=0.95):
+    """Welch test of the difference (with - without) of every street over the given intervals.
+
+    Returns, per street, the difference, the half-width of its confidence interval and whether it is significant
+    (streets with less than two runs in a scenario are never significant)."""
+    without = street_statistics(edgedata_without, interval, traffic_indicator)
+    with_deviations = street_statistics(edgedata_with, interval, traffic_indicator)
+    without, with_deviations = without.align(with_deviations, join='inner')
+    variance = without['variance'] + with_deviations['variance']
+    # Welch-Satterthwaite degrees of freedom
+    df = variance ** 2 / (without['variance'] ** 2 / (without['runs'] - 1)
+                          + with_deviations['variance'] ** 2 / (with_deviations['runs'] - 1))
+    half_width = t_quantile(1 - (1 - confidence) / 2, df.clip(lower=1).fillna(1)) * np.sqrt(variance)
+    difference = with_deviations['mean'] - without['mean']
+    testable = (without['runs'] >= 2) & (with_deviations['runs'] >= 2) & variance.notna()
+    return pd.DataFrame({'difference': difference, 'half_width': half_width,
+                         'significant': testable & (difference.abs() > half_width)})
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+from src.sumo_xml import iter_records, vehroute_records
+
+
+# --- Edge to trip index ---
+# The routes of a vehroute output are stored as an inverted index in CSR form: the trips that drove along the edge
+# of code c are trips[indptr[c]:indptr[c + 1]], as positions in ids. Selecting streets on the map then only reads the
+# slices of the selected edges, whatever the number of trips and the length of their routes.
+
+def build_route_index(xmlfile):
+    """Read a (possibly compressed) vehroute output into an edge -> trip index."""
+    trip_ids = []
+    route_lengths = []
+    route_edges = []
+    for trip_id, edges in iter_records(xmlfile, 'vehicle', vehroute_records):
+        edges = edges.split()
+        trip_ids.append(trip_id)
+        route_lengths.append(len(edges))
+        route_edges.extend(edges)
+    edge_codes, edge_ids = pd.factorize(pd.Series(route_edges, dtype=object))
+    trips = np.repeat(np.arange(len(trip_ids), dtype=np.int64), route_lengths)
+    # One entry per (edge, trip) pair, sorted by edge then trip, even if the route loops over an edge
+    pairs = np.unique(edge_codes.astype(np.int64) * max(len(trip_ids), 1) + trips)
+    counts = np.bincount(pairs // max(len(trip_ids), 1), minlength=len(edge_ids))
+    return {'ids': pd.Index(trip_ids, dtype=object), 'edges': pd.Index(edge_ids, dtype=object),
+            'indptr': np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+            'trips': (pairs % max(len(trip_ids), 1)).astype(np.int32)}
+
+
+def load_route_index(xmlfile):
+    """Edge -> trip index of a vehroute output, None when no file is given."""
+    return build_route_index(xmlfile) if xmlfile else None
+
+
+def trips_on_edges(route_index, edge_ids):
+    """Ids of the trips that drove along at least one of the given edges."""
+    codes = route_index['edges'].get_indexer(pd.Index(edge_ids, dtype=object))
+    indptr = route_index['indptr']
+    slices = [route_index['trips'][indptr[code]:indptr[code + 1]] for code in codes[codes >= 0]]
+    if not slices:
+        return route_index['ids'][:0]
+    return route_index['ids'][np.unique(np.concatenate(slices))]
@@ -0,0 +1,88 @@
+import html
+import json
+import re
+import unicodedata
+import numpy as np
+
+
+# --- Street search ---
+# The network splits a street into many edges (with #0, #1... suffixes), so the picker searches streets, not edges:
+# the edges sharing a name are one street, and the unnamed edges are grouped by their id without the suffix. Every
+# street is indexed under the tokens of its name and of its ids; the tokens are kept sorted, so the streets having a
+# token starting with a prefix are a contiguous range found by binary search, and a query of several words is the
+# intersection of the ranges of its words.
+
+MAX_RESULTS = 20
+
+
+def normalize(text):
+    """Lower case text without accents nor XML entities (Chaussée d&apos;Ixelles -> chaussee d'ixelles)."""
+    text = unicodedata.normalize('NFKD', html.unescape(text or '')).encode('ascii', 'ignore').decode('ascii')
+    return text.lower()
+
+
+def tokens(text):
+    """Words of a normalized text."""
+    return [token for token in re.split(r"[^0-9a-z]+", normalize(text)) if token]
+
+
+def base_id(edge_id):
+    """Id of an edge without its #n suffix."""
+    return edge_id.split('#')[0]
+
+
+def build_street_index(geojson_file):
+    """Group the edges of the network into streets and index them by the prefixes of their tokens."""
+    with open(geojson_file, encoding='utf-8') as f:
+        features = json.load(f)['features']
+    streets = {}
+    for feature in features:
+        properties = feature['properties']
+        edge_id, name = str(properties['id']), properties.get('name') or ''
+        key = ('name', name) if name else ('id', base_id(edge_id))
+        street = streets.setdefault(key, {'name': name, 'label': html.unescape(name) or base_id(edge_id),
+                                          'edges': []})
+        street['edges'].append(edge_id)
+    streets = sorted(streets.values(), key=lambda street: normalize(street['label']))
+    pairs = sorted({(token, position) for position, street in enumerate(streets)
+                    for text in [street['label']] + [base_id(edge_id) for edge_id in street['edges']]
+                    for token in tokens(text)})
+    return {'streets': streets,
+            'labels': np.array([normalize(street['label']) for street in streets], dtype=str),
+            'tokens': np.array([token for token, _ in pairs], dtype=str),
+            'positions': np.array([position for _, position in pairs], dtype=np.int64)}
+
+
+def prefix_matches(index, prefix):
+    """Positions (sorted, unique) of the streets having a token starting with prefix."""
+    begin = np.searchsorted(index['tokens'], prefix, side='left')
+    end = np.searchsorted(index['tokens'], prefix + '\uffff', side='left')
+    return np.unique(index['positions'][begin:end])
+
+
+def search_streets(index, query, limit=MAX_RESULTS):
+    """Positions of the streets matching every word of the query (as a prefix of one of their tokens).
+
+    The streets whose label starts with the query come first, then the others in alphabetical order."""
+    words = tokens(query)
+    if not words:
+        return []
+    matches = None
+    for word in sorted(words, key=len, reverse=True):
+        positions = prefix_matches(index, word)
+        matches = positions if matches is None else np.intersect1d(matches, positions, assume_unique=True)
+        if not len(matches):
+            return []
+    # The streets are sorted by label, so those whose label starts with the query are a range of positions too
+    prefix = normalize(query).strip()
+    begin = np.searchsorted(index['labels'], prefix, side='left')
+    end = np.searchsorted(index['labels'], prefix + '\uffff', side='left')
+    starting = (matches >= begin) & (matches < end)
+    return [int(position) for position in np.concatenate([matches[starting], matches[~starting]])[:limit]]
+
+
+def street_option(index, position):
+    """Dropdown label of a street: its name (or id) and its number of edges."""
+    street = index['streets'][position]
+    edges = len(street['edges'])
+    return f"{street['label']} ({edges} edge{'s' if edges > 1 else ''})"
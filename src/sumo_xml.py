@@ -0,0 +1,201 @@
+import gzip
+import xml.etree.ElementTree as ET
+import zlib
+import numpy as np
+import pandas as pd
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Columns kept in memory: the ids plus the indicators offered by the dashboard, everything else is dropped at load time
+EDGE_INDICATORS = ['edge_traveltime', 'edge_density', 'edge_occupancy', 'edge_timeLoss', 'edge_waitingTime',
+                   'edge_speed', 'edge_speedRelative', 'edge_sampledSeconds']
+VEHICLE_INDICATORS = ['tripinfo_duration', 'tripinfo_routeLength', 'tripinfo_timeLoss', 'tripinfo_waitingTime']
+VEHICLE_COLUMNS = ['tripinfo_id', 'tripinfo_vType'] + VEHICLE_INDICATORS
+
+COMPRESSED_SUFFIXES = ('.gz', '.zst')
+# Most decimals looked for in the indicators: SUMO writes 2 by default, more with its --precision option
+MAX_DECIMALS = 6
+
+
+# --- Native parsing of the SUMO outputs ---
+# Used for the compressed outputs (SUMO writes .xml.gz natively) and by the follow mode. The files are decompressed
+# while they are parsed, and every <interval> or <tripinfo> is dropped from the tree once it has been converted, so
+# neither the decompressed file nor its whole tree is ever held in memory or on disk.
+
+def is_compressed(xmlfile):
+    """True for the outputs compressed with gzip (.gz) or zstandard (.zst)."""
+    return xmlfile.endswith(COMPRESSED_SUFFIXES)
+
+
+def require_zstandard(xmlfile):
+    """zstandard is optional, it is only needed for .zst outputs."""
+    if zstandard is None:
+        raise ImportError(f"Reading {xmlfile} requires the zstandard package (pip install zstandard)")
+
+
+def open_xml(xmlfile):
+    """Open a SUMO output as a binary stream, decompressing .gz and .zst files on the fly."""
+    if xmlfile.endswith('.gz'):
+        return gzip.open(xmlfile, 'rb')
+    if xmlfile.endswith('.zst'):
+        require_zstandard(xmlfile)
+        return zstandard.ZstdDecompressor().stream_reader(open(xmlfile, 'rb'), read_across_frames=True, closefd=True)
+    return open(xmlfile, 'rb')
+
+
+def decompressor(xmlfile):
+    """Incremental decompressor (with a decompress(chunk) method) of a file still being written, None if plain."""
+    if xmlfile.endswith('.gz'):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if xmlfile.endswith('.zst'):
+        require_zstandard(xmlfile)
+        return zstandard.ZstdDecompressor().decompressobj()
+    return None
+
+
+def iter_records(xmlfile, tag, convert):
+    """Stream the records convert(element) of every <tag> element of a (possibly compressed) SUMO output."""
+    with open_xml(xmlfile) as f:
+        root = None
+        for event, element in ET.iterparse(f, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = element
+            elif element.tag == tag:
+                yield from convert(element)
+                root.remove(element)
+
+
+def interval_records(interval):
+    """Rows (interval_begin, interval_id, edge_id, indicators...) of an edgedata <interval>."""
+    begin = float(interval.get('begin'))
+    interval_id = interval.get('id')
+    return [(begin, interval_id, edge.get('id'))
+            + tuple(float(edge.get(column[len('edge_'):], 'nan')) for column in EDGE_INDICATORS)
+            for edge in interval.iter('edge')]
+
+
+def tripinfo_records(tripinfo):
+    """Row (VEHICLE_COLUMNS) of a <tripinfo>."""
+    row = [tripinfo.get('id'), tripinfo.get('vType')]
+    row += [float(tripinfo.get(column[len('tripinfo_'):], 'nan')) for column in VEHICLE_INDICATORS]
+    return [tuple(row)]
+
+
+def interval_attribute_records(interval):
+    """Rows of an edgedata <interval> with every attribute of it and of its edges, named as by xml2csv (interval_begin,
+    edge_id, edge_speed...)."""
+    interval_columns = {'interval_' + name: value for name, value in interval.attrib.items()}
+    return [{**interval_columns, **{'edge_' + name: value for name, value in edge.attrib.items()}}
+            for edge in interval.iter('edge')]
+
+
+def tripinfo_attribute_records(tripinfo):
+    """Row of a <tripinfo> with every attribute of it, named as by xml2csv (tripinfo_id, tripinfo_depart...)."""
+    return [{'tripinfo_' + name: value for name, value in tripinfo.attrib.items()}]
+
+
+def vehroute_records(vehicle):
+    """Row (id, edges) of a <vehicle> of a vehroute output, with the edges of the last route it was given.
+
+    A rerouted vehicle lists its replaced routes first (in a <routeDistribution>); the last one starts with the edges
+    already driven when it was assigned, so it is the whole path of the trip."""
+    routes = vehicle.findall('.//route')
+    if not routes:
+        return []
+    return [(vehicle.get('id'), routes[-1].get('edges', ''))]
+
+
+# --- Decimals of the indicators ---
+# The indicators are stored as float32, whose nearest float64 has spurious digits (12.35 becomes 12.3500003815). They
+# are rounded back to the decimals of the SUMO outputs when aggregated, which are detected from the values instead of
+# assuming SUMO's default precision.
+
+def value_decimals(values):
+    """Fewest decimals (at most MAX_DECIMALS) the values were written with, every one of them being the float32
+    nearest to its rounding; None when they have more."""
+    values = np.asarray(values, dtype=np.float32)
+    values = values[np.isfinite(values)]
+    for decimals in range(MAX_DECIMALS + 1):
+        if np.array_equal(values.astype(np.float64).round(decimals).astype(np.float32), values):
+            return decimals
+    return None
+
+
+def most_decimals(decimals):
+    """Decimals of values written with the given decimals: the most of them, None if one of them is None."""
+    decimals = list(decimals)
+    return None if not decimals or None in decimals else max(decimals)
+
+
+def merged_decimals(frames):
+    """Decimals (attrs['decimals']) of the indicators of tables concatenated together."""
+    columns = dict.fromkeys(column for frame in frames for column in frame.attrs.get('decimals', {}))
+    return {column: most_decimals(frame.attrs['decimals'][column] for frame in frames
+                                  if column in frame.attrs.get('decimals', {}))
+            for column in columns}
+
+
+def edgedata_frame(records):
+    """Edgedata table of the given interval_records(), with the indicators as float32."""
+    dataframe = pd.DataFrame.from_records(records, columns=['interval_begin', 'interval_id', 'edge_id']
+                                                          + EDGE_INDICATORS)
+    return dataframe.astype({column: np.float32 for column in EDGE_INDICATORS})
+
+
+def tripinfo_frame(records):
+    """Vehicle table of the given tripinfo_records(), in the compact representation (float32, categorical vType)."""
+    vehicle_data = pd.DataFrame.from_records(records, columns=VEHICLE_COLUMNS)
+    return vehicle_data.astype({**{column: np.float32 for column in VEHICLE_INDICATORS},
+                                'tripinfo_vType': 'category'})
+
+
+def attribute_frame(records):
+    """Table of attribute records as read_csv() reads their CSV conversion: the empty attributes are missing, and the
+    numeric columns (but the ids) are converted to numbers."""
+    dataframe = pd.DataFrame.from_records(records)
+    for column in dataframe.columns:
+        values = dataframe[column].mask(dataframe[column] == '')
+        if not column.endswith('_id'):
+            try:
+                values = pd.to_numeric(values)
+            except ValueError:
+                pass
+        dataframe[column] = values
+    return dataframe
+
+
+def read_edgedata_xml(xmlfile, compact=True):
+    """Parse an edgedata output; the indicators that never appear in it are left out.
+
+    With compact=False, every attribute of the intervals and edges is kept, as in the CSV conversion of the file."""
+    if not compact:
+        return attribute_frame(list(iter_records(xmlfile, 'interval', interval_attribute_records)))
+    dataframe = edgedata_frame(list(iter_records(xmlfile, 'interval', interval_records)))
+    missing = [column for column in EDGE_INDICATORS if dataframe[column].isna().all()]
+    return dataframe.drop(columns=missing)
+
+
+def read_rerouter_closures(xmlfile):
+    """Ids of the edges closed by the <closingReroute> (and <closingLaneReroute>) of a rerouter additional file."""
+    closed = []
+    with open_xml(xmlfile) as f:
+        for _, element in ET.iterparse(f):
+            if element.tag == 'closingReroute':
+                closed.append(element.get('id'))
+            elif element.tag == 'closingLaneReroute':
+                closed.append(element.get('id').rsplit('_', 1)[0])
+    return list(dict.fromkeys(closed))
+
+
+def read_tripinfo_xml(xmlfile, compact=True):
+    """Parse a tripinfo output.
+
+    With compact=False, every attribute of the trips is kept, as in the CSV conversion of the file."""
+    if not compact:
+        return attribute_frame(list(iter_records(xmlfile, 'tripinfo', tripinfo_attribute_records)))
+    return tripinfo_frame(list(iter_records(xmlfile, 'tripinfo', tripinfo_records)))
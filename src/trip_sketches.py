@@ -0,0 +1,156 @@
+import math
+import numpy as np
+from src.sumo_xml import VEHICLE_INDICATORS, iter_records, tripinfo_records, tripinfo_frame
+
+
+# --- Out-of-core tripinfo statistics ---
+# With --trip_sketches the tripinfo outputs are streamed once, CHUNK_TRIPS trips at a time, and never held as tables:
+# each indicator of each scenario only keeps
+#  - a quantile sketch with relative error RELATIVE_ACCURACY: the values are counted in logarithmic buckets
+#    (bucket i holds the values in (GAMMA^(i-1), GAMMA^i]), so any quantile is known within 1% whatever the number of
+#    trips, from a few hundred buckets;
+#  - a histogram with bins of a fixed width (HISTOGRAM_BIN_WIDTHS), merged into wider bins when it is drawn.
+# Both are counts, so the statistics of several chunks, files or follow-mode polls are merged by adding them.
+
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+CHUNK_TRIPS = 100000
+HISTOGRAM_BIN_WIDTHS = {'tripinfo_duration': 10.0, 'tripinfo_routeLength': 100.0, 'tripinfo_timeLoss': 5.0,
+                        'tripinfo_waitingTime': 5.0}
+SUMMARY_QUANTILES = (0.5, 0.9, 0.99)
+
+
+def new_sketch():
+    """Empty quantile sketch."""
+    return {'positive': {}, 'negative': {}, 'zeros': 0, 'count': 0, 'min': math.inf, 'max': -math.inf}
+
+
+def add_counts(counts, keys):
+    """Add the occurrences of the integer keys to a {key: count} dict."""
+    unique, occurrences = np.unique(keys, return_counts=True)
+    for key, occurrence in zip(unique.tolist(), occurrences.tolist()):
+        counts[key] = counts.get(key, 0) + occurrence
+
+
+def sketch_add(sketch, values):
+    """Add an array of values (NaN ignored) to a sketch."""
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return sketch
+    add_counts(sketch['positive'], np.ceil(np.log(values[values > 0]) / np.log(GAMMA)).astype(np.int64))
+    add_counts(sketch['negative'], np.ceil(np.log(-values[values < 0]) / np.log(GAMMA)).astype(np.int64))
+    sketch['zeros'] += int(np.count_nonzero(values == 0))
+    sketch['count'] += len(values)
+    sketch['min'] = min(sketch['min'], float(values.min()))
+    sketch['max'] = max(sketch['max'], float(values.max()))
+    return sketch
+
+
+def sketch_merge(sketch, other):
+    """Add the counts of another sketch to a sketch."""
+    for store in ('positive', 'negative'):
+        for key, count in other[store].items():
+            sketch[store][key] = sketch[store].get(key, 0) + count
+    sketch['zeros'] += other['zeros']
+    sketch['count'] += other['count']
+    sketch['min'] = min(sketch['min'], other['min'])
+    sketch['max'] = max(sketch['max'], other['max'])
+    return sketch
+
+
+def sketch_quantile(sketch, q):
+    """Quantile q of the values of a sketch (within RELATIVE_ACCURACY), NaN if it is empty."""
+    if not sketch['count']:
+        return math.nan
+    rank = q * (sketch['count'] - 1)
+    seen = 0
+    # Negative values from the largest magnitude, then the zeros, then the positive values from the smallest one
+    buckets = ([(-2 * GAMMA ** key / (GAMMA + 1), count) for key, count in sorted(sketch['negative'].items(),
+                                                                                 reverse=True)]
+               + [(0.0, sketch['zeros'])]
+               + [(2 * GAMMA ** key / (GAMMA + 1), count) for key, count in sorted(sketch['positive'].items())])
+    for value, count in buckets:
+        seen += count
+        if seen > rank:
+            return min(max(value, sketch['min']), sketch['max'])
+    return sketch['max']
+
+
+def new_histogram(width):
+    """Empty histogram with bins of the given width."""
+    return {'width': width, 'counts': {}}
+
+
+def histogram_add(histogram, values):
+    """Add an array of values (NaN ignored) to a histogram."""
+    values = values[~np.isnan(values)]
+    add_counts(histogram['counts'], np.floor(values / histogram['width']).astype(np.int64))
+    return histogram
+
+
+def histogram_merge(histogram, other):
+    """Add the counts of another histogram with the same bins to a histogram."""
+    for key, count in other['counts'].items():
+        histogram['counts'][key] = histogram['counts'].get(key, 0) + count
+    return histogram
+
+
+def histogram_bars(histogram, max_bars=100):
+    """Left edges, width and counts of the bars of a histogram, adjacent bins merged to keep at most max_bars bars."""
+    if not histogram['counts']:
+        return np.empty(0), histogram['width'], np.empty(0, dtype=np.int64)
+    keys = np.array(sorted(histogram['counts']))
+    counts = np.array([histogram['counts'][key] for key in keys])
+    factor = max(1, math.ceil((keys[-1] - keys[0] + 1) / max_bars))
+    merged = np.floor_divide(keys, factor)
+    bars, positions = np.unique(merged, return_inverse=True)
+    return bars * factor * histogram['width'], factor * histogram['width'], np.bincount(positions, weights=counts)
+
+
+# --- Statistics of a scenario ---
+
+def new_trip_statistics():
+    """Empty statistics (number of trips, then a sketch and a histogram per indicator)."""
+    return {'trips': 0, 'indicators': {indicator: {'sketch': new_sketch(),
+                                                   'histogram': new_histogram(HISTOGRAM_BIN_WIDTHS[indicator])}
+                                       for indicator in VEHICLE_INDICATORS}}
+
+
+def add_trips(statistics, vehicle_data):
+    """Add the trips of a vehicle table (a chunk of tripinfo_frame(), or the trips of a follow-mode poll)."""
+    statistics['trips'] += len(vehicle_data)
+    for indicator, state in statistics['indicators'].items():
+        if indicator in vehicle_data.columns:
+            values = vehicle_data[indicator].to_numpy(np.float64)
+            sketch_add(state['sketch'], values)
+            histogram_add(state['histogram'], values)
+    return statistics
+
+
+def merge_trip_statistics(statistics, other):
+    """Add the statistics of another set of trips (another file, another replicate...)."""
+    statistics['trips'] += other['trips']
+    for indicator, state in statistics['indicators'].items():
+        sketch_merge(state['sketch'], other['indicators'][indicator]['sketch'])
+        histogram_merge(state['histogram'], other['indicators'][indicator]['histogram'])
+    return statistics
+
+
+def read_trip_statistics(xmlfile, chunk_trips=CHUNK_TRIPS):
+    """Stream a (possibly compressed) tripinfo output once into its statistics."""
+    statistics = new_trip_statistics()
+    chunk = []
+    for record in iter_records(xmlfile, 'tripinfo', tripinfo_records):
+        chunk.append(record)
+        if len(chunk) == chunk_trips:
+            add_trips(statistics, tripinfo_frame(chunk))
+            chunk = []
+    if chunk:
+        add_trips(statistics, tripinfo_frame(chunk))
+    return statistics
+
+
+def summary_quantiles(statistics, indicator):
+    """SUMMARY_QUANTILES of an indicator, {quantile: value}."""
+    sketch = statistics['indicators'][indicator]['sketch']
+    return {q: sketch_quantile(sketch, q) for q in SUMMARY_QUANTILES}
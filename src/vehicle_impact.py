@@ -0,0 +1,94 @@
+import threading
+import numpy as np
+import pandas as pd
+from src.sumo_xml import VEHICLE_INDICATORS, value_decimals, most_decimals
+
+
+# --- Per-vehicle impact ---
+# The trips of both scenarios are aligned once, on integer codes (the position of each trip in the scenario without
+# deviations), and the differences (with - without) of every indicator are sorted once, for all the trips and for each
+# vType. The most or least impacted vehicles are then slices of these sorted arrays, and a trip is found by a hash
+# lookup of its id, whatever the number of trips. The impact of the trips of a followed simulation grows as they
+# finish (see src/follow.py), its differences are then sorted by the first ranking after each update.
+
+def build_vehicle_impact(vehicle_data_without, vehicle_data_with):
+    """Align the trips of both scenarios and precompute the sorted differences of every indicator."""
+    trips = pd.Index(vehicle_data_without['tripinfo_id'].astype(str))
+    positions = trips.get_indexer(vehicle_data_with['tripinfo_id'].astype(str))
+    matched = positions >= 0
+    if 'tripinfo_vType' in vehicle_data_without.columns:
+        vehicle_types = vehicle_data_without['tripinfo_vType'].astype('category')
+    else:
+        vehicle_types = pd.Series(pd.Categorical([''] * len(trips)))
+    type_codes = vehicle_types.cat.codes.to_numpy()
+    type_names = [str(name) for name in vehicle_types.cat.categories]
+    present = np.zeros(len(trips), dtype=bool)
+    present[positions[matched]] = True
+    impact = {'trips': trips, 'present': present, 'types': type_names, 'type_codes': type_codes, 'without': {},
+              'with': {}, 'diff': {}, 'orders': {}, 'lock': threading.Lock()}
+    for indicator in VEHICLE_INDICATORS:
+        if indicator not in vehicle_data_without.columns or indicator not in vehicle_data_with.columns:
+            continue
+        without = vehicle_data_without[indicator].to_numpy(np.float32)
+        with_deviations = np.full(len(trips), np.nan, dtype=np.float32)
+        with_deviations[positions[matched]] = vehicle_data_with[indicator].to_numpy(np.float32)[matched]
+        # Trips missing (or without a value) in one of the scenarios have no difference
+        impact['without'][indicator] = np.nan_to_num(without, nan=0.0)
+        impact['with'][indicator] = np.nan_to_num(with_deviations, nan=0.0)
+        impact['diff'][indicator] = np.nan_to_num(with_deviations - without, nan=0.0)
+        impact_orders(impact, indicator)
+    return impact
+
+
+def impact_orders(impact, indicator):
+    """Positions of the trips sorted by their difference of an indicator, {None: all the trips, vType: its trips},
+    sorted the first time they are needed."""
+    with impact['lock']:
+        if indicator not in impact['orders']:
+            order = np.argsort(impact['diff'][indicator], kind='stable')
+            orders = {None: order}
+            for code, name in enumerate(impact['types']):
+                orders[name] = order[impact['type_codes'][order] == code]
+            impact['orders'][indicator] = orders
+        return impact['orders'][indicator]
+
+
+def ranked_vehicles(impact, indicator, k, largest=True, vehicle_type=None):
+    """Positions of the k most (largest=True) or least impacted trips, optionally of a single vType."""
+    order = impact_orders(impact, indicator).get(vehicle_type, np.empty(0, dtype=np.intp))
+    return order[::-1][:k] if largest else order[:k]
+
+
+def find_vehicle(impact, trip_id):
+    """Position of a trip from its id, None if it is not in the scenario without deviations."""
+    position = impact['trips'].get_indexer([str(trip_id)])[0]
+    return None if position < 0 else position
+
+
+def vehicle_values(impact, indicator, trip_ids):
+    """Values (without, with) of an indicator for the given trip ids, the trips missing in a scenario left out."""
+    positions = impact['trips'].get_indexer(pd.Index(trip_ids).astype(str))
+    positions = positions[positions >= 0]
+    return impact['without'][indicator][positions], impact['with'][indicator][positions[impact['present'][positions]]]
+
+
+def vehicle_rows(impact, indicator, positions):
+    """Table (id, vType, without, with, diff) of the given trips for an indicator."""
+    codes = impact['type_codes'][positions]
+    types = np.asarray(impact['types'] + [''], dtype=object)
+    without, with_ = impact['without'][indicator][positions], impact['with'][indicator][positions]
+    # The float32 values are rounded back to the decimals of the tripinfo outputs, detected on the rows shown
+    decimals = most_decimals([value_decimals(without), value_decimals(with_)])
+    return pd.DataFrame({
+        'id': impact['trips'][positions],
+        'vType': types[np.where(codes < 0, len(impact['types']), codes)],
+        'without': rounded(without, decimals),
+        'with': rounded(with_, decimals),
+        'diff': rounded(impact['diff'][indicator][positions], decimals),
+    })
+
+
+def rounded(values, decimals):
+    """float64 copy of float32 values, rounded to the given decimals unless None."""
+    values = values.astype(np.float64)
+    return values if decimals is None else values.round(decimals)
@@ -0,0 +1,105 @@
+import atexit
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+# --- Warm-up of the default views ---
+# After a restart, the first visitor would pay for the whole map (GeoJSON, PNG) and figure pipeline of the default
+# view. With --warm_up N, once the datasets are loaded, the views of the default indicator and of the most used ones
+# (N indicators in all) over the full time range are computed in a thread pool and stored in the cache of the
+# callbacks. The indicators shown are counted in memory and added every USAGE_FLUSH_INTERVAL seconds, by a background
+# thread, to usage.json of the cache directory, so the ranking survives restarts without a write per callback.
+
+USAGE_FILE = 'usage.json'
+USAGE_FLUSH_INTERVAL = 30
+
+_usage_lock = threading.Lock()
+_pending_usage = {}
+_usage_flusher = None
+
+
+def read_usage(cache_dir):
+    """Number of times each indicator was shown, {} when nothing was recorded yet."""
+    try:
+        with open(os.path.join(cache_dir, USAGE_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def record_usage(indicator):
+    """Count one more view of an indicator (in memory, written by flush_usage)."""
+    with _usage_lock:
+        _pending_usage[indicator] = _pending_usage.get(indicator, 0) + 1
+
+
+def flush_usage(cache_dir):
+    """Add the views counted since the last flush to the usage file, replaced atomically. A failed write is reported
+    and its counts are kept for the next flush."""
+    with _usage_lock:
+        if not _pending_usage:
+            return
+        usage = read_usage(cache_dir)
+        for indicator, count in _pending_usage.items():
+            usage[indicator] = usage.get(indicator, 0) + count
+        path = os.path.join(cache_dir, USAGE_FILE)
+        temporary = None
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            descriptor, temporary = tempfile.mkstemp(prefix=USAGE_FILE, suffix='.tmp', dir=cache_dir)
+            with os.fdopen(descriptor, 'w', encoding='utf-8') as f:
+                json.dump(usage, f)
+            os.replace(temporary, path)
+        except OSError as e:
+            print(f"Could not record the usage of the indicators in {path}: {e}", file=sys.stderr)
+            if temporary is not None and os.path.exists(temporary):
+                os.remove(temporary)
+            return
+        _pending_usage.clear()
+
+
+def start_usage_flusher(cache_dir):
+    """Flush the usage counts every USAGE_FLUSH_INTERVAL seconds, and at exit, in a daemon thread (started once)."""
+    global _usage_flusher
+    with _usage_lock:
+        if _usage_flusher is not None:
+            return
+
+        def flush_periodically():
+            while True:
+                time.sleep(USAGE_FLUSH_INTERVAL)
+                flush_usage(cache_dir)
+
+        _usage_flusher = threading.Thread(target=flush_periodically, name='usage_flusher', daemon=True)
+        _usage_flusher.start()
+    atexit.register(flush_usage, cache_dir)
+
+
+def warm_up_indicators(candidates, count, cache_dir):
+    """The default indicator (the first candidate), then the most used of the others, count indicators in all."""
+    if not candidates or count <= 0:
+        return []
+    usage = read_usage(cache_dir)
+    with _usage_lock:
+        for indicator, views in _pending_usage.items():
+            usage[indicator] = usage.get(indicator, 0) + views
+    others = sorted(candidates[1:], key=lambda indicator: -usage.get(indicator, 0))
+    return [candidates[0]] + others[:count - 1]
+
+
+def warm_up(tasks, workers):
+    """Run the warm-up tasks, (name, function) pairs, in a thread pool. A failed task is reported and skipped."""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='warm_up') as executor:
+        futures = {executor.submit(function): name for name, function in tasks}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Warm-up of {futures[future]} failed: {type(e).__name__}: {e}", file=sys.stderr)
+    print(f"Warm-up of {len(tasks)} views done in {time.perf_counter() - start:.1f} s", file=sys.stderr)
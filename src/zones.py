@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+from src.network_graph import project, unproject
+
+
+# --- Zone aggregation ---
+# At low zoom the map shows zones (a hexagonal grid, or the polygons of a zones file) instead of the streets. Every
+# street is assigned once, at load time, to the zone containing its middle point; each map update then rolls the
+# street differences up by zone with a single bincount over these codes, and only sends the zones that have data.
+# geopandas and shapely are only imported when the zones are built (--zones or --hex_size).
+
+def hex_cells(xy, size):
+    """Axial coordinates (q, r) of the pointy-top hexagons of circumradius size (metres) containing the points."""
+    q = (np.sqrt(3) / 3 * xy[:, 0] - xy[:, 1] / 3) / size
+    r = (2 / 3 * xy[:, 1]) / size
+    # Cube coordinates rounding: the component with the largest rounding error is recomputed from the two others
+    s = -q - r
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    return np.column_stack([rq, rr]).astype(np.int64)
+
+
+def hex_polygon(q, r, size, latitude):
+    """Polygon, in (longitude, latitude), of the hexagon of axial coordinates (q, r)."""
+    import shapely
+    center = np.array([size * np.sqrt(3) * (q + r / 2), size * 3 / 2 * r])
+    angles = np.radians(30 + 60 * np.arange(7))
+    corners = center + size * np.column_stack([np.cos(angles), np.sin(angles)])
+    return shapely.Polygon(unproject(corners, latitude))
+
+
+def hex_zones(midpoints, size):
+    """Hexagonal grid of the streets: zone code of every street and the polygons of the zones used."""
+    import geopandas as gpd
+    latitude = midpoints[:, 1].mean() if len(midpoints) else 0
+    cells = hex_cells(project(midpoints, latitude), size)
+    codes, unique_cells = pd.factorize(pd.MultiIndex.from_arrays([cells[:, 0], cells[:, 1]]))
+    zones = gpd.GeoDataFrame({'zone': [f"Zone {i + 1}" for i in range(len(unique_cells))]},
+                             geometry=[hex_polygon(q, r, size, latitude) for q, r in unique_cells], crs='EPSG:4326')
+    return codes, zones
+
+
+def file_zones(midpoints, zones_file):
+    """Zones of a polygon file: zone code of every street (-1 outside every zone) and the polygons of the zones."""
+    import geopandas as gpd
+    zones = gpd.read_file(zones_file)
+    zones = zones.to_crs('EPSG:4326') if zones.crs is not None else zones.set_crs('EPSG:4326')
+    name = next((column for column in ('name', 'id', 'zone') if column in zones.columns), None)
+    zones = gpd.GeoDataFrame({'zone': zones[name].astype(str) if name else zones.index.astype(str)},
+                             geometry=zones.geometry.values, crs='EPSG:4326').reset_index(drop=True)
+    points = gpd.GeoDataFrame(geometry=gpd.points_from_xy(midpoints[:, 0], midpoints[:, 1]), crs='EPSG:4326')
+    joined = gpd.sjoin(points, zones, how='left', predicate='within')
+    # A street in overlapping zones goes to the first one
+    joined = joined[~joined.index.duplicated()]
+    return joined['index_right'].fillna(-1).astype(np.int64).to_numpy(), zones
+
+
+def build_zone_layer(geojson_file, zones_file=None, hex_size=None):
+    """Precompute the street -> zone mapping and the zone geometries used by zone_features()."""
+    import geopandas as gpd
+    import shapely
+    net_gdf = gpd.read_file(geojson_file)
+    midpoints = shapely.get_coordinates(shapely.line_interpolate_point(np.asarray(net_gdf.geometry.array), 0.5,
+                                                                       normalized=True))
+    if zones_file:
+        codes, zones = file_zones(midpoints, zones_file)
+    else:
+        codes, zones = hex_zones(midpoints, hex_size)
+    return {'edge_zone': pd.Series(codes, index=net_gdf['id'].astype(str).to_numpy()),
+            'names': zones['zone'].tolist(),
+            'geometries': [shapely.geometry.mapping(geometry) for geometry in zones.geometry]}
+
+
+def zone_features(zone_layer, edge_values, value_property):
+    """GeoJSON of the zones with the mean of the street values (a Series indexed by street id) under value_property."""
+    codes = zone_layer['edge_zone'].reindex(edge_values.index.astype(str)).fillna(-1).to_numpy(np.int64)
+    values = edge_values.to_numpy(np.float64)
+    known = (codes >= 0) & ~np.isnan(values)
+    streets = np.bincount(codes[known], minlength=len(zone_layer['names']))
+    sums = np.bincount(codes[known], weights=values[known], minlength=len(zone_layer['names']))
+    return {'type': 'FeatureCollection', 'features': [
+        {'type': 'Feature', 'geometry': zone_layer['geometries'][zone],
+         'properties': {'zone': zone_layer['names'][zone], 'streets': int(streets[zone]),
+                        value_property: round(float(sums[zone] / streets[zone]), 2)}}
+        for zone in np.flatnonzero(streets)]}
@@ -0,0 +1,160 @@
+import os
+import types
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import aggregations, disk_cache as disk_cache_module
+from src.disk_cache import open_disk_cache, disk_get, disk_put, dataset_key, entry_key
+
+
+class Clock:
+    """Stand-in for the time module whose time() advances by one second at every call."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        self.now += 1.0
+        return self.now
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(disk_cache_module, 'time', Clock())
+    return open_disk_cache(str(tmp_path), 10 ** 6)
+
+
+@pytest.fixture
+def memory_cache(monkeypatch):
+    """Empty memory cache of src/aggregations.py, without a disk cache, restored after the test."""
+    monkeypatch.setattr(aggregations, '_cache', type(aggregations._cache)())
+    monkeypatch.setattr(aggregations, '_disk', {'cache': None, 'content_keys': {}})
+
+
+def incompressible(size, seed=0):
+    return np.random.default_rng(seed).bytes(size)
+
+
+# --- Disk cache ---
+
+def test_round_trip(cache):
+    table = pd.DataFrame({'edge_id': ['a', 'b'], 'value': [1.5, 2.25]})
+    disk_put(cache, ('tables', 'a'), {'table': table, 'classes': [0, 1, 2]})
+    value = disk_get(cache, ('tables', 'a'))
+    pd.testing.assert_frame_equal(value['table'], table)
+    assert value['classes'] == [0, 1, 2]
+
+
+def test_missing_entry(cache):
+    assert disk_get(cache, ('missing',)) is None
+
+
+def test_replaced_entry(cache):
+    disk_put(cache, ('key',), 1)
+    disk_put(cache, ('key',), 2)
+    assert disk_get(cache, ('key',)) == 2
+
+
+def test_corrupt_entry_reads_as_missing(cache):
+    disk_put(cache, ('key',), 'value')
+    cache['connection'].execute('UPDATE entries SET value = ? WHERE key = ?', (b'not a pickle', entry_key(('key',))))
+    assert disk_get(cache, ('key',)) is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr(disk_cache_module, 'time', Clock())
+    cache = open_disk_cache(str(tmp_path), 35000)
+    for name in ('first', 'second', 'third'):
+        disk_put(cache, (name,), incompressible(10000, len(name)))
+    # Reading the first entry makes the second one the least recently used
+    assert disk_get(cache, ('first',)) is not None
+    disk_put(cache, ('fourth',), incompressible(10000, 4))
+    assert disk_get(cache, ('second',)) is None
+    for name in ('first', 'third', 'fourth'):
+        assert disk_get(cache, (name,)) is not None
+    total = cache['connection'].execute('SELECT SUM(size) FROM entries').fetchone()[0]
+    assert total <= 35000
+
+
+def test_values_larger_than_the_cache_are_not_stored(tmp_path):
+    cache = open_disk_cache(str(tmp_path), 1000)
+    disk_put(cache, ('large',), incompressible(5000))
+    assert disk_get(cache, ('large',)) is None
+
+
+def test_entries_survive_a_restart(tmp_path):
+    disk_put(open_disk_cache(str(tmp_path), 10 ** 6), ('key',), [1, 2, 3])
+    assert disk_get(open_disk_cache(str(tmp_path), 10 ** 6), ('key',)) == [1, 2, 3]
+
+
+# --- Content key of a dataset ---
+
+def dataset_options(network_file, **overrides):
+    return types.SimpleNamespace(**{'road_network_json': network_file, 'impact_hops': None, 'cache_dir': 'a',
+                                    'warm_up': 0, **overrides})
+
+
+def test_dataset_key_is_stable_and_ignores_the_runtime_options(tmp_path):
+    network_file = tmp_path / 'network.geojson'
+    network_file.write_text('{}')
+    key = dataset_key(dataset_options(str(network_file)))
+    assert dataset_key(dataset_options(str(network_file))) == key
+    assert dataset_key(dataset_options(str(network_file), cache_dir='b', warm_up=4)) == key
+    assert dataset_key(dataset_options(str(network_file), impact_hops=2)) != key
+
+
+def test_dataset_key_changes_with_the_input_files(tmp_path):
+    network_file = tmp_path / 'network.geojson'
+    network_file.write_text('{}')
+    key = dataset_key(dataset_options(str(network_file)))
+    network_file.write_text('{"type": "FeatureCollection"}')
+    os.utime(network_file, ns=(0, 0))
+    assert dataset_key(dataset_options(str(network_file))) != key
+
+
+# --- Memory and disk tiers ---
+
+def test_cached_computes_a_value_once_per_version(memory_cache):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert aggregations.cached(('view',), compute, version=1) == 1
+    assert aggregations.cached(('view',), compute, version=1) == 1
+    assert aggregations.cached(('view',), compute, version=2) == 2
+
+
+def test_compute_value_is_read_back_after_a_restart(tmp_path, memory_cache):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {'rows': 42}
+
+    aggregations.use_disk_cache(open_disk_cache(str(tmp_path), 10 ** 6))
+    aggregations.register_version(1, 'content')
+    assert aggregations.cached(('view', 'a'), compute, version=1) == {'rows': 42}
+    # A restarted server gets a new version for the same content key, and an empty memory cache
+    aggregations._cache.clear()
+    aggregations.use_disk_cache(open_disk_cache(str(tmp_path), 10 ** 6))
+    aggregations.register_version(7, 'content')
+    assert aggregations.cached(('view', 'a'), compute, version=7) == {'rows': 42}
+    assert len(calls) == 1
+
+
+def test_versions_without_a_content_key_stay_in_memory(tmp_path, memory_cache):
+    disk = open_disk_cache(str(tmp_path), 10 ** 6)
+    aggregations.use_disk_cache(disk)
+    assert aggregations.compute_value(('view',), lambda: 'value', 3) == 'value'
+    assert disk['connection'].execute('SELECT COUNT(*) FROM entries').fetchone()[0] == 0
+
+
+def test_forget_version(memory_cache):
+    aggregations.register_version(5, 'content')
+    aggregations.cached(('view',), lambda: 'value', version=5)
+    aggregations.forget_version(5)
+    assert all(memory_key[0] != 5 for memory_key in aggregations._cache)
+    assert 5 not in aggregations._disk['content_keys']
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data_loader import compact_edgedata
+from src.follow import new_follow_tables, append_edgedata, append_vehicles, followed_intervals, tail_records
+from src.sumo_xml import EDGE_INDICATORS, VEHICLE_INDICATORS, edgedata_frame, tripinfo_frame, interval_records
+from src.vehicle_impact import build_vehicle_impact, ranked_vehicles, find_vehicle
+
+INTERVAL = 300
+
+
+def edgedata_rows(rng, begin, edges):
+    """New edgedata rows of the interval starting at begin, for the given edges."""
+    return edgedata_frame([(float(begin), f"{begin}_to_{begin + INTERVAL}", edge)
+                           + tuple(float(value) for value in rng.integers(0, 10000, len(EDGE_INDICATORS)) / 100)
+                           for edge in edges])
+
+
+def trips(rng, ids, vehicle_types=('car', 'bus', 'truck')):
+    return tripinfo_frame([(trip_id, str(rng.choice(vehicle_types)))
+                           + tuple(float(value) for value in rng.integers(0, 1000, len(VEHICLE_INDICATORS)))
+                           for trip_id in ids])
+
+
+def test_edgedata_tables_match_compact_tables_of_all_the_rows():
+    rng = np.random.default_rng(0)
+    tables = new_follow_tables()
+    polls = []
+    for begin in range(0, 10 * INTERVAL, INTERVAL):
+        # Edges appear over time, and the scenario with deviations can be one interval behind
+        edges = [f"e{i}" for i in rng.choice(300, 150, replace=False)]
+        new_without = edgedata_rows(rng, begin, edges)
+        new_with = edgedata_rows(rng, begin - INTERVAL, edges) if begin else edgedata_frame([])
+        polls.append((new_without, new_with))
+        dataframe_without, dataframe_with = append_edgedata(tables, new_without, new_with)
+    expected = compact_edgedata(*(pd.concat([poll[scenario] for poll in polls if len(poll[scenario])])
+                                  .sort_values(['interval_begin', 'edge_id'], kind='stable', ignore_index=True)
+                                  for scenario in (0, 1)))
+    for frame, expected_frame in zip((dataframe_without, dataframe_with), expected):
+        assert list(frame.columns) == list(expected_frame.columns)
+        for column in ('interval_id', 'edge_id'):
+            assert list(frame[column].astype(str)) == list(expected_frame[column].astype(str))
+        assert list(frame['interval_id'].cat.categories) == list(expected_frame['interval_id'].cat.categories)
+        pd.testing.assert_frame_equal(frame[EDGE_INDICATORS], expected_frame[EDGE_INDICATORS])
+        assert frame.attrs['decimals'] == {column: 2 for column in EDGE_INDICATORS}
+    assert followed_intervals(tables) == list(dataframe_without['interval_id'].unique())
+
+
+def test_published_tables_are_not_changed_by_later_updates():
+    rng = np.random.default_rng(1)
+    tables = new_follow_tables()
+    first, _ = append_edgedata(tables, edgedata_rows(rng, 0, ['a', 'b']), edgedata_rows(rng, 0, ['a', 'b']))
+    copy = first.copy()
+    for begin in range(INTERVAL, 200 * INTERVAL, INTERVAL):
+        latest, _ = append_edgedata(tables, edgedata_rows(rng, begin, [f"e{begin}", 'a']), edgedata_frame([]))
+    pd.testing.assert_frame_equal(first, copy)
+    assert len(latest) == 2 + 2 * 199
+    # More than 127 edges: the codes were widened, the codes of the first rows still name the same edges
+    assert latest['edge_id'].cat.codes.dtype == np.int16
+    assert list(latest['edge_id'][:2]) == ['a', 'b']
+
+
+def test_loaded_rows_are_not_copied_by_an_update():
+    rng = np.random.default_rng(2)
+    tables = new_follow_tables()
+    first, _ = append_edgedata(tables, edgedata_rows(rng, 0, ['a', 'b']), edgedata_rows(rng, 0, ['a']))
+    second, _ = append_edgedata(tables, edgedata_rows(rng, INTERVAL, ['a', 'b']), edgedata_frame([]))
+    for column in EDGE_INDICATORS:
+        assert np.shares_memory(first[column].to_numpy(), second[column].to_numpy())
+    assert np.shares_memory(first['edge_id'].cat.codes.to_numpy(), second['edge_id'].cat.codes.to_numpy())
+
+
+def impact_fields(impact):
+    return {field: {indicator: impact[field][indicator] for indicator in impact['diff']}
+            for field in ('without', 'with', 'diff')}
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_trip_impact_matches_the_impact_of_the_whole_tables(seed):
+    rng = np.random.default_rng(seed)
+    tables = new_follow_tables()
+    ids = [f"trip{i}" for i in range(2000)]
+    # The trips finish in another order with deviations, some of them before their trip without deviations, and some
+    # never finish in one of the scenarios
+    ids_without = [trip_id for trip_id in ids if rng.random() < 0.95]
+    ids_with = [trip_id for trip_id in rng.permutation(ids) if rng.random() < 0.9]
+    all_without, all_with = trips(rng, ids_without), trips(rng, ids_with)
+    cuts_without = np.sort(rng.choice(len(ids_without), 9, replace=False))
+    cuts_with = np.sort(rng.choice(len(ids_with), 9, replace=False))
+    for new_without, new_with in zip(np.split(np.arange(len(ids_without)), cuts_without),
+                                     np.split(np.arange(len(ids_with)), cuts_with)):
+        vehicle_data_without, vehicle_data_with, impact = append_vehicles(
+            tables, all_without.iloc[new_without].reset_index(drop=True),
+            all_with.iloc[new_with].reset_index(drop=True))
+    expected = build_vehicle_impact(vehicle_data_without, vehicle_data_with)
+    assert list(impact['trips']) == list(expected['trips'])
+    assert np.array_equal(impact['present'], expected['present'])
+    for field, values in impact_fields(expected).items():
+        for indicator in values:
+            assert np.array_equal(impact[field][indicator], values[indicator])
+    assert impact['orders'] == {}
+    for indicator in VEHICLE_INDICATORS:
+        for vehicle_type in (None, 'car', 'bus'):
+            assert np.array_equal(ranked_vehicles(impact, indicator, 20, True, vehicle_type),
+                                  ranked_vehicles(expected, indicator, 20, True, vehicle_type))
+    assert find_vehicle(impact, ids_without[10]) == 10
+
+
+def test_no_trip_impact_with_trip_sketches():
+    tables = new_follow_tables(trip_impact=False)
+    rng = np.random.default_rng(3)
+    vehicle_data_without, _, impact = append_vehicles(tables, trips(rng, ['a', 'b']), trips(rng, ['b']))
+    assert impact is None
+    assert list(vehicle_data_without['tripinfo_id']) == ['a', 'b']
+
+
+def test_tail_records_reads_the_intervals_closed_since_the_previous_call(tmp_path):
+    xmlfile = tmp_path / 'edgedata.out.xml'
+    tail = tail_records(str(xmlfile), 'interval', interval_records)
+    assert next(tail) == []
+    xmlfile.write_text('<meandata>\n<interval begin="0.00" end="300.00" id="0_to_300">\n<edge id="a" speed="1.50"/>\n'
+                       '</interval>\n<interval begin="300.00" end="600.00" id="300_to_600">\n<edge id="a"')
+    assert [record[:3] for record in next(tail)] == [(0.0, '0_to_300', 'a')]
+    with open(xmlfile, 'a') as f:
+        f.write(' speed="2.00"/>\n</interval>\n')
+    records = next(tail)
+    assert [record[:3] for record in records] == [(300.0, '300_to_600', 'a')]
+    assert records[0][3 + EDGE_INDICATORS.index('edge_speed')] == 2.0
+    assert next(tail) == []
@@ -0,0 +1,72 @@
+import math
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import pytest
+
+from src.generate_visualizations_streets import MAX_LINE_POINTS, WEBGL_POINTS, lttb, time_series_traces
+
+
+def reference_lttb(y, threshold):
+    """Textbook Largest-Triangle-Three-Buckets (Steinarsson, 2013), one point at a time."""
+    n = len(y)
+    every = (n - 2) / (threshold - 2)
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        start, end = math.floor(i * every) + 1, math.floor((i + 1) * every) + 1
+        next_start, next_end = end, min(math.floor((i + 2) * every) + 1, n)
+        next_x = sum(range(next_start, next_end)) / (next_end - next_start)
+        next_y = sum(y[next_start:next_end]) / (next_end - next_start)
+        best, best_area = start, -1.0
+        for b in range(start, end):
+            area = abs((a - next_x) * (y[b] - y[a]) - (a - b) * (next_y - y[a]))
+            if area > best_area:
+                best, best_area = b, area
+        selected.append(best)
+        a = best
+    return selected + [n - 1]
+
+
+@pytest.mark.parametrize('n, threshold', [(10, 5), (100, 7), (1000, 500), (1234, 100), (501, 500)])
+def test_matches_the_reference_implementation(n, threshold):
+    y = np.random.default_rng(n).normal(0, 1, n).cumsum()
+    assert list(lttb(y, threshold)) == reference_lttb(list(y), threshold)
+
+
+def test_keeps_the_first_and_last_points_in_order():
+    y = np.random.default_rng(0).normal(0, 1, 5000)
+    selected = lttb(y, 300)
+    assert len(selected) == 300
+    assert selected[0] == 0 and selected[-1] == len(y) - 1
+    assert np.all(np.diff(selected) > 0)
+
+
+def test_keeps_the_peaks():
+    y = np.zeros(2000)
+    y[[123, 777, 1500]] = [50.0, -80.0, 30.0]
+    selected = lttb(y, 50)
+    assert {123, 777, 1500} <= set(selected.tolist())
+
+
+@pytest.mark.parametrize('n, threshold', [(10, 10), (10, 20), (0, 5), (10, 2)])
+def test_short_series_are_kept_whole(n, threshold):
+    assert list(lttb(np.arange(n, dtype=float), threshold)) == list(range(n))
+
+
+def series(points):
+    return pd.Series(np.sin(np.arange(points) / 10), index=[f"{i * 60}_to_{(i + 1) * 60}" for i in range(points)])
+
+
+def test_sparse_figures_use_svg_lines():
+    traces, downsampled = time_series_traces([(series(100), 'a'), (series(100), 'b')])
+    assert all(isinstance(trace, go.Scatter) for trace in traces)
+    assert not downsampled
+
+
+def test_dense_figures_use_webgl_and_long_lines_are_downsampled():
+    traces, downsampled = time_series_traces([(series(MAX_LINE_POINTS * 3), 'long'), (series(WEBGL_POINTS), 'b')])
+    assert all(isinstance(trace, go.Scattergl) for trace in traces)
+    assert downsampled
+    assert len(traces[0].x) == MAX_LINE_POINTS
+    assert traces[0].x[0] == '0_to_60' and traces[0].x[-1] == series(MAX_LINE_POINTS * 3).index[-1]
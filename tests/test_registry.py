@@ -0,0 +1,135 @@
+import copy
+import numpy as np
+import pytest
+
+from src.data_loader import parse_inputs
+from src import registry as registry_module
+from src.registry import new_registry, dataset_entry, entry_state, evict, object_memory
+
+MB = 2 ** 20
+
+
+def registry_of(sizes, memory_budget, followed=()):
+    """Registry of datasets whose load returns {'values': an array of sizes[name] MB}, recording the unloads."""
+    dataset_options = {}
+    for name in sizes:
+        options = copy.copy(parse_inputs([]))
+        options.follow = name in followed
+        dataset_options[name] = options
+    unloaded = []
+
+    def load(name, options, report):
+        report("Loading")
+        return {'name': name, 'values': np.zeros(sizes[name] * MB, dtype=np.uint8)}
+
+    registry = new_registry(dataset_options, load, lambda dataset: unloaded.append(dataset['name']),
+                            memory_budget * MB)
+    return registry, unloaded
+
+
+def use(registry, name):
+    return dataset_entry(registry, name, background=False)['dataset']
+
+
+def loaded(registry):
+    return sorted(name for name, entry in registry['entries'].items() if entry_state(entry) == 'ready')
+
+
+def test_datasets_are_loaded_on_first_use():
+    registry, _ = registry_of({'a': 1, 'b': 1}, 100)
+    assert registry['default'] == 'a'
+    assert loaded(registry) == []
+    assert use(registry, None)['name'] == 'a'
+    assert loaded(registry) == ['a']
+
+
+def test_least_recently_used_datasets_are_evicted_beyond_the_budget():
+    registry, unloaded = registry_of({'a': 4, 'b': 4, 'c': 4}, 10)
+    use(registry, 'a')
+    use(registry, 'b')
+    use(registry, 'a')
+    use(registry, 'c')
+    assert unloaded == ['b']
+    assert loaded(registry) == ['a', 'c']
+    assert entry_state(registry['entries']['b']) == 'unloaded'
+    # An evicted dataset is loaded again on its next use
+    assert use(registry, 'b')['name'] == 'b'
+    assert unloaded == ['b', 'a']
+
+
+def test_followed_datasets_are_never_evicted():
+    registry, unloaded = registry_of({'live': 4, 'a': 4, 'b': 4}, 10, followed={'live'})
+    for name in ('live', 'a', 'b'):
+        use(registry, name)
+    assert unloaded == ['a']
+    assert 'live' in loaded(registry)
+
+
+def test_growth_after_loading_is_caught_by_the_next_check():
+    registry, unloaded = registry_of({'a': 3, 'b': 3}, 10)
+    use(registry, 'a')
+    use(registry, 'b')
+    assert unloaded == []
+    # Indicators decoded on first use make a dataset grow once loaded
+    registry['entries']['a']['dataset']['indicator'] = np.zeros(6 * MB, dtype=np.uint8)
+    evict(registry)
+    # The most recently used dataset is kept
+    assert unloaded == ['a']
+    assert loaded(registry) == ['b']
+
+
+def test_no_budget_never_evicts():
+    registry, unloaded = registry_of({'a': 4, 'b': 4}, 1)
+    registry['memory_budget'] = None
+    use(registry, 'a')
+    use(registry, 'b')
+    evict(registry)
+    assert unloaded == []
+
+
+def test_unknown_dataset():
+    registry, _ = registry_of({'a': 1}, 10)
+    with pytest.raises(KeyError):
+        dataset_entry(registry, 'missing')
+
+
+def test_failed_load_is_reported():
+    registry, _ = registry_of({'a': 1}, 10)
+
+    def failing_load(name, options, report):
+        raise OSError("missing file")
+
+    registry['load'] = failing_load
+    with pytest.raises(OSError):
+        use(registry, 'a')
+    assert entry_state(registry['entries']['a']) == 'error'
+    assert 'missing file' in registry['entries']['a']['status']['error']
+
+
+def test_failed_load_is_retried_after_a_delay(monkeypatch):
+    registry, _ = registry_of({'a': 1}, 10)
+    load = registry['load']
+    attempts = []
+
+    def flaky_load(name, options, report):
+        attempts.append(name)
+        if len(attempts) == 1:
+            raise OSError("output still being written")
+        return load(name, options, report)
+
+    registry['load'] = flaky_load
+    with pytest.raises(OSError):
+        use(registry, 'a')
+    # Within the delay, the failure is reported without a new attempt
+    assert use(registry, 'a') is None
+    assert entry_state(registry['entries']['a']) == 'error'
+    assert attempts == ['a']
+    monkeypatch.setattr(registry_module, 'LOAD_RETRY_DELAY', 0)
+    assert use(registry, 'a')['name'] == 'a'
+    assert attempts == ['a', 'a']
+    assert entry_state(registry['entries']['a']) == 'ready'
+
+
+def test_object_memory_counts_the_arrays_of_nested_containers():
+    dataset = {'tables': [np.zeros(MB, dtype=np.uint8), (np.zeros(MB, dtype=np.uint8),)], 'name': 'a'}
+    assert 2 * MB <= object_memory(dataset) < 2 * MB + 10000
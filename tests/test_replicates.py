@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.replicates import aggregate_runs, t_quantile, significant_streets
+
+INDICATOR = 'edge_traveltime'
+
+
+def run_table(values, interval='0_to_900'):
+    """Edgedata table of one run, {edge_id: value} of INDICATOR over one interval."""
+    return pd.DataFrame({'interval_begin': 0.0, 'interval_id': interval, 'edge_id': list(values),
+                         INDICATOR: np.asarray(list(values.values()), dtype=np.float32)})
+
+
+def aggregate(runs_by_edge):
+    """Aggregated table of runs given as {edge_id: [value of every run]} (missing runs as None), indexed by edge."""
+    runs = max(len(values) for values in runs_by_edge.values())
+    tables = [run_table({edge: values[run] for edge, values in runs_by_edge.items()
+                         if run < len(values) and values[run] is not None}) for run in range(runs)]
+    return aggregate_runs(iter(tables)).set_index('edge_id')
+
+
+# --- Welford aggregation ---
+
+def test_aggregate_runs_matches_numpy_mean_and_variance():
+    rng = np.random.default_rng(0)
+    samples = {f"e{i}": list(rng.normal(100, 20, 7).astype(np.float32)) for i in range(20)}
+    table = aggregate(samples)
+    for edge, values in samples.items():
+        values = np.asarray(values, dtype=np.float64)
+        assert table.loc[edge, INDICATOR] == pytest.approx(values.mean(), rel=1e-6)
+        assert table.loc[edge, INDICATOR + '_var'] == pytest.approx(values.var(ddof=1), rel=1e-5)
+        assert table.loc[edge, INDICATOR + '_n'] == len(values)
+
+
+def test_aggregate_runs_counts_the_runs_of_every_edge():
+    # e1 only appears in the first run, e2 in all three
+    table = aggregate({'e1': [5.0], 'e2': [1.0, 2.0, 3.0]})
+    assert table.loc['e1', INDICATOR + '_n'] == 1
+    assert table.loc['e1', INDICATOR] == 5.0
+    assert np.isnan(table.loc['e1', INDICATOR + '_var'])
+    assert table.loc['e2', INDICATOR + '_n'] == 3
+    assert table.loc['e2', INDICATOR + '_var'] == pytest.approx(1.0)
+
+
+def test_aggregate_runs_zero_variance():
+    table = aggregate({'e1': [4.25, 4.25, 4.25, 4.25]})
+    assert table.loc['e1', INDICATOR] == 4.25
+    assert table.loc['e1', INDICATOR + '_var'] == 0.0
+
+
+def test_aggregate_runs_single_run():
+    table = aggregate({'e1': [3.5], 'e2': [7.0]})
+    assert list(table[INDICATOR + '_n']) == [1, 1]
+    assert table[INDICATOR + '_var'].isna().all()
+
+
+# --- Student's t quantiles ---
+
+@pytest.mark.parametrize('df, exact, tolerance', [
+    (1, 12.706, 1e-3),
+    (2, 4.303, 1e-2),
+    (3, 3.182, 2e-3),
+    (5, 2.571, 1e-3),
+    (10, 2.228, 1e-3),
+    (30, 2.042, 1e-3),
+])
+def test_t_quantile_matches_the_table(df, exact, tolerance):
+    assert float(t_quantile(0.975, df)) == pytest.approx(exact, rel=tolerance)
+
+
+def test_t_quantile_is_conservative_below_two_degrees_of_freedom():
+    # The quantile of df = 1 is used below 2, which is larger than the exact one
+    assert float(t_quantile(0.975, 1.5)) == pytest.approx(float(t_quantile(0.975, 1)))
+    assert float(t_quantile(0.975, 1.5)) > 4.303
+
+
+def test_t_quantile_tends_to_the_normal_quantile():
+    assert float(t_quantile(0.975, 1e6)) == pytest.approx(1.95996, rel=1e-4)
+
+
+def test_t_quantile_is_vectorized():
+    quantiles = t_quantile(0.975, np.array([2.0, 5.0, 30.0]))
+    assert quantiles.shape == (3,)
+    assert np.all(np.diff(quantiles) < 0)
+
+
+# --- Welch test ---
+
+def welch(samples_without, samples_with, confidence=0.95):
+    """significant_streets() of runs given as {edge_id: [value of every run]} over a single interval."""
+    return significant_streets(aggregate(samples_without).reset_index(), aggregate(samples_with).reset_index(),
+                               ['0_to_900'], INDICATOR, confidence)
+
+
+def test_welch_test_matches_scipy():
+    stats = pytest.importorskip('scipy.stats')
+    rng = np.random.default_rng(1)
+    samples_without = {f"e{i}": list(rng.normal(100, 10, 5).astype(np.float32)) for i in range(30)}
+    samples_with = {f"e{i}": list(rng.normal(100 + i, 5 + i, 8).astype(np.float32)) for i in range(30)}
+    result = welch(samples_without, samples_with)
+    for edge in samples_without:
+        without = np.asarray(samples_without[edge], dtype=np.float64)
+        with_deviations = np.asarray(samples_with[edge], dtype=np.float64)
+        test = stats.ttest_ind(with_deviations, without, equal_var=False)
+        difference, half_width = result.loc[edge, 'difference'], result.loc[edge, 'half_width']
+        standard_error = difference / test.statistic
+        assert difference == pytest.approx(with_deviations.mean() - without.mean(), rel=1e-5)
+        assert half_width == pytest.approx(stats.t.ppf(0.975, test.df) * standard_error, rel=1e-2)
+        if abs(test.pvalue - 0.05) > 0.005:
+            assert result.loc[edge, 'significant'] == (test.pvalue < 0.05)
+
+
+def test_welch_test_separates_clear_differences():
+    samples_without = {'same': [10.0, 11.0, 9.0, 10.0], 'shifted': [10.0, 11.0, 9.0, 10.0]}
+    samples_with = {'same': [10.5, 9.5, 10.0, 10.0], 'shifted': [50.0, 51.0, 49.0, 50.0]}
+    result = welch(samples_without, samples_with)
+    assert not result.loc['same', 'significant']
+    assert result.loc['shifted', 'significant']
+    assert result.loc['shifted', 'difference'] == pytest.approx(40.0)
+
+
+def test_welch_test_needs_two_runs_per_scenario():
+    result = welch({'e1': [10.0]}, {'e1': [50.0, 51.0, 52.0]})
+    assert not result.loc['e1', 'significant']
+
+
+def test_welch_test_zero_variance():
+    result = welch({'constant': [10.0, 10.0, 10.0], 'unchanged': [10.0, 10.0]},
+                   {'constant': [12.0, 12.0, 12.0], 'unchanged': [10.0, 10.0]})
+    assert result.loc['constant', 'half_width'] == 0.0
+    assert result.loc['constant', 'significant']
+    assert not result.loc['unchanged', 'significant']
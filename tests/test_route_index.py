@@ -0,0 +1,80 @@
+import gzip
+import numpy as np
+import pytest
+
+from src.route_index import build_route_index, load_route_index, trips_on_edges
+
+ROUTES = {
+    'car0': 'a b c',
+    'car1': 'c d',
+    'car2': 'a d a',
+    'bus': 'e',
+}
+
+
+def write_vehroutes(path, routes, rerouted=()):
+    """Vehroute output of the given {trip id: edges}; the rerouted trips list a replaced route first."""
+    lines = ['<routes>']
+    for trip_id, edges in routes.items():
+        lines.append(f'<vehicle id="{trip_id}" depart="0.00">')
+        if trip_id in rerouted:
+            lines += ['<routeDistribution>', '<route replacedOnEdge="x" edges="x y z"/>', f'<route edges="{edges}"/>',
+                      '</routeDistribution>']
+        else:
+            lines.append(f'<route edges="{edges}"/>')
+        lines.append('</vehicle>')
+    lines.append('</routes>')
+    opener = gzip.open if str(path).endswith('.gz') else open
+    with opener(path, 'wt', encoding='utf-8') as f:
+        f.write('\n'.join(lines))
+    return str(path)
+
+
+def expected_trips(routes, edges):
+    return sorted(trip_id for trip_id, route in routes.items() if set(route.split()) & set(edges))
+
+
+@pytest.fixture(params=['vehroutes.xml', 'vehroutes.xml.gz'])
+def route_index(request, tmp_path):
+    return build_route_index(write_vehroutes(tmp_path / request.param, ROUTES))
+
+
+def test_csr_layout(route_index):
+    indptr, trips = route_index['indptr'], route_index['trips']
+    assert indptr[0] == 0 and indptr[-1] == len(trips)
+    assert len(indptr) == len(route_index['edges']) + 1
+    for code, edge in enumerate(route_index['edges']):
+        slice_trips = trips[indptr[code]:indptr[code + 1]]
+        # Every trip once per edge (car2 drives twice along a), in order
+        assert np.all(np.diff(slice_trips) > 0)
+        assert sorted(route_index['ids'][slice_trips]) == expected_trips(ROUTES, [edge])
+
+
+@pytest.mark.parametrize('edges', [['a'], ['d'], ['a', 'd'], ['c', 'e'], ['b', 'unknown'], ['unknown'], []])
+def test_trips_on_edges(route_index, edges):
+    assert sorted(trips_on_edges(route_index, edges)) == expected_trips(ROUTES, edges)
+
+
+def test_rerouted_trips_follow_their_last_route(tmp_path):
+    route_index = build_route_index(write_vehroutes(tmp_path / 'vehroutes.xml', ROUTES, rerouted={'car1'}))
+    assert list(trips_on_edges(route_index, ['x'])) == []
+    assert sorted(trips_on_edges(route_index, ['d'])) == ['car1', 'car2']
+
+
+def test_matches_a_brute_force_search_on_random_routes(tmp_path):
+    rng = np.random.default_rng(0)
+    edges = [f"{street}#{segment}" for street in range(50) for segment in range(3)]
+    routes = {f"trip{i}": ' '.join(rng.choice(edges, int(rng.integers(1, 20)))) for i in range(500)}
+    route_index = build_route_index(write_vehroutes(tmp_path / 'vehroutes.xml', routes))
+    for _ in range(20):
+        selected = list(rng.choice(edges, int(rng.integers(1, 6)), replace=False))
+        assert sorted(trips_on_edges(route_index, selected)) == expected_trips(routes, selected)
+
+
+def test_empty_output(tmp_path):
+    route_index = build_route_index(write_vehroutes(tmp_path / 'vehroutes.xml', {}))
+    assert len(trips_on_edges(route_index, ['a'])) == 0
+
+
+def test_no_vehroute_file():
+    assert load_route_index(None) is None
@@ -0,0 +1,89 @@
+import json
+import pytest
+
+from src.street_index import normalize, tokens, build_street_index, prefix_matches, search_streets, street_option
+
+EDGES = [
+    ('123#0', 'Chaussée d&apos;Ixelles'),
+    ('123#1', 'Chaussée d&apos;Ixelles'),
+    ('-123#0', 'Chaussée d&apos;Ixelles'),
+    ('456#0', 'Rue de la Loi'),
+    ('789#0', 'Rue Royale'),
+    ('789#1', 'Rue Royale'),
+    ('555#0', 'Avenue Louise'),
+    ('321#0', 'Louvain-la-Neuve'),
+    ('999#0', ''),
+    ('999#1', None),
+    (':junction_1', ''),
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    network_file = tmp_path / 'network.geojson'
+    features = [{'type': 'Feature', 'geometry': {'type': 'LineString', 'coordinates': [[4.3, 50.8], [4.31, 50.81]]},
+                 'properties': {'id': edge_id, 'name': name}} for edge_id, name in EDGES]
+    network_file.write_text(json.dumps({'type': 'FeatureCollection', 'features': features}), encoding='utf-8')
+    return build_street_index(str(network_file))
+
+
+def labels(index, positions):
+    return [index['streets'][position]['label'] for position in positions]
+
+
+def test_normalize_and_tokens():
+    assert normalize('Chaussée d&apos;Ixelles') == "chaussee d'ixelles"
+    assert tokens('Chaussée d&apos;Ixelles') == ['chaussee', 'd', 'ixelles']
+    assert tokens('-123#1') == ['123', '1']
+    assert tokens(None) == []
+
+
+def test_edges_are_grouped_into_streets(index):
+    streets = {street['label']: sorted(street['edges']) for street in index['streets']}
+    assert streets["Chaussée d'Ixelles"] == ['-123#0', '123#0', '123#1']
+    assert streets['Rue Royale'] == ['789#0', '789#1']
+    # Unnamed edges are grouped by their id without the #n suffix
+    assert streets['999'] == ['999#0', '999#1']
+    assert streets[':junction_1'] == [':junction_1']
+
+
+def test_tokens_are_sorted(index):
+    assert list(index['tokens']) == sorted(index['tokens'])
+
+
+def test_prefix_matches(index):
+    assert labels(index, prefix_matches(index, 'ru')) == ['Rue de la Loi', 'Rue Royale']
+    assert labels(index, prefix_matches(index, 'lou')) == ['Avenue Louise', 'Louvain-la-Neuve']
+    assert len(prefix_matches(index, 'zzz')) == 0
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('rue', ['Rue de la Loi', 'Rue Royale']),
+    ('rue ro', ['Rue Royale']),
+    ('ROYALE rue', ['Rue Royale']),
+    ('chaussee ix', ["Chaussée d'Ixelles"]),
+    ('Chaussée', ["Chaussée d'Ixelles"]),
+    ('123', ["Chaussée d'Ixelles"]),
+    ('999', ['999']),
+    ('rue louise', []),
+    ('', []),
+    ('  ', []),
+])
+def test_search_streets(index, query, expected):
+    assert labels(index, search_streets(index, query)) == expected
+
+
+def test_streets_starting_with_the_query_come_first(index):
+    # The other streets match "lo" by a later word of their label (louise, loi), in alphabetical order
+    assert labels(index, search_streets(index, 'lo')) == ['Louvain-la-Neuve', 'Avenue Louise', 'Rue de la Loi']
+    assert labels(index, search_streets(index, 'la')) == ['Louvain-la-Neuve', 'Rue de la Loi']
+
+
+def test_search_limit(index):
+    assert len(search_streets(index, 'r', limit=1)) == 1
+
+
+def test_street_option(index):
+    position = search_streets(index, 'royale')[0]
+    assert street_option(index, position) == 'Rue Royale (2 edges)'
+    assert street_option(index, search_streets(index, 'louise')[0]) == 'Avenue Louise (1 edge)'
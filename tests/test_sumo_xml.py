@@ -0,0 +1,51 @@
+import gzip
+import numpy as np
+
+from src.data_loader import load_vehicles_data
+from src.sumo_xml import VEHICLE_COLUMNS, read_edgedata_xml
+
+TRIPINFO = ('<tripinfos>\n'
+            '<tripinfo id="1" depart="0.00" arrivalLane="" duration="12.50" routeLength="100.00" waitingTime="0.00" '
+            'timeLoss="1.25" vType="car" devices="tripinfo_1"/>\n'
+            '<tripinfo id="2" depart="5.00" arrivalLane="" duration="20.00" routeLength="150.00" waitingTime="3.00" '
+            'timeLoss="4.00" vType="bus" devices="tripinfo_2"/>\n'
+            '</tripinfos>\n')
+EDGEDATA = ('<meandata>\n<interval begin="0.00" end="300.00" id="0_to_300">\n'
+            '<edge id="10" sampledSeconds="5.00" speed="13.50" teleported="0"/>\n'
+            '<edge id="11" sampledSeconds="1.00" speed="2.00"/>\n'
+            '</interval>\n</meandata>\n')
+
+
+def write_gzip(path, text):
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write(text)
+    return str(path)
+
+
+def test_compact_tripinfo_keeps_the_dashboard_columns(tmp_path):
+    vehicle_data = load_vehicles_data(write_gzip(tmp_path / 'tripinfo.xml.gz', TRIPINFO))
+    assert list(vehicle_data.columns) == VEHICLE_COLUMNS
+    assert vehicle_data['tripinfo_duration'].dtype == np.float32
+
+
+def test_full_tripinfo_keeps_every_attribute(tmp_path):
+    vehicle_data = load_vehicles_data(write_gzip(tmp_path / 'tripinfo.xml.gz', TRIPINFO), compact=False)
+    assert list(vehicle_data.columns) == ['tripinfo_id', 'tripinfo_depart', 'tripinfo_arrivalLane',
+                                          'tripinfo_duration', 'tripinfo_routeLength', 'tripinfo_waitingTime',
+                                          'tripinfo_timeLoss', 'tripinfo_vType', 'tripinfo_devices']
+    # As read_csv() reads the CSV conversion: numbers, missing values for the empty attributes, and ids as strings
+    assert list(vehicle_data['tripinfo_id']) == ['1', '2']
+    assert vehicle_data['tripinfo_depart'].tolist() == [0.0, 5.0]
+    assert vehicle_data['tripinfo_arrivalLane'].isna().all()
+    assert vehicle_data['tripinfo_devices'].tolist() == ['tripinfo_1', 'tripinfo_2']
+
+
+def test_full_edgedata_keeps_every_attribute(tmp_path):
+    xmlfile = write_gzip(tmp_path / 'edgedata.xml.gz', EDGEDATA)
+    dataframe = read_edgedata_xml(xmlfile, compact=False)
+    assert list(dataframe.columns) == ['interval_begin', 'interval_end', 'interval_id', 'edge_id',
+                                       'edge_sampledSeconds', 'edge_speed', 'edge_teleported']
+    assert list(dataframe['edge_id']) == ['10', '11']
+    assert np.isnan(dataframe['edge_teleported'].iloc[1])
+    assert list(read_edgedata_xml(xmlfile).columns) == ['interval_begin', 'interval_id', 'edge_id', 'edge_speed',
+                                                        'edge_sampledSeconds']
@@ -0,0 +1,137 @@
+import gzip
+import math
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.sumo_xml import VEHICLE_INDICATORS
+from src.trip_sketches import RELATIVE_ACCURACY, new_sketch, sketch_add, sketch_merge, sketch_quantile, \
+    new_histogram, histogram_add, histogram_merge, histogram_bars, new_trip_statistics, add_trips, \
+    merge_trip_statistics, read_trip_statistics, summary_quantiles
+
+QUANTILES = [0.0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 0.999, 1.0]
+
+
+def sketch_of(values):
+    return sketch_add(new_sketch(), np.asarray(values, dtype=np.float64))
+
+
+def assert_within_accuracy(sketch, values):
+    """Every quantile of the sketch within RELATIVE_ACCURACY of the value of the same rank."""
+    for q in QUANTILES:
+        exact = np.quantile(values, q, method='lower')
+        assert abs(sketch_quantile(sketch, q) - exact) <= RELATIVE_ACCURACY * abs(exact) + 1e-9, q
+
+
+# --- Quantile sketch ---
+
+@pytest.mark.parametrize('distribution', ['lognormal', 'exponential', 'pareto'])
+def test_quantiles_of_skewed_data_are_within_the_relative_accuracy(distribution):
+    rng = np.random.default_rng(0)
+    values = {'lognormal': lambda: rng.lognormal(4, 1.5, 50000),
+              'exponential': lambda: rng.exponential(300, 50000),
+              'pareto': lambda: (rng.pareto(1.2, 50000) + 1) * 10}[distribution]()
+    assert_within_accuracy(sketch_of(values), values)
+
+
+def test_quantiles_of_values_of_both_signs_and_zeros():
+    rng = np.random.default_rng(1)
+    values = np.concatenate([-rng.lognormal(2, 1, 5000), np.zeros(1000), rng.lognormal(3, 1, 10000)])
+    sketch = sketch_of(values)
+    assert sketch['zeros'] == 1000
+    assert_within_accuracy(sketch, values)
+
+
+def test_merged_sketches_equal_the_sketch_of_all_values():
+    rng = np.random.default_rng(2)
+    values = rng.lognormal(4, 1, 30000)
+    merged = new_sketch()
+    for chunk in np.array_split(values, 7):
+        sketch_merge(merged, sketch_of(chunk))
+    assert merged == sketch_of(values)
+    assert_within_accuracy(merged, values)
+
+
+def test_merging_an_empty_sketch_changes_nothing():
+    sketch = sketch_of([1.0, 2.0, 3.0])
+    assert sketch_merge(sketch_of([1.0, 2.0, 3.0]), new_sketch()) == sketch
+    assert sketch_merge(new_sketch(), sketch_of([1.0, 2.0, 3.0])) == sketch
+
+
+def test_empty_sketch():
+    sketch = new_sketch()
+    assert math.isnan(sketch_quantile(sketch, 0.5))
+    assert sketch_add(sketch, np.array([])) == new_sketch()
+    assert sketch_add(sketch, np.array([np.nan, np.nan])) == new_sketch()
+
+
+@pytest.mark.parametrize('value', [42.5, 0.0, -3.25])
+def test_single_value(value):
+    sketch = sketch_of([value])
+    for q in QUANTILES:
+        assert sketch_quantile(sketch, q) == value
+
+
+def test_nan_values_are_ignored():
+    sketch = sketch_of([np.nan, 10.0, np.nan, 20.0])
+    assert sketch['count'] == 2
+    assert sketch_quantile(sketch, 0.0) == pytest.approx(10.0, rel=RELATIVE_ACCURACY)
+    assert sketch_quantile(sketch, 1.0) == pytest.approx(20.0, rel=RELATIVE_ACCURACY)
+
+
+# --- Histogram ---
+
+def test_histogram_counts_every_value():
+    rng = np.random.default_rng(3)
+    values = rng.exponential(300, 10000)
+    histogram = histogram_add(new_histogram(10.0), values)
+    edges, width, counts = histogram_bars(histogram, max_bars=50)
+    assert len(edges) <= 50
+    assert counts.sum() == len(values)
+    assert edges[0] <= values.min() < edges[0] + width
+    assert edges[-1] <= values.max() < edges[-1] + width
+
+
+def test_merged_histograms_equal_the_histogram_of_all_values():
+    values = np.arange(0.0, 1000.0, 3.5)
+    merged = histogram_merge(histogram_add(new_histogram(10.0), values[:100]),
+                             histogram_add(new_histogram(10.0), values[100:]))
+    assert merged == histogram_add(new_histogram(10.0), values)
+
+
+def test_empty_histogram():
+    edges, width, counts = histogram_bars(new_histogram(5.0))
+    assert len(edges) == 0 and len(counts) == 0
+    assert width == 5.0
+
+
+# --- Statistics of a scenario ---
+
+def vehicle_table(trips, seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({indicator: rng.lognormal(5, 1, trips).astype(np.float32) for indicator in VEHICLE_INDICATORS})
+
+
+def test_merged_trip_statistics_equal_the_statistics_of_all_trips():
+    first, second = vehicle_table(1000, 4), vehicle_table(500, 5)
+    merged = merge_trip_statistics(add_trips(new_trip_statistics(), first), add_trips(new_trip_statistics(), second))
+    assert merged == add_trips(new_trip_statistics(), pd.concat([first, second], ignore_index=True))
+    assert merged['trips'] == 1500
+
+
+def test_read_trip_statistics_does_not_depend_on_the_chunks(tmp_path):
+    xmlfile = tmp_path / 'tripinfo.xml.gz'
+    rng = np.random.default_rng(6)
+    durations = rng.lognormal(5, 1, 250).round(2)
+    with gzip.open(xmlfile, 'wt') as f:
+        f.write('<tripinfos>\n')
+        for i, duration in enumerate(durations):
+            f.write(f'<tripinfo id="{i}" vType="car" duration="{duration:.2f}" routeLength="{duration * 10:.2f}" '
+                    f'timeLoss="{duration / 4:.2f}" waitingTime="1.00"/>\n')
+        f.write('</tripinfos>\n')
+    statistics = read_trip_statistics(str(xmlfile))
+    assert read_trip_statistics(str(xmlfile), chunk_trips=7) == statistics
+    assert statistics['trips'] == 250
+    median = summary_quantiles(statistics, 'tripinfo_duration')[0.5]
+    exact = np.quantile(durations.astype(np.float32), 0.5, method='lower')
+    assert median == pytest.approx(exact, rel=RELATIVE_ACCURACY)